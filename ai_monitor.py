@@ -1,15 +1,17 @@
-import tensorflow as tf
-from tensorflow.keras.models import Sequential, load_model, Model
-from tensorflow.keras.layers import Dense, LSTM, Dropout, Input
-from tensorflow.keras.optimizers import Adam
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
 import logging
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Iterator
 import os
 import json
 from datetime import datetime, timedelta
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.config import settings
+from app.analytics.lstm_numpy import NumpyLSTMModel, export_lstm, load_lstm
+from app.analytics.pattern_detector import evaluate_patterns, evaluate_window_patterns
+from app.analytics.lstm_quantization import quantize_model, accuracy_report
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -28,10 +30,22 @@ class AIMonitor:
         self.scaler = MinMaxScaler()
         self.is_trained = False
         self.sequence_length = 10  # 用于预测的序列长度
+        # 挂接的模型仓库，存在时每次推理前检查固定版本是否变化
+        self.registry = None
+        self.registry_name = 'lstm'
+        self.registry_chain: Optional[str] = None
+        self.model_version: Optional[str] = None
+        # 挂接的特征存储，存在且已收录该地址时异常模式直接读取窗口聚合
+        self.feature_store = None
         
         if model_path and os.path.exists(model_path):
             try:
-                self.model = load_model(model_path)
+                if model_path.endswith('.npz'):
+                    self.load_weights(model_path)
+                else:
+                    # 按需导入TensorFlow，只使用导出权重推理的进程无需加载
+                    from tensorflow.keras.models import load_model
+                    self.model = load_model(model_path)
                 self.is_trained = True
                 logger.info(f"成功加载预训练模型: {model_path}")
             except Exception as e:
@@ -45,6 +59,10 @@ class AIMonitor:
         Args:
             input_shape: 输入形状 (sequence_length, features)
         """
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, LSTM, Dropout
+        from tensorflow.keras.optimizers import Adam
+        
         model = Sequential()
         model.add(LSTM(50, return_sequences=True, input_shape=input_shape))
         model.add(Dropout(0.2))
@@ -57,40 +75,73 @@ class AIMonitor:
         self.model = model
         logger.info("LSTM模型构建完成")
     
-    def prepare_data(self, transactions: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """准备训练数据
+    def prepare_series(self, transactions: List[Dict[str, Any]]) -> np.ndarray:
+        """按时间排序并缩放金额，得到一维的列式序列
         
         Args:
-            transactions: 交易列表，按时间排序
+            transactions: 交易列表
             
         Returns:
-            X: 特征数据
-            y: 目标数据
+            缩放后的金额序列
         """
         # 提取特征
-        data = []
-        for tx in transactions:
-            features = {
-                'value': float(tx.get('value', 0)),
-                'timestamp': tx.get('block_timestamp', datetime.now()).timestamp()
-            }
-            data.append(features)
-        
-        df = pd.DataFrame(data)
+        values = np.array([float(tx.get('value', 0)) for tx in transactions])
+        timestamps = np.array([tx.get('block_timestamp', datetime.now()).timestamp() for tx in transactions])
         
         # 确保数据按时间排序
-        df = df.sort_values('timestamp')
+        values = values[np.argsort(timestamps, kind='stable')]
         
-        # 提取特征和目标
-        values = df['value'].values.reshape(-1, 1)
-        scaled_values = self.scaler.fit_transform(values)
+        return self.scaler.fit_transform(values.reshape(-1, 1))[:, 0]
+    
+    def prepare_data(self, transactions: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """准备训练数据
         
-        X, y = [], []
-        for i in range(len(scaled_values) - self.sequence_length):
-            X.append(scaled_values[i:i+self.sequence_length])
-            y.append(scaled_values[i+self.sequence_length])
+        X 和 y 都是缩放后序列上的步长视图，不复制窗口数据。
+        
+        Args:
+            transactions: 交易列表，按时间排序
+            
+        Returns:
+            X: 特征数据 (窗口数, 序列长度, 1)
+            y: 目标数据 (窗口数, 1)
+        """
+        series = self.prepare_series(transactions)
+        if len(series) <= self.sequence_length:
+            return np.empty((0, self.sequence_length, 1)), np.empty((0, 1))
         
-        return np.array(X), np.array(y)
+        X = sliding_window_view(series, self.sequence_length)[:-1, :, np.newaxis]
+        y = series[self.sequence_length:, np.newaxis]
+        return X, y
+    
+    def window_batches(
+        self,
+        series: np.ndarray,
+        batch_size: int = 32,
+        shuffle: bool = True,
+        seed: Optional[int] = None
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """从列式序列中按批次生成训练窗口
+        
+        只在组装每个批次时复制该批次的窗口，内存与批次大小成正比，
+        与历史长度无关。生成器无限循环，每轮重新打乱窗口顺序。
+        
+        Args:
+            series: prepare_series 得到的缩放序列
+            batch_size: 批次大小
+            shuffle: 每轮是否打乱窗口顺序
+            seed: 随机种子
+            
+        Yields:
+            (X, y) 批次，形状为 (批次, 序列长度, 1) 和 (批次, 1)
+        """
+        windows = sliding_window_view(series, self.sequence_length)[:-1]
+        targets = series[self.sequence_length:]
+        rng = np.random.default_rng(seed)
+        while True:
+            order = rng.permutation(len(windows)) if shuffle else np.arange(len(windows))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                yield windows[batch][:, :, np.newaxis], targets[batch][:, np.newaxis]
     
     def train(self, transactions: List[Dict[str, Any]], epochs: int = 50, batch_size: int = 32):
         """训练模型
@@ -104,19 +155,30 @@ class AIMonitor:
             logger.warning(f"训练数据不足，需要至少 {self.sequence_length + 10} 条交易记录")
             return
         
+        if isinstance(self.model, NumpyLSTMModel):
+            # 导出的权重只用于推理，重新训练时重建Keras模型
+            self.model = None
+            self.scaler = MinMaxScaler()
+        
         # 准备数据
-        X, y = self.prepare_data(transactions)
+        series = self.prepare_series(transactions)
+        window_count = len(series) - self.sequence_length
         
-        if X.shape[0] == 0 or y.shape[0] == 0:
+        if window_count <= 0:
             logger.warning("无法从交易数据中提取有效特征")
             return
         
         # 构建模型（如果尚未构建）
         if self.model is None:
-            self.build_model((X.shape[1], X.shape[2]))
-        
-        # 训练模型
-        self.model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=1)
+            self.build_model((self.sequence_length, 1))
+        
+        # 按批次流式生成窗口训练模型，不物化完整的窗口张量
+        self.model.fit(
+            self.window_batches(series, batch_size),
+            steps_per_epoch=int(np.ceil(window_count / batch_size)),
+            epochs=epochs,
+            verbose=1
+        )
         self.is_trained = True
         logger.info(f"模型训练完成，使用 {len(transactions)} 条交易记录")
     
@@ -129,6 +191,7 @@ class AIMonitor:
         Returns:
             预测结果
         """
+        self._sync_registry()
         if not self.is_trained or self.model is None:
             logger.warning("模型尚未训练，无法进行预测")
             return {'predicted_value': None, 'confidence': 0}
@@ -167,23 +230,39 @@ class AIMonitor:
             'confidence': 0.8  # 简化的置信度计算
         }
     
-    def detect_anomalies(self, transactions: List[Dict[str, Any]], threshold: float = 0.5) -> List[Dict[str, Any]]:
+    def detect_anomalies(
+        self,
+        transactions: List[Dict[str, Any]],
+        threshold: float = 0.5,
+        batched: bool = True
+    ) -> List[Dict[str, Any]]:
         """检测异常交易
         
         Args:
             transactions: 交易列表
             threshold: 异常阈值
+            batched: 是否将所有地址的全部滑动窗口合并为一次批量预测；
+                False 时逐窗口调用 predict_next_transaction
             
         Returns:
             异常交易列表
         """
+        self._sync_registry()
         if not self.is_trained or self.model is None:
             logger.warning("模型尚未训练，无法检测异常")
             return []
         
-        anomalies = []
+        address_txs = self._group_sequences(transactions)
+        if batched:
+            anomalies = self._detect_anomalies_batched(address_txs, threshold)
+        else:
+            anomalies = self._detect_anomalies_per_window(address_txs, threshold)
         
-        # 按地址分组处理交易
+        logger.info(f"AI检测到 {len(anomalies)} 条异常交易，共 {len(transactions)} 条交易")
+        return anomalies
+    
+    def _group_sequences(self, transactions: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """按发送方分组并按时间排序，丢弃不足一个窗口的地址"""
         address_txs = {}
         for tx in transactions:
             from_addr = tx.get('from_address', '')
@@ -192,14 +271,80 @@ class AIMonitor:
                     address_txs[from_addr] = []
                 address_txs[from_addr].append(tx)
         
-        # 对每个地址的交易序列进行异常检测
+        sequences = {}
         for address, addr_txs in address_txs.items():
             if len(addr_txs) < self.sequence_length:
                 continue
-            
             # 按时间排序
             addr_txs.sort(key=lambda x: x.get('block_timestamp', datetime.now()))
+            sequences[address] = addr_txs
+        return sequences
+    
+    def _detect_anomalies_batched(self, address_txs: Dict[str, List[Dict[str, Any]]], threshold: float) -> List[Dict[str, Any]]:
+        """批量滑动窗口检测
+        
+        每个地址的金额序列只缩放一次，用步长视图生成全部窗口，所有地址的窗口
+        拼接为一个 (窗口数, 序列长度, 1) 的张量后只调用一次模型预测。
+        
+        Args:
+            address_txs: 按时间排序的地址交易序列
+            threshold: 异常阈值
             
+        Returns:
+            异常交易列表，顺序与逐窗口检测一致
+        """
+        X, targets = self._build_windows(address_txs)
+        if not targets:
+            return []
+        
+        scaled_predictions = self.model.predict(X, batch_size=settings.LSTM_INFERENCE_BATCH_SIZE, verbose=0)
+        return self._flag_deviations(targets, scaled_predictions, threshold)
+    
+    def _build_windows(self, address_txs: Dict[str, List[Dict[str, Any]]]) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        """生成所有地址的滑动窗口张量及每个窗口对应的下一笔交易"""
+        windows, targets = [], []
+        for addr_txs in address_txs.values():
+            if len(addr_txs) <= self.sequence_length:
+                continue
+            values = np.array([float(tx.get('value', 0)) for tx in addr_txs]).reshape(-1, 1)
+            scaled_values = self.scaler.transform(values)[:, 0]
+            windows.append(sliding_window_view(scaled_values, self.sequence_length)[:-1])
+            targets.extend(addr_txs[self.sequence_length:])
+        
+        if not windows:
+            return np.empty((0, self.sequence_length, 1)), []
+        return np.concatenate(windows)[:, :, np.newaxis], targets
+    
+    def _flag_deviations(
+        self,
+        targets: List[Dict[str, Any]],
+        scaled_predictions: np.ndarray,
+        threshold: float,
+        scaler: Optional[Any] = None
+    ) -> List[Dict[str, Any]]:
+        """比较实际值与预测值，返回偏差超过阈值的交易"""
+        scaler = self.scaler if scaler is None else scaler
+        predictions = scaler.inverse_transform(np.asarray(scaled_predictions).reshape(-1, 1))[:, 0]
+        
+        anomalies = []
+        for next_tx, predicted_value in zip(targets, predictions):
+            if predicted_value > 0:
+                actual_value = float(next_tx.get('value', 0))
+                deviation = abs(actual_value - predicted_value) / predicted_value
+                if deviation > threshold:
+                    anomaly_tx = next_tx.copy()
+                    anomaly_tx['ai_anomaly'] = True
+                    anomaly_tx['deviation'] = float(deviation)
+                    anomaly_tx['predicted_value'] = float(predicted_value)
+                    anomalies.append(anomaly_tx)
+        return anomalies
+    
+    def _detect_anomalies_per_window(self, address_txs: Dict[str, List[Dict[str, Any]]], threshold: float) -> List[Dict[str, Any]]:
+        """逐窗口检测，每个窗口单独调用一次模型，作为批量检测的对照基线"""
+        anomalies = []
+        
+        # 对每个地址的交易序列进行异常检测
+        for address, addr_txs in address_txs.items():
             # 滑动窗口检测
             for i in range(len(addr_txs) - self.sequence_length):
                 window = addr_txs[i:i+self.sequence_length]
@@ -225,7 +370,6 @@ class AIMonitor:
                             anomaly_tx['predicted_value'] = float(predicted_value)
                             anomalies.append(anomaly_tx)
         
-        logger.info(f"AI检测到 {len(anomalies)} 条异常交易，共 {len(transactions)} 条交易")
         return anomalies
     
     def save_model(self, model_path: str):
@@ -243,6 +387,97 @@ class AIMonitor:
         else:
             logger.warning("模型尚未训练，无法保存")
     
+    def export_weights(
+        self,
+        path: str,
+        quantization: Optional[str] = None,
+        calibration_transactions: Optional[List[Dict[str, Any]]] = None,
+        holdout_transactions: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """将训练好的模型权重和缩放参数导出为 .npz 文件
+        
+        quantization 为 int8 或 float16 时导出量化权重，减小文件和模型仓库的
+        占用。量化只用于导出：加载后权重反量化为 float32 计算，吞吐量和常驻
+        内存与浮点模型相同，因此进程内推理继续使用当前的浮点模型。
+        
+        Args:
+            path: 输出文件路径
+            quantization: 量化模式 int8 或 float16，默认导出浮点权重
+            calibration_transactions: int8 校准用的交易
+            holdout_transactions: 评估精度损失的保留集交易
+            
+        Returns:
+            量化导出时保留集上相对浮点模型的精度报告，未量化或未提供保留集时为空
+        """
+        if not self.is_trained or self.model is None:
+            raise ValueError("模型尚未训练，无法导出")
+        if quantization is None:
+            export_lstm(self.model, self.scaler, self.sequence_length, path)
+            return {}
+        
+        base = self.model if isinstance(self.model, NumpyLSTMModel) else NumpyLSTMModel.from_keras(self.model)
+        if base.quantization != 'float32':
+            raise ValueError(f"模型已是 {base.quantization} 量化模式")
+        calibration_X = None
+        if calibration_transactions:
+            calibration_X, _ = self._build_windows(self._group_sequences(calibration_transactions))
+        quantized = quantize_model(base, quantization, calibration_X)
+        export_lstm(quantized, self.scaler, self.sequence_length, path)
+        
+        report = {}
+        if holdout_transactions:
+            X, targets = self._build_windows(self._group_sequences(holdout_transactions))
+            if targets:
+                values = np.array([float(tx.get('value', 0)) for tx in targets]).reshape(-1, 1)
+                report = accuracy_report(self.model, quantized, X, self.scaler.transform(values), self.scaler)
+        logger.info(f"已导出 {quantization} 量化权重: {path}")
+        return report
+    
+    def load_weights(self, path: str):
+        """加载导出的权重，使用NumPy推理后端，不导入TensorFlow
+        
+        Args:
+            path: export_weights 写入的文件
+        """
+        exported = load_lstm(path)
+        self.model = exported['model']
+        self.scaler = exported['scaler']
+        self.sequence_length = exported['sequence_length']
+        self.is_trained = True
+        logger.info(f"已加载NumPy推理权重: {path}")
+    
+    def attach_registry(self, registry: Any, name: str = 'lstm', chain: Optional[str] = None):
+        """从模型仓库按需加载模型，并跟随固定版本的变化
+        
+        每次推理前解析链当前固定的版本，版本变化时（发布、固定或回滚）
+        切换到新版本的内存映射权重，无需重启进程。
+        
+        Args:
+            registry: ModelRegistry 实例
+            name: 仓库中的模型名
+            chain: 区块链名称，用于选择按链固定的版本
+        """
+        self.registry = registry
+        self.registry_name = name
+        self.registry_chain = chain
+        self.model_version = None
+        self._sync_registry()
+    
+    def _sync_registry(self):
+        """固定版本变化时切换到仓库中的对应模型"""
+        if self.registry is None:
+            return
+        version = self.registry.resolve(self.registry_name, self.registry_chain)
+        if version is None or version == self.model_version:
+            return
+        loaded = self.registry.load(self.registry_name, version=version)
+        self.model = loaded['model']
+        self.scaler = loaded['scaler']
+        self.sequence_length = loaded['sequence_length']
+        self.model_version = version
+        self.is_trained = True
+        logger.info(f"已切换到模型仓库版本: {self.registry_name} {version}")
+    
     def monitor_wallet(self, address: str, recent_transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
         """监控钱包活动
         
@@ -253,41 +488,109 @@ class AIMonitor:
         Returns:
             监控结果
         """
-        result = {
-            'address': address,
-            'anomalies_detected': False,
-            'risk_level': 'low',
-            'predicted_next_transaction': None,
-            'unusual_patterns': []
-        }
+        address_txs = self._wallet_transactions(address, recent_transactions)
+        if not address_txs:
+            return self._wallet_result(address, [], [], None)
+        
+        # 检测异常
+        anomalies = self.detect_anomalies(address_txs)
         
+        # 预测下一笔交易
+        prediction = None
+        if len(address_txs) >= self.sequence_length:
+            prediction = self.predict_next_transaction(address_txs[-self.sequence_length:])
+        
+        return self._wallet_result(address, address_txs, anomalies, prediction)
+    
+    async def monitor_wallet_async(
+        self,
+        address: str,
+        recent_transactions: List[Dict[str, Any]],
+        broker: Any,
+        threshold: float = 0.5
+    ) -> Dict[str, Any]:
+        """通过推理代理监控钱包活动
+        
+        与 monitor_wallet 结果相同，但异常检测窗口和下一笔交易预测窗口
+        合并为一个请求提交给 InferenceBroker，与其他并发钱包的请求一起批量计算。
+        请求指定当前版本的模型，等待期间模型仓库切换版本时，窗口仍由与缩放
+        参数对应的模型计算。
+        
+        Args:
+            address: 钱包地址
+            recent_transactions: 最近的交易列表
+            broker: InferenceBroker 实例
+            threshold: 异常阈值
+            
+        Returns:
+            监控结果
+        """
+        self._sync_registry()
+        address_txs = self._wallet_transactions(address, recent_transactions)
+        if not address_txs or not self.is_trained or self.model is None:
+            return self._wallet_result(address, address_txs, [], None)
+        
+        # 等待推理期间可能切换版本，窗口构建和结果还原都使用当前版本
+        model, scaler = self.model, self.scaler
+        X, targets = self._build_windows(self._group_sequences(address_txs))
+        has_next = len(address_txs) >= self.sequence_length
+        if has_next:
+            values = np.array([float(tx.get('value', 0)) for tx in address_txs[-self.sequence_length:]])
+            next_window = scaler.transform(values.reshape(-1, 1))[np.newaxis]
+            X = np.concatenate([X, next_window])
+        
+        scaled_predictions = await broker.predict(X, model=model) if len(X) else np.empty((0, 1))
+        anomalies = self._flag_deviations(targets, scaled_predictions[:len(targets)], threshold, scaler)
+        
+        prediction = None
+        if has_next:
+            predicted_value = scaler.inverse_transform(np.asarray(scaled_predictions[-1:]).reshape(-1, 1))
+            prediction = {
+                'predicted_value': float(predicted_value[0][0]),
+                'confidence': 0.8  # 简化的置信度计算
+            }
+        
+        return self._wallet_result(address, address_txs, anomalies, prediction)
+    
+    def _wallet_transactions(self, address: str, recent_transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """筛选与该地址相关的交易并按时间排序"""
         if not recent_transactions:
-            return result
+            return []
         
         # 筛选与该地址相关的交易
         address_txs = [tx for tx in recent_transactions if 
                       tx.get('from_address', '') == address or 
                       tx.get('to_address', '') == address]
         
-        if not address_txs:
-            return result
-        
         # 按时间排序
         address_txs.sort(key=lambda x: x.get('block_timestamp', datetime.now()))
+        return address_txs
+    
+    def _wallet_result(
+        self,
+        address: str,
+        address_txs: List[Dict[str, Any]],
+        anomalies: List[Dict[str, Any]],
+        prediction: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """汇总钱包监控结果"""
+        result = {
+            'address': address,
+            'anomalies_detected': False,
+            'risk_level': 'low',
+            'predicted_next_transaction': prediction,
+            'unusual_patterns': []
+        }
+        
+        if not address_txs:
+            return result
         
-        # 检测异常
-        anomalies = self.detect_anomalies(address_txs)
         if anomalies:
             result['anomalies_detected'] = True
             result['risk_level'] = 'high' if len(anomalies) > 2 else 'medium'
         
-        # 预测下一笔交易
-        if len(address_txs) >= self.sequence_length:
-            prediction = self.predict_next_transaction(address_txs[-self.sequence_length:])
-            result['predicted_next_transaction'] = prediction
-        
         # 检测异常模式
-        patterns = self._detect_unusual_patterns(address_txs)
+        patterns = self._detect_unusual_patterns(address_txs, address)
         if patterns:
             result['unusual_patterns'] = patterns
             if result['risk_level'] == 'low':
@@ -295,48 +598,36 @@ class AIMonitor:
         
         return result
     
-    def _detect_unusual_patterns(self, transactions: List[Dict[str, Any]]) -> List[str]:
+    def _detect_unusual_patterns(self, transactions: List[Dict[str, Any]], address: Optional[str] = None) -> List[str]:
         """检测异常模式
         
         Args:
             transactions: 交易列表
+            address: 交易所属地址，特征存储已收录该地址时读取其窗口聚合，不再遍历交易
             
         Returns:
             检测到的异常模式列表
         """
-        patterns = []
+        if self.feature_store is not None and address is not None and address in self.feature_store:
+            return evaluate_window_patterns(self.feature_store.get_features(address))
         
         if len(transactions) < 3:
-            return patterns
-        
-        # 检查交易频率突然增加
-        timestamps = [tx.get('block_timestamp', datetime.now()) for tx in transactions]
-        timestamps.sort()
+            return []
         
-        if len(timestamps) >= 5:
-            # 计算平均交易间隔
-            intervals = [(timestamps[i+1] - timestamps[i]).total_seconds() 
-                        for i in range(len(timestamps)-1)]
-            avg_interval = sum(intervals) / len(intervals)
-            
-            # 检查最近的交易间隔是否明显小于平均值
-            recent_intervals = intervals[-3:]
-            if recent_intervals and sum(recent_intervals) / len(recent_intervals) < avg_interval * 0.3:
-                patterns.append("交易频率突然增加")
-        
-        # 检查交易金额突然增加
-        values = [float(tx.get('value', 0)) for tx in transactions]
-        if values:
-            avg_value = sum(values) / len(values)
-            recent_values = values[-3:]
-            if recent_values and sum(recent_values) / len(recent_values) > avg_value * 3:
-                patterns.append("交易金额突然增加")
-        
-        # 检查深夜交易模式
-        night_txs = [tx for tx in transactions if 
-                    tx.get('block_timestamp', datetime.now()).hour >= 0 and 
-                    tx.get('block_timestamp', datetime.now()).hour < 5]
-        if night_txs and len(night_txs) / len(transactions) > 0.5:
-            patterns.append("频繁深夜交易")
-        
-        return patterns
+        # 单次遍历提取时间和金额，缺失时间戳的交易使用同一个当前时间
+        now = datetime.now()
+        timestamps = [tx.get('block_timestamp', now) for tx in transactions]
+        values = np.array([float(tx.get('value', 0)) for tx in transactions])
+        
+        epochs = np.sort([ts.timestamp() for ts in timestamps])
+        intervals = np.diff(epochs)
+        night_count = sum(1 for ts in timestamps if ts.hour < 5)
+        
+        return evaluate_patterns(
+            len(transactions),
+            float(intervals.mean()) if len(intervals) else 0.0,
+            float(intervals[-3:].mean()) if len(intervals) else 0.0,
+            float(values.mean()),
+            float(values[-3:].mean()),
+            night_count
+        )
@@ -0,0 +1,282 @@
+from typing import Dict, List, Any, Optional, Tuple
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Alert
+from app.schemas import AlertCreate
+from app.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Group:
+    """一个时间窗口内合并的警报"""
+
+    __slots__ = ('key', 'alert_data', 'alert_id', 'opened_at', 'dirty', 'pending')
+
+    def __init__(self, key: Tuple[int, str, Optional[str]], alert_data: AlertCreate, opened_at: float):
+        self.key = key
+        self.alert_data = alert_data
+        self.alert_id: Optional[int] = None
+        self.opened_at = opened_at
+        self.dirty = False
+        # 上次写回后合并进来的事件，警报已被处理时重新作为新警报写入
+        self.pending: List[AlertCreate] = []
+
+
+def _event_summary(alert_data: AlertCreate) -> Dict[str, Any]:
+    """警报对应事件的简要信息，作为合并警报的样本"""
+    related = alert_data.related_data or {}
+    source = related.get('transaction') or related.get('anomaly') or {}
+    summary = {
+        'tx_hash': source.get('tx_hash'),
+        'from_address': source.get('from_address'),
+        'to_address': source.get('to_address'),
+        'value': float(source.get('value', 0) or 0)
+    }
+    if 'direction' in related:
+        summary['direction'] = related['direction']
+    return summary
+
+
+class AlertCoalescer:
+    """警报合并（去重）窗口
+
+    按 (用户, 警报类型, 钱包地址) 合并一个时间窗口内的重复事件：窗口内第一条
+    事件正常写入为一条警报，后续事件只累加到该警报 related_data['coalesced']
+    的计数、金额合计和有界的样本交易列表中，不再产生新的警报行和通知。
+    全局警报没有监控钱包，按事件的发送方地址分组。
+
+    警报状态被用户修改（已读、已解决等）后关闭其所在的组，之后的事件重新开组，
+    产生新的警报和通知。状态也可能由其他进程修改，因此写回合并结果时只更新
+    仍为 new 状态的警报，其余的组被关闭，组内尚未写回的事件交还调用方重新写入。
+    """
+
+    def __init__(self, window_seconds: Optional[float] = None, max_samples: Optional[int] = None):
+        """初始化合并窗口
+
+        Args:
+            window_seconds: 合并窗口长度（秒），从组内第一条事件开始计算
+            max_samples: 每条合并警报保留的样本交易数上限
+        """
+        self.window_seconds = settings.ALERT_COALESCE_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.max_samples = settings.ALERT_COALESCE_MAX_SAMPLES if max_samples is None else max_samples
+        # 按开启时间排序，最早的组在前，便于淘汰过期组
+        self._groups: 'OrderedDict[Tuple[int, str, Optional[str]], _Group]' = OrderedDict()
+        # 警报ID -> 组，状态变更时用于关闭组
+        self._by_alert_id: Dict[int, _Group] = {}
+        self._lock = threading.Lock()
+        self._metrics = {'events': 0, 'alerts': 0, 'merged': 0, 'reopened': 0}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    @staticmethod
+    def key(alert_data: AlertCreate) -> Tuple[int, str, Optional[str]]:
+        """合并键: (用户ID, 警报类型, 钱包地址)"""
+        related = alert_data.related_data or {}
+        wallet = related.get('wallet_address')
+        if not wallet:
+            wallet = _event_summary(alert_data)['from_address']
+        return alert_data.user_id, alert_data.alert_type, wallet
+
+    def _expire(self, now: float):
+        """淘汰窗口已结束的组（调用方需持有锁）"""
+        while self._groups:
+            group = next(iter(self._groups.values()))
+            if now - group.opened_at < self.window_seconds:
+                break
+            self._groups.popitem(last=False)
+            self._by_alert_id.pop(group.alert_id, None)
+
+    def merge(self, alerts: List[AlertCreate], now: Optional[float] = None) -> Tuple[List[_Group], List[_Group]]:
+        """将一批警报合并到窗口
+
+        Args:
+            alerts: 待写入的警报数据
+            now: 当前时间戳（秒），默认取系统时间
+
+        Returns:
+            (需要新写入的组, 需要更新已写入警报的组)。新组写入后需调用 bind 记录警报ID
+        """
+        now = time.time() if now is None else now
+        if self.window_seconds <= 0:
+            # 窗口为0时不合并
+            return [_Group(self.key(alert_data), alert_data, now) for alert_data in alerts], []
+        fresh: List[_Group] = []
+        updated: Dict[int, _Group] = {}
+        with self._lock:
+            self._expire(now)
+            for alert_data in alerts:
+                self._metrics['events'] += 1
+                key = self.key(alert_data)
+                group = self._groups.get(key)
+                if group is None:
+                    alert_data = alert_data.copy(deep=True)
+                    summary = _event_summary(alert_data)
+                    related = dict(alert_data.related_data or {})
+                    related['coalesced'] = {
+                        'count': 1,
+                        'total_value': summary['value'],
+                        'first_seen': datetime.utcfromtimestamp(now).isoformat(),
+                        'last_seen': datetime.utcfromtimestamp(now).isoformat(),
+                        'samples': [summary] if self.max_samples > 0 else []
+                    }
+                    alert_data.related_data = related
+                    group = _Group(key, alert_data, now)
+                    self._groups[key] = group
+                    fresh.append(group)
+                    self._metrics['alerts'] += 1
+                    continue
+
+                self._accumulate(group, alert_data, now)
+                group.pending.append(alert_data)
+                self._metrics['merged'] += 1
+                if group.alert_id is not None:
+                    group.dirty = True
+                    updated[id(group)] = group
+        return fresh, list(updated.values())
+
+    def _accumulate(self, group: _Group, alert_data: AlertCreate, now: float):
+        """累加一条重复事件（调用方需持有锁）"""
+        summary = _event_summary(alert_data)
+        coalesced = group.alert_data.related_data['coalesced']
+        coalesced['count'] += 1
+        coalesced['total_value'] += summary['value']
+        coalesced['last_seen'] = datetime.utcfromtimestamp(now).isoformat()
+        if len(coalesced['samples']) < self.max_samples:
+            coalesced['samples'].append(summary)
+        # 合并组内出现更高严重性时提升警报严重性
+        if alert_data.severity == 'high':
+            group.alert_data.severity = 'high'
+
+    def bind(self, groups: List[_Group], alerts: List[Alert]):
+        """记录新写入警报的ID，窗口内后续事件将更新这些警报"""
+        with self._lock:
+            for group, alert in zip(groups, alerts):
+                group.alert_id = alert.id
+                if self._groups.get(group.key) is group:
+                    self._by_alert_id[alert.id] = group
+
+    def discard(self, groups: List[_Group]):
+        """移除写入失败的新组，后续事件重新开组"""
+        with self._lock:
+            for group in groups:
+                if self._groups.get(group.key) is group:
+                    del self._groups[group.key]
+
+    def close(self, alert_id: int) -> bool:
+        """关闭警报所在的组，窗口内后续事件不再合并到该警报
+
+        Args:
+            alert_id: 状态已变更的警报ID
+
+        Returns:
+            是否关闭了一个打开的组
+        """
+        with self._lock:
+            group = self._by_alert_id.pop(alert_id, None)
+            if group is None:
+                return False
+            if self._groups.get(group.key) is group:
+                del self._groups[group.key]
+            group.dirty = False
+            return True
+
+    def persist(self, db: Session, groups: List[_Group]) -> List[AlertCreate]:
+        """用一次批量 UPDATE 写回合并后的计数和样本并提交
+
+        先锁定仍为 new 状态的警报，只更新这些警报。已被处理（包括被其他进程
+        或直接 UPDATE 修改）的警报不再被改写，其所在的组被关闭，组内尚未写回
+        的事件返回给调用方，由调用方重新经 merge 写入为新警报。
+
+        Args:
+            db: 数据库会话
+            groups: merge 返回的需要更新的组
+
+        Returns:
+            需要重新写入的事件
+        """
+        with self._lock:
+            batch = []
+            for group in groups:
+                if not group.dirty or group.alert_id is None:
+                    continue
+                batch.append((group, len(group.pending), {
+                    'alert_id': group.alert_id,
+                    'new_severity': group.alert_data.severity,
+                    'new_related_data': copy.deepcopy(group.alert_data.related_data),
+                    'new_updated_at': datetime.utcnow()
+                }))
+                group.dirty = False
+        if not batch:
+            return []
+        table = Alert.__table__
+        try:
+            live = set(db.scalars(
+                select(table.c.id)
+                .where(table.c.id.in_([row['alert_id'] for _, _, row in batch]), table.c.status == 'new')
+                .with_for_update()
+            ))
+            rows = [row for _, _, row in batch if row['alert_id'] in live]
+            if rows:
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam('alert_id'), table.c.status == 'new')
+                    .values(
+                        severity=bindparam('new_severity'),
+                        related_data=bindparam('new_related_data'),
+                        updated_at=bindparam('new_updated_at')
+                    ),
+                    rows
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                for group, _, _ in batch:
+                    group.dirty = True
+            logger.error(f"更新合并警报出错: {str(e)}")
+            raise
+
+        reopened: List[AlertCreate] = []
+        with self._lock:
+            for group, written, row in batch:
+                if row['alert_id'] in live:
+                    del group.pending[:written]
+                    continue
+                # 警报已不是 new 状态，关闭组，未写回的事件重新写入
+                self._by_alert_id.pop(group.alert_id, None)
+                if self._groups.get(group.key) is group:
+                    del self._groups[group.key]
+                reopened.extend(group.pending)
+                group.pending = []
+                group.dirty = False
+            # 重新写入时 merge 会再次计数
+            self._metrics['events'] -= len(reopened)
+            self._metrics['merged'] -= len(reopened)
+            self._metrics['reopened'] += len(reopened)
+        if reopened:
+            logger.info(f"{len(reopened)} 个事件所属的警报已被处理，重新写入为新警报")
+        return reopened
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """合并指标的快照"""
+        metrics = dict(self._metrics)
+        metrics['open_groups'] = len(self._groups)
+        metrics['window_seconds'] = self.window_seconds
+        return metrics
+
+
+# 进程内共享的合并窗口，跨请求的 AlertSystem 实例共用
+alert_coalescer = AlertCoalescer()
@@ -0,0 +1,121 @@
+from typing import Dict, List, Any, Optional, Tuple, Iterable
+import logging
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select, update, delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import Alert, AlertCounter
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def counter_deltas(rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[int, str], int]:
+    """统计一批新警报对各 (用户, 状态) 计数的增量
+
+    Args:
+        rows: 警报插入行
+
+    Returns:
+        (用户ID, 状态) -> 增量
+    """
+    return dict(Counter((row['user_id'], row.get('status') or 'new') for row in rows))
+
+
+def apply_deltas(db: Session, deltas: Dict[Tuple[int, str], int]):
+    """在当前事务内累加计数，由调用方提交
+
+    PostgreSQL 和 SQLite 用 INSERT ... ON CONFLICT DO UPDATE 一条语句完成，
+    其他数据库先 UPDATE 再插入缺失的计数行。按键排序加锁，避免并发事务死锁。
+
+    Args:
+        db: 数据库会话
+        deltas: (用户ID, 状态) -> 增量
+    """
+    rows = [
+        {'user_id': user_id, 'status': status, 'count': delta, 'updated_at': datetime.utcnow()}
+        for (user_id, status), delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        dialect_insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = dialect_insert(AlertCounter)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'status'],
+            set_={
+                'count': AlertCounter.count + stmt.excluded.count,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        db.execute(stmt, rows)
+        return
+
+    missing = []
+    for row in rows:
+        result = db.execute(
+            update(AlertCounter)
+            .where(AlertCounter.user_id == row['user_id'], AlertCounter.status == row['status'])
+            .values(count=AlertCounter.count + row['count'], updated_at=row['updated_at'])
+        )
+        if result.rowcount == 0:
+            missing.append(row)
+    if missing:
+        db.execute(insert(AlertCounter), missing)
+
+
+def get_counts(db: Session, user_id: int) -> Dict[str, int]:
+    """读取用户各状态的警报数
+
+    Args:
+        db: 数据库会话
+        user_id: 用户ID
+
+    Returns:
+        状态 -> 警报数
+    """
+    rows = db.execute(
+        select(AlertCounter.status, AlertCounter.count).where(AlertCounter.user_id == user_id)
+    ).all()
+    return {status: max(count, 0) for status, count in rows}
+
+
+def rebuild_counts(db: Session, user_id: Optional[int] = None) -> int:
+    """按警报表重新计算计数并提交，用于首次启用计数或修复偏差
+
+    Args:
+        db: 数据库会话
+        user_id: 只重建该用户的计数，默认全部用户
+
+    Returns:
+        写入的计数行数
+    """
+    query = select(Alert.user_id, Alert.status, func.count()).group_by(Alert.user_id, Alert.status)
+    clear = delete(AlertCounter)
+    if user_id is not None:
+        query = query.where(Alert.user_id == user_id)
+        clear = clear.where(AlertCounter.user_id == user_id)
+
+    now = datetime.utcnow()
+    rows: List[Dict[str, Any]] = [
+        {'user_id': row_user_id, 'status': status, 'count': count, 'updated_at': now}
+        for row_user_id, status, count in db.execute(query).all()
+    ]
+    try:
+        db.execute(clear)
+        if rows:
+            db.execute(insert(AlertCounter), rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"重建警报计数出错: {str(e)}")
+        raise
+    logger.info(f"重建警报计数 {len(rows)} 行")
+    return len(rows)
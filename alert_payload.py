@@ -0,0 +1,139 @@
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app.models import Transaction
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 摘要中字符串字段的最大长度
+MAX_STRING_LENGTH = 200
+
+
+def _summary_value(value: Any) -> Tuple[bool, Any]:
+    """摘要中保留的标量值，列表、字典等大字段不保留
+
+    Returns:
+        (是否保留, 可JSON序列化的值)
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return True, value
+    if isinstance(value, str):
+        return True, value[:MAX_STRING_LENGTH]
+    if isinstance(value, datetime):
+        return True, value.isoformat()
+    if hasattr(value, 'item') and getattr(value, 'ndim', None) == 0:
+        # numpy 标量
+        return True, value.item()
+    if hasattr(value, '__float__'):
+        # Decimal 等数值类型（如 from_wei 的返回值）
+        return True, float(value)
+    return False, None
+
+
+def compact_anomaly(anomaly: Dict[str, Any]) -> Dict[str, Any]:
+    """异常的紧凑摘要
+
+    只保留顶层标量字段（地址、金额、区块、各检测器的标记和分数），去掉
+    format_transaction 带入的 data（以太坊 input、logs，比特币 inputs、outputs）
+    以及环路列表等大字段，完整交易通过 (blockchain, tx_hash) 引用按需查询。
+
+    Args:
+        anomaly: 异常数据
+
+    Returns:
+        可JSON序列化的摘要
+    """
+    summary = {}
+    for key, value in anomaly.items():
+        keep, value = _summary_value(value)
+        if keep:
+            summary[key] = value
+    return summary
+
+
+def transaction_ref(related_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """警报关联交易的引用 {blockchain, tx_hash}
+
+    优先使用 related_data['ref']，兼容大额交易警报的 transaction 和旧格式的 anomaly。
+
+    Args:
+        related_data: Alert.related_data
+
+    Returns:
+        交易引用，无法确定交易时为None
+    """
+    related = related_data or {}
+    for source in (related.get('ref'), related.get('transaction'), related.get('anomaly')):
+        if isinstance(source, dict) and source.get('tx_hash'):
+            return {'blockchain': source.get('blockchain', ''), 'tx_hash': source['tx_hash']}
+    return None
+
+
+def anomaly_related_data(anomaly: Dict[str, Any], wallet_address: Optional[str]) -> Dict[str, Any]:
+    """异常警报的 related_data: 交易引用 + 异常摘要
+
+    Args:
+        anomaly: 异常数据
+        wallet_address: 钱包地址
+
+    Returns:
+        紧凑的 related_data
+    """
+    related = {
+        'anomaly': compact_anomaly(anomaly),
+        'wallet_address': wallet_address
+    }
+    ref = transaction_ref(related)
+    if ref:
+        related['ref'] = ref
+    return related
+
+
+def compact_related_data(related_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """将旧格式的 related_data 转为紧凑格式，供迁移使用
+
+    Args:
+        related_data: Alert.related_data
+
+    Returns:
+        紧凑的 related_data，已是紧凑格式或无需处理时返回None
+    """
+    if not related_data or not isinstance(related_data.get('anomaly'), dict):
+        return None
+    anomaly = related_data['anomaly']
+    compacted = dict(related_data)
+    compacted['anomaly'] = compact_anomaly(anomaly)
+    if 'ref' not in compacted:
+        ref = transaction_ref(compacted)
+        if ref:
+            compacted['ref'] = ref
+    if compacted == related_data:
+        return None
+    return compacted
+
+
+def lookup_transactions(db: Session, refs: List[Dict[str, str]]) -> Dict[Tuple[str, str], Transaction]:
+    """按引用批量查询交易记录，使用 (blockchain, tx_hash) 唯一约束的索引
+
+    Args:
+        db: 数据库会话
+        refs: 交易引用列表
+
+    Returns:
+        (blockchain, tx_hash) -> 交易记录，未保存的交易不在结果中
+    """
+    hashes = {ref['tx_hash'] for ref in refs if ref.get('tx_hash')}
+    if not hashes:
+        return {}
+    wanted = {(ref.get('blockchain', ''), ref['tx_hash']) for ref in refs if ref.get('tx_hash')}
+    rows = db.query(Transaction).filter(Transaction.tx_hash.in_(hashes)).all()
+    return {
+        (row.blockchain, row.tx_hash): row
+        for row in rows
+        if (row.blockchain, row.tx_hash) in wanted
+    }
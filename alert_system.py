@@ -1,12 +1,20 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 from datetime import datetime
+import base64
 import json
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 
-from app.models import Alert, AlertConfig, WalletMonitor, User
+from app.models import Alert, Transaction
 from app.schemas import AlertCreate
-from app.config import settings
+from app.alerts.monitor_index import WatchedAddressIndex, watched_address_index
+from app.alerts.alert_writer import BulkAlertWriter
+from app.alerts.alert_coalescer import AlertCoalescer, alert_coalescer
+from app.alerts.notification_dispatcher import NotificationDispatcher
+from app.alerts.rule_engine import AlertRuleEngine, alert_rule_engine
+from app.alerts.alert_counter import apply_deltas, get_counts
+from app.alerts.alert_payload import anomaly_related_data, lookup_transactions, transaction_ref
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -15,13 +23,33 @@ logger = logging.getLogger(__name__)
 class AlertSystem:
     """警报系统模块"""
     
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        index: Optional[WatchedAddressIndex] = None,
+        writer: Optional[BulkAlertWriter] = None,
+        coalescer: Optional[AlertCoalescer] = None,
+        notifier: Optional[NotificationDispatcher] = None,
+        rules: Optional[AlertRuleEngine] = None
+    ):
         """初始化警报系统
         
         Args:
             db: 数据库会话
+            index: 被监控地址索引，默认使用进程内共享的索引
+            writer: 批量警报写入器，一笔交易或一批交易的警报只提交一次
+            coalescer: 警报合并窗口，默认使用进程内共享的窗口
+            notifier: 通知分发器，提供时新警报按 AlertConfig.notification_channels 异步投递
+            rules: 编译后的阈值规则，默认使用与索引对应的规则引擎
         """
         self.db = db
+        self.index = watched_address_index if index is None else index
+        self.writer = BulkAlertWriter(db) if writer is None else writer
+        self.coalescer = alert_coalescer if coalescer is None else coalescer
+        self.notifier = notifier
+        if rules is None:
+            rules = alert_rule_engine if self.index is watched_address_index else AlertRuleEngine(self.index)
+        self.rules = rules
         logger.info("警报系统初始化完成")
     
     def create_alert(self, alert_data: AlertCreate) -> Alert:
@@ -35,9 +63,11 @@ class AlertSystem:
         """
         alert = Alert(**alert_data.dict())
         self.db.add(alert)
+        apply_deltas(self.db, {(alert.user_id, alert.status or "new"): 1})
         self.db.commit()
         self.db.refresh(alert)
         logger.info(f"创建新警报: {alert.id}, 类型: {alert.alert_type}, 严重性: {alert.severity}")
+        self._notify([alert])
         return alert
     
     def process_transaction(self, transaction: Dict[str, Any]) -> List[Alert]:
@@ -49,67 +79,65 @@ class AlertSystem:
         Returns:
             生成的警报列表
         """
-        alerts = []
+        # 从内存索引匹配监控，索引过期时才访问数据库
+        self.index.ensure_fresh(self.db)
         
         # 检查是否为大额交易
-        if self._is_large_transaction(transaction):
-            # 查找监控该地址的用户
-            from_address = transaction.get('from_address', '')
-            to_address = transaction.get('to_address', '')
-            blockchain = transaction.get('blockchain', '')
-            
-            # 查找监控发送方地址的用户
-            if from_address:
-                monitors = self.db.query(WalletMonitor).filter(
-                    WalletMonitor.wallet_address == from_address,
-                    WalletMonitor.blockchain == blockchain,
-                    WalletMonitor.alert_enabled == True
-                ).all()
-                
-                for monitor in monitors:
-                    alert = self._create_large_transaction_alert(
-                        transaction, 
-                        monitor.user_id, 
-                        "outgoing", 
-                        monitor.wallet_address
-                    )
-                    alerts.append(alert)
-            
-            # 查找监控接收方地址的用户
-            if to_address:
-                monitors = self.db.query(WalletMonitor).filter(
-                    WalletMonitor.wallet_address == to_address,
-                    WalletMonitor.blockchain == blockchain,
-                    WalletMonitor.alert_enabled == True
-                ).all()
-                
-                for monitor in monitors:
-                    alert = self._create_large_transaction_alert(
-                        transaction, 
-                        monitor.user_id, 
-                        "incoming", 
-                        monitor.wallet_address
-                    )
-                    alerts.append(alert)
-            
-            # 查找设置了全局大额交易警报的用户
-            configs = self.db.query(AlertConfig).filter(
-                AlertConfig.alert_type == "large_transaction",
-                AlertConfig.enabled == True
-            ).all()
+        if not self._is_large_transaction(transaction):
+            return []
+        
+        return self._write_alerts([
+            self._large_transaction_alert_data(transaction, user_id, direction, wallet_address)
+            for user_id, direction, wallet_address in self._match_large_transaction(transaction)
+        ])
+    
+    def process_transactions(self, batch: List[Dict[str, Any]]) -> Dict[int, List[Alert]]:
+        """批量处理一个区块（或一批）交易并生成警报
+        
+        整批只检查一次索引是否过期，先用最小阈值筛出可能匹配规则的交易，
+        再逐笔匹配订阅者阈值，全部警报用一次批量插入写入，按用户分组返回。
+        
+        Args:
+            batch: 交易列表
             
-            for config in configs:
-                # 检查是否已经为该用户创建了警报
-                if not any(a.user_id == config.user_id for a in alerts):
-                    alert = self._create_large_transaction_alert(
-                        transaction, 
-                        config.user_id, 
-                        "global", 
-                        None
-                    )
-                    alerts.append(alert)
+        Returns:
+            用户ID -> 该用户的警报列表（按交易顺序）
+        """
+        alerts_by_user: Dict[int, List[Alert]] = {}
+        if not batch:
+            return alerts_by_user
         
-        return alerts
+        self.index.ensure_fresh(self.db)
+        min_threshold = self.rules.min_threshold()
+        large = [tx for tx in batch if float(tx.get('value', 0)) >= min_threshold]
+        if not large:
+            return alerts_by_user
+        
+        alert_data = [
+            self._large_transaction_alert_data(tx, user_id, direction, wallet_address)
+            for tx in large
+            for user_id, direction, wallet_address in self._match_large_transaction(tx)
+        ]
+        for alert in self._write_alerts(alert_data):
+            alerts_by_user.setdefault(alert.user_id, []).append(alert)
+        
+        logger.info(
+            f"批量处理 {len(batch)} 条交易，{len(large)} 条大额交易，"
+            f"为 {len(alerts_by_user)} 个用户生成 {sum(len(a) for a in alerts_by_user.values())} 条警报"
+        )
+        return alerts_by_user
+    
+    def _match_large_transaction(self, transaction: Dict[str, Any]) -> List[Tuple[int, str, Optional[str]]]:
+        """匹配需要收到大额交易警报的用户
+        
+        Args:
+            transaction: 交易数据
+            
+        Returns:
+            (用户ID, 交易方向, 钱包地址) 列表，每个全局配置用户最多一条
+        """
+        # 按各订阅者的阈值二分查找匹配
+        return self.rules.match_large_transaction(transaction)
     
     def process_anomaly(self, anomaly: Dict[str, Any]) -> List[Alert]:
         """处理异常并生成警报
@@ -120,8 +148,6 @@ class AlertSystem:
         Returns:
             生成的警报列表
         """
-        alerts = []
-        
         # 确定异常类型
         alert_type = "unknown_anomaly"
         if anomaly.get('ai_anomaly', False):
@@ -134,42 +160,57 @@ class AlertSystem:
         # 查找监控相关地址的用户
         from_address = anomaly.get('from_address', '')
         blockchain = anomaly.get('blockchain', '')
+        self.index.ensure_fresh(self.db)
         
-        if from_address:
-            monitors = self.db.query(WalletMonitor).filter(
-                WalletMonitor.wallet_address == from_address,
-                WalletMonitor.blockchain == blockchain,
-                WalletMonitor.alert_enabled == True
-            ).all()
-            
-            for monitor in monitors:
-                alert = self._create_anomaly_alert(
-                    anomaly, 
-                    monitor.user_id, 
-                    alert_type, 
-                    monitor.wallet_address
-                )
-                alerts.append(alert)
+        alert_data = []
+        for monitor in self.index.monitors(blockchain, from_address):
+            alert_data.append(self._anomaly_alert_data(anomaly, monitor.user_id, alert_type, monitor.wallet_address))
         
         # 查找设置了全局异常警报的用户
-        configs = self.db.query(AlertConfig).filter(
-            AlertConfig.alert_type == alert_type,
-            AlertConfig.enabled == True
-        ).all()
-        
-        for config in configs:
+        matched_users = {data.user_id for data in alert_data}
+        for user_id in self.index.global_users(alert_type):
             # 检查是否已经为该用户创建了警报
-            if not any(a.user_id == config.user_id for a in alerts):
-                alert = self._create_anomaly_alert(
-                    anomaly, 
-                    config.user_id, 
-                    alert_type, 
-                    None
-                )
-                alerts.append(alert)
+            if user_id not in matched_users:
+                alert_data.append(self._anomaly_alert_data(anomaly, user_id, alert_type, None))
+                matched_users.add(user_id)
+        
+        return self._write_alerts(alert_data)
+    
+    def _write_alerts(self, alert_data: List[AlertCreate]) -> List[Alert]:
+        """经合并窗口写入警报
+        
+        窗口内已有同一 (用户, 警报类型, 钱包) 警报的事件只更新该警报的计数和样本，
+        其余事件批量插入为新警报。
         
+        Args:
+            alert_data: 警报数据
+            
+        Returns:
+            新创建的警报，合并到已有警报的事件不再返回，避免重复通知
+        """
+        if not alert_data:
+            return []
+        fresh, updated = self.coalescer.merge(alert_data)
+        try:
+            alerts = self.writer.write_many([group.alert_data for group in fresh])
+        except Exception:
+            self.coalescer.discard(fresh)
+            raise
+        self.coalescer.bind(fresh, alerts)
+        reopened = self.coalescer.persist(self.db, updated)
+        self._notify(alerts)
+        if reopened:
+            # 合并目标已被处理（可能来自其他进程），这些事件重新开组写入
+            alerts = alerts + self._write_alerts(reopened)
         return alerts
     
+    def _notify(self, alerts: List[Alert]):
+        """将新警报交给通知分发器，只入队，不等待投递"""
+        if self.notifier is None or not alerts:
+            return
+        self.index.ensure_fresh(self.db)
+        self.notifier.notify_alerts(alerts, self.index.channel_targets)
+    
     def _is_large_transaction(self, transaction: Dict[str, Any]) -> bool:
         """检查是否为大额交易
         
@@ -177,19 +218,19 @@ class AlertSystem:
             transaction: 交易数据
             
         Returns:
-            是否为大额交易
+            金额是否达到任一订阅者（监控、警报配置或全局默认）的阈值
         """
         value = float(transaction.get('value', 0))
-        return value >= settings.LARGE_TRANSACTION_THRESHOLD
+        return value >= self.rules.min_threshold()
     
-    def _create_large_transaction_alert(
+    def _large_transaction_alert_data(
         self, 
         transaction: Dict[str, Any], 
         user_id: int, 
         direction: str, 
         wallet_address: Optional[str]
-    ) -> Alert:
-        """创建大额交易警报
+    ) -> AlertCreate:
+        """构建大额交易警报数据
         
         Args:
             transaction: 交易数据
@@ -198,7 +239,7 @@ class AlertSystem:
             wallet_address: 钱包地址
             
         Returns:
-            创建的警报对象
+            警报数据
         """
         value = float(transaction.get('value', 0))
         blockchain = transaction.get('blockchain', '')
@@ -238,17 +279,16 @@ class AlertSystem:
             status="new"
         )
         
-        # 创建警报
-        return self.create_alert(alert_data)
+        return alert_data
     
-    def _create_anomaly_alert(
+    def _anomaly_alert_data(
         self, 
         anomaly: Dict[str, Any], 
         user_id: int, 
         alert_type: str, 
         wallet_address: Optional[str]
-    ) -> Alert:
-        """创建异常警报
+    ) -> AlertCreate:
+        """构建异常警报数据
         
         Args:
             anomaly: 异常数据
@@ -257,7 +297,7 @@ class AlertSystem:
             wallet_address: 钱包地址
             
         Returns:
-            创建的警报对象
+            警报数据
         """
         blockchain = anomaly.get('blockchain', '')
         tx_hash = anomaly.get('tx_hash', '')
@@ -289,23 +329,50 @@ class AlertSystem:
             severity="medium" if alert_type != "fund_dispersion" else "high",
             title=title,
             description=description,
-            related_data={
-                "anomaly": anomaly,
-                "wallet_address": wallet_address
-            },
+            # 只保存交易引用和异常摘要，完整交易通过 get_alert_transaction 查询
+            related_data=anomaly_related_data(anomaly, wallet_address),
             status="new"
         )
         
-        # 创建警报
-        return self.create_alert(alert_data)
+        return alert_data
     
-    def get_user_alerts(self, user_id: int, status: Optional[str] = None, limit: int = 100) -> List[Alert]:
+    @staticmethod
+    def encode_cursor(alert: Alert) -> str:
+        """将警报的 (created_at, id) 编码为不透明的分页游标"""
+        raw = json.dumps([alert.created_at.isoformat(), alert.id])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """解码分页游标
+        
+        Raises:
+            ValueError: 游标格式无效
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, alert_id = json.loads(raw)
+            return datetime.fromisoformat(created_at), int(alert_id)
+        except Exception:
+            raise ValueError(f"无效的分页游标: {cursor}")
+    
+    def get_user_alerts(
+        self, 
+        user_id: int, 
+        status: Optional[str] = None, 
+        limit: int = 100, 
+        cursor: Optional[str] = None
+    ) -> List[Alert]:
         """获取用户警报
         
+        按 (created_at, id) 倒序，使用 (user_id, created_at, id) 复合索引做游标分页，
+        翻页代价与页码无关。
+        
         Args:
             user_id: 用户ID
             status: 警报状态过滤
             limit: 返回结果数量限制
+            cursor: 上一页最后一条警报的游标，返回其之后（更早）的警报
             
         Returns:
             警报列表
@@ -315,10 +382,68 @@ class AlertSystem:
         if status:
             query = query.filter(Alert.status == status)
         
-        query = query.order_by(Alert.created_at.desc()).limit(limit)
+        if cursor:
+            created_at, alert_id = self.decode_cursor(cursor)
+            query = query.filter(tuple_(Alert.created_at, Alert.id) < tuple_(created_at, alert_id))
+        
+        query = query.order_by(Alert.created_at.desc(), Alert.id.desc()).limit(limit)
         
         return query.all()
     
+    def get_user_alerts_page(
+        self, 
+        user_id: int, 
+        status: Optional[str] = None, 
+        limit: int = 100, 
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Alert], Optional[str]]:
+        """获取一页用户警报及下一页游标
+        
+        Args:
+            user_id: 用户ID
+            status: 警报状态过滤
+            limit: 每页数量
+            cursor: 上一页返回的游标，首页为None
+            
+        Returns:
+            (警报列表, 下一页游标)，没有更多警报时游标为None
+        """
+        # 多取一条判断是否还有下一页
+        alerts = self.get_user_alerts(user_id, status=status, limit=limit + 1, cursor=cursor)
+        if len(alerts) <= limit:
+            return alerts, None
+        alerts = alerts[:limit]
+        return alerts, self.encode_cursor(alerts[-1])
+    
+    def get_alert_counts(self, user_id: int) -> Dict[str, int]:
+        """获取用户各状态的警报数（读取计数器，不扫描警报表）
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            状态 -> 警报数
+        """
+        return get_counts(self.db, user_id)
+    
+    def get_alert_transaction(self, alert_id: int, user_id: int) -> Optional[Transaction]:
+        """按警报中的交易引用查询完整交易记录
+        
+        Args:
+            alert_id: 警报ID
+            user_id: 用户ID，只能查询自己的警报
+            
+        Returns:
+            交易记录，警报不存在、没有关联交易或交易未保存时返回None
+        """
+        alert = self.db.query(Alert).filter(Alert.id == alert_id, Alert.user_id == user_id).first()
+        if alert is None:
+            return None
+        ref = transaction_ref(alert.related_data)
+        if ref is None:
+            return None
+        return lookup_transactions(self.db, [ref]).get((ref['blockchain'], ref['tx_hash']))
+    
     def update_alert_status(self, alert_id: int, status: str) -> Optional[Alert]:
         """更新警报状态
         
@@ -329,9 +454,12 @@ class AlertSystem:
         Returns:
             更新后的警报对象，如果不存在则返回None
         """
-        alert = self.db.query(Alert).filter(Alert.id == alert_id).first()
+        # 锁定警报行，并发更新同一警报时计数不会重复增减
+        alert = self.db.query(Alert).filter(Alert.id == alert_id).with_for_update().first()
         
         if alert:
+            if alert.status != status:
+                apply_deltas(self.db, {(alert.user_id, alert.status): -1, (alert.user_id, status): 1})
             alert.status = status
             if status == "resolved":
                 alert.resolved_at = datetime.utcnow()
@@ -339,6 +467,9 @@ class AlertSystem:
             
             self.db.commit()
             self.db.refresh(alert)
+            if status != "new":
+                # 已处理的警报不再合并新事件，后续事件产生新的警报
+                self.coalescer.close(alert_id)
             logger.info(f"更新警报 {alert_id} 状态为 {status}")
         
         return alert
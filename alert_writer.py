@@ -0,0 +1,91 @@
+from typing import Dict, List, Any, Optional
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models import Alert
+from app.schemas import AlertCreate
+from app.config import settings
+from app.alerts.alert_counter import apply_deltas, counter_deltas
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class BulkAlertWriter:
+    """批量写入警报
+
+    一批 AlertCreate 用多行 INSERT ... RETURNING id 写入并只提交一次，
+    不再为每条警报执行 add、commit、refresh；各用户的状态计数在同一事务内累加。
+    写入是同步的，调用返回时警报已提交，不在进程内缓冲。
+    """
+
+    def __init__(self, db: Session, max_batch_size: Optional[int] = None):
+        """初始化批量写入器
+
+        Args:
+            db: 数据库会话
+            max_batch_size: 每条 INSERT 语句最多写入的警报数，超过时分块执行
+        """
+        self.db = db
+        self.max_batch_size = max_batch_size or settings.ALERT_WRITER_BATCH_SIZE
+        self._metrics = {'flushes': 0, 'alerts_written': 0, 'errors': 0}
+
+    @staticmethod
+    def _row(alert_data: AlertCreate) -> Dict[str, Any]:
+        """转换为插入行"""
+        now = datetime.utcnow()
+        row = alert_data.dict()
+        row['created_at'] = now
+        row['updated_at'] = now
+        return row
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """分块插入并提交，失败时回滚
+
+        Returns:
+            按输入顺序的警报ID
+        """
+        ids: List[int] = []
+        try:
+            for start in range(0, len(rows), self.max_batch_size):
+                chunk = rows[start:start + self.max_batch_size]
+                # 按参数顺序返回ID，多行 INSERT 的 RETURNING 本身不保证顺序
+                ids.extend(self.db.scalars(
+                    insert(Alert).returning(Alert.id, sort_by_parameter_order=True), chunk
+                ).all())
+            # 计数与警报在同一事务内提交
+            apply_deltas(self.db, counter_deltas(rows))
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            self._metrics['errors'] += 1
+            logger.error(f"批量写入警报出错: {str(e)}")
+            raise
+        self._metrics['flushes'] += 1
+        self._metrics['alerts_written'] += len(ids)
+        logger.info(f"批量写入 {len(ids)} 条警报")
+        return ids
+
+    def write_many(self, alerts: List[AlertCreate]) -> List[Alert]:
+        """写入一批警报，只提交一次
+
+        Args:
+            alerts: 警报数据
+
+        Returns:
+            与输入一一对应的 Alert 对象（未加入会话），ID 来自 RETURNING，不再逐条 refresh
+        """
+        if not alerts:
+            return []
+        rows = [self._row(alert_data) for alert_data in alerts]
+        ids = self._insert(rows)
+        return [Alert(id=alert_id, **row) for alert_id, row in zip(ids, rows)]
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """写入指标的快照"""
+        return dict(self._metrics)
@@ -0,0 +1,76 @@
+"""环形转账检测基准测试
+
+在对抗性稠密图（完全有向图、随机时间戳）上比较 networkx.simple_cycles
+与有界时间递增检测器的耗时。simple_cycles 在这类图上的环数量呈指数增长，
+因此只在给定时间内枚举并记录已找到的环数。
+
+用法: python benchmark_cycle_detection.py [节点数...]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import networkx as nx
+
+from app.analytics.flow_graph import FlowGraph
+from app.analytics.cycle_detection import TemporalCycleDetector
+
+
+def build_dense_graph(node_count: int, seed: int = 42) -> FlowGraph:
+    """构建完全有向图，每条边带随机时间戳"""
+    rng = random.Random(seed)
+    start = datetime(2025, 3, 25)
+    graph = FlowGraph(window=timedelta(days=7), max_neighbourhood=node_count + 1)
+    for i in range(node_count):
+        for j in range(node_count):
+            if i == j:
+                continue
+            graph.add_transaction({
+                'tx_hash': f"{i}-{j}",
+                'from_address': f"addr{i}",
+                'to_address': f"addr{j}",
+                'value': rng.uniform(0.1, 10.0),
+                'block_timestamp': start + timedelta(seconds=rng.randint(0, 86400))
+            })
+    return graph
+
+
+def bench_simple_cycles(graph: FlowGraph, limit_seconds: float):
+    """在时间上限内枚举 networkx 的所有简单环"""
+    G = graph.subgraph(graph.neighbourhood("addr0", hops=1))
+    count = 0
+    t0 = time.perf_counter()
+    for _ in nx.simple_cycles(G):
+        count += 1
+        if time.perf_counter() - t0 > limit_seconds:
+            return count, time.perf_counter() - t0, True
+    return count, time.perf_counter() - t0, False
+
+
+def bench_temporal(graph: FlowGraph, max_hops: int, max_cycles: int, budget_ms: float):
+    """运行有界时间递增检测器"""
+    detector = TemporalCycleDetector(graph, max_hops=max_hops, max_cycles=max_cycles, time_budget_ms=budget_ms)
+    t0 = time.perf_counter()
+    result = detector.find_cycles("addr0")
+    return result, time.perf_counter() - t0
+
+
+def main(sizes):
+    print(f"{'nodes':>6} {'edges':>7} | {'simple_cycles':>24} | {'temporal(k=6,K=5)':>28} | {'temporal(k=4,K=1000)':>28}")
+    for n in sizes:
+        graph = build_dense_graph(n)
+        nx_count, nx_time, nx_cut = bench_simple_cycles(graph, limit_seconds=5.0)
+        fast, fast_time = bench_temporal(graph, max_hops=6, max_cycles=5, budget_ms=50)
+        wide, wide_time = bench_temporal(graph, max_hops=4, max_cycles=1000, budget_ms=200)
+        print(
+            f"{n:>6} {len(graph):>7} | "
+            f"{nx_count:>9} cycles {nx_time * 1000:>7.1f}ms{'*' if nx_cut else ' '} | "
+            f"{len(fast['cycles']):>5} cycles {fast_time * 1000:>7.2f}ms {fast['explored_edges']:>6}e | "
+            f"{len(wide['cycles']):>5} cycles {wide_time * 1000:>7.2f}ms {wide['explored_edges']:>6}e"
+        )
+    print("* simple_cycles 达到时间上限被中断")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [8, 16, 32, 64])
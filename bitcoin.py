@@ -5,6 +5,7 @@ import logging
 from datetime import datetime
 
 from app.config import settings
+from app.analytics.feature_store import FeatureStore
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -13,8 +14,10 @@ logger = logging.getLogger(__name__)
 class BitcoinClient:
     """比特币区块链客户端"""
     
-    def __init__(self, rpc_url: str = settings.BITCOIN_RPC_URL):
+    def __init__(self, rpc_url: str = settings.BITCOIN_RPC_URL, feature_store: Optional[FeatureStore] = None):
         """初始化比特币客户端"""
+        # 挂接的特征存储，已收录的地址直接读取窗口内的转出次数
+        self.feature_store = feature_store
         try:
             self.service = Service(network='bitcoin')
             logger.info("成功初始化比特币客户端")
@@ -95,6 +98,11 @@ class BitcoinClient:
         Returns:
             bool: 是否检测到资金分散转出
         """
+        if self.feature_store is not None:
+            out_count = self.feature_store.out_count(address, time_window)
+            if out_count is not None:
+                return out_count >= threshold
+        
         # 获取地址的交易
         transactions = self.get_transactions_by_address(address)
         
@@ -33,6 +33,67 @@ class Settings(BaseModel):
     
     # 警报设置
     LARGE_TRANSACTION_THRESHOLD: float = float(os.getenv("LARGE_TRANSACTION_THRESHOLD", "500000"))
+    MONITOR_INDEX_REFRESH_SECONDS: float = float(os.getenv("MONITOR_INDEX_REFRESH_SECONDS", "60"))
+    ALERT_WRITER_BATCH_SIZE: int = int(os.getenv("ALERT_WRITER_BATCH_SIZE", "500"))
+    ALERT_COALESCE_WINDOW_SECONDS: float = float(os.getenv("ALERT_COALESCE_WINDOW_SECONDS", "300"))
+    ALERT_COALESCE_MAX_SAMPLES: int = int(os.getenv("ALERT_COALESCE_MAX_SAMPLES", "10"))
+    
+    # 通知分发设置
+    NOTIFY_BATCH_SIZE: int = int(os.getenv("NOTIFY_BATCH_SIZE", "50"))
+    NOTIFY_MAX_DELAY_MS: float = float(os.getenv("NOTIFY_MAX_DELAY_MS", "200"))
+    NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+    NOTIFY_WORKERS_PER_CHANNEL: int = int(os.getenv("NOTIFY_WORKERS_PER_CHANNEL", "2"))
+    NOTIFY_MAX_RETRIES: int = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+    NOTIFY_BACKOFF_BASE_MS: float = float(os.getenv("NOTIFY_BACKOFF_BASE_MS", "100"))
+    NOTIFY_BACKOFF_MAX_MS: float = float(os.getenv("NOTIFY_BACKOFF_MAX_MS", "10000"))
+    NOTIFY_SPOOL_PATH: str = os.getenv("NOTIFY_SPOOL_PATH", "notification_spool.jsonl")
+    NOTIFY_SPOOL_REPLAY_SECONDS: float = float(os.getenv("NOTIFY_SPOOL_REPLAY_SECONDS", "60"))
+    # 渠道名与 AlertConfig.notification_channels 的键对应。webhook 渠道投递到用户在
+    # notification_channels 中配置的地址，用户只写 true 时使用 NOTIFY_WEBHOOK_URL；
+    # file 渠道在设置 NOTIFY_FILE_PATH 后启用。其他渠道（如 email、sms）没有投递实现，
+    # 计入分发器的 unroutable 指标并记录警告
+    NOTIFY_WEBHOOK_URL: str = os.getenv("NOTIFY_WEBHOOK_URL", "")
+    NOTIFY_FILE_PATH: str = os.getenv("NOTIFY_FILE_PATH", "")
+    
+    # 资金流向图设置
+    FLOW_GRAPH_WINDOW_HOURS: int = int(os.getenv("FLOW_GRAPH_WINDOW_HOURS", "72"))
+    FLOW_GRAPH_MAX_HOPS: int = int(os.getenv("FLOW_GRAPH_MAX_HOPS", "2"))
+    FLOW_GRAPH_MAX_NEIGHBOURHOOD: int = int(os.getenv("FLOW_GRAPH_MAX_NEIGHBOURHOOD", "500"))
+    CYCLE_MAX_HOPS: int = int(os.getenv("CYCLE_MAX_HOPS", "6"))
+    CYCLE_MAX_RESULTS: int = int(os.getenv("CYCLE_MAX_RESULTS", "5"))
+    CYCLE_TIME_BUDGET_MS: float = float(os.getenv("CYCLE_TIME_BUDGET_MS", "50"))
+    
+    # 资金追踪设置
+    TRACE_MAX_HOPS: int = int(os.getenv("TRACE_MAX_HOPS", "5"))
+    TRACE_MIN_VALUE: float = float(os.getenv("TRACE_MIN_VALUE", "0.01"))
+    TRACE_MAX_EDGES: int = int(os.getenv("TRACE_MAX_EDGES", "100000"))
+    TRACE_MAX_RELATED_ENTITIES: int = int(os.getenv("TRACE_MAX_RELATED_ENTITIES", "20"))
+    TRACE_MERGE_INTERVAL_SECONDS: float = float(os.getenv("TRACE_MERGE_INTERVAL_SECONDS", "30"))
+    
+    # 特征存储设置（窗口长度单位为秒）
+    FEATURE_STORE_WINDOWS: list = [int(w) for w in os.getenv("FEATURE_STORE_WINDOWS", "3600,86400,604800").split(",")]
+    FEATURE_STORE_BUCKETS: int = int(os.getenv("FEATURE_STORE_BUCKETS", "12"))
+    FEATURE_STORE_PATH: str = os.getenv("FEATURE_STORE_PATH", "feature_store.npz")
+    
+    # 异常检测级联设置
+    CASCADE_THRESHOLD: float = float(os.getenv("CASCADE_THRESHOLD", "3.0"))
+    CASCADE_EWMA_ALPHA: float = float(os.getenv("CASCADE_EWMA_ALPHA", "0.1"))
+    CASCADE_WARMUP: int = int(os.getenv("CASCADE_WARMUP", "5"))
+    
+    # 训练样本蓄水池设置（金额分档边界取以10为底的对数）
+    TRAINING_SAMPLE_PER_STRATUM: int = int(os.getenv("TRAINING_SAMPLE_PER_STRATUM", "2000"))
+    TRAINING_VALUE_BAND_EDGES: list = [float(e) for e in os.getenv("TRAINING_VALUE_BAND_EDGES", "-2,0,1,2,3,4").split(",")]
+    
+    # LSTM推理设置
+    LSTM_INFERENCE_BATCH_SIZE: int = int(os.getenv("LSTM_INFERENCE_BATCH_SIZE", "1024"))
+    INFERENCE_MAX_BATCH_SIZE: int = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "512"))
+    INFERENCE_MAX_DELAY_MS: float = float(os.getenv("INFERENCE_MAX_DELAY_MS", "5"))
+    INFERENCE_MAX_QUEUE_DEPTH: int = int(os.getenv("INFERENCE_MAX_QUEUE_DEPTH", "10000"))
+    
+    # 模型仓库设置
+    MODEL_REGISTRY_PATH: str = os.getenv("MODEL_REGISTRY_PATH", "model_registry")
+    MODEL_REGISTRY_REFRESH_SECONDS: float = float(os.getenv("MODEL_REGISTRY_REFRESH_SECONDS", "5"))
+    MODEL_REGISTRY_CACHE_SIZE: int = int(os.getenv("MODEL_REGISTRY_CACHE_SIZE", "8"))
     
     # 国际化设置
     DEFAULT_LANGUAGE: str = "zh"
@@ -0,0 +1,435 @@
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.analytics.flow_graph import to_epoch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 节点ID与边索引的数据类型
+NODE_DTYPE = np.int32
+INDEX_DTYPE = np.int64
+TX_HASH_DTYPE = 'S66'
+
+# 持久化时写入的数组文件
+_ARRAY_FILES = (
+    'out_indptr', 'out_dst', 'value', 'timestamp', 'tx_hash',
+    'in_indptr', 'in_src', 'in_edge',
+    'out_unique_degree', 'in_unique_degree',
+    'address_keys', 'address_key_ids'
+)
+
+
+class AddressInterner:
+    """地址驻留表，将地址字符串映射为连续的整数ID"""
+
+    def __init__(self, addresses: Optional[Iterable[str]] = None):
+        """初始化地址驻留表
+
+        Args:
+            addresses: 按ID顺序排列的已有地址
+        """
+        self._ids: Dict[str, int] = {}
+        self._addresses: List[str] = []
+        # 从只读文件加载时使用排序数组做二分查找，不必构建字典
+        self._sorted_keys: Optional[np.ndarray] = None
+        self._sorted_ids: Optional[np.ndarray] = None
+        self._inverse: Optional[np.ndarray] = None
+        for address in addresses or []:
+            self.intern(address)
+
+    def __len__(self) -> int:
+        if self._sorted_keys is not None:
+            return len(self._sorted_keys)
+        return len(self._addresses)
+
+    def intern(self, address: str) -> int:
+        """获取地址ID，不存在时分配新ID"""
+        if self._sorted_keys is not None:
+            raise RuntimeError("只读地址表不能追加新地址")
+        address_id = self._ids.get(address)
+        if address_id is None:
+            address_id = len(self._addresses)
+            self._ids[address] = address_id
+            self._addresses.append(address)
+        return address_id
+
+    def lookup(self, address: str) -> int:
+        """查找地址ID
+
+        Returns:
+            地址ID，不存在时返回 -1
+        """
+        if self._sorted_keys is None:
+            return self._ids.get(address, -1)
+        key = address.encode()
+        pos = int(np.searchsorted(self._sorted_keys, key))
+        if pos < len(self._sorted_keys) and self._sorted_keys[pos] == key:
+            return int(self._sorted_ids[pos])
+        return -1
+
+    def address(self, address_id: int) -> str:
+        """根据ID取回地址"""
+        return self.addresses([address_id])[0]
+
+    def addresses(self, address_ids: Iterable[int]) -> List[str]:
+        """批量取回地址"""
+        if self._sorted_keys is None:
+            return [self._addresses[i] for i in address_ids]
+        if self._inverse is None:
+            # ID -> 排序位置的逆映射，按需构建一次
+            self._inverse = np.empty(len(self._sorted_ids), dtype=INDEX_DTYPE)
+            self._inverse[self._sorted_ids] = np.arange(len(self._sorted_ids))
+        return [self._sorted_keys[self._inverse[i]].decode() for i in address_ids]
+
+    def sorted_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """导出按地址排序的键数组与对应ID，用于持久化"""
+        if self._sorted_keys is not None:
+            return self._sorted_keys, self._sorted_ids
+        keys = np.array([a.encode() for a in self._addresses], dtype=f"S{max((len(a) for a in self._addresses), default=1)}")
+        order = np.argsort(keys, kind='stable')
+        return keys[order], order.astype(NODE_DTYPE)
+
+    @classmethod
+    def from_sorted_arrays(cls, keys: np.ndarray, ids: np.ndarray) -> 'AddressInterner':
+        """从排序数组（可为内存映射）构建只读地址表"""
+        interner = cls()
+        interner._sorted_keys = keys
+        interner._sorted_ids = ids
+        return interner
+
+
+class CSRGraph:
+    """基于CSR/CSC数组的紧凑资金流向图
+
+    地址被驻留为整数ID，边按发送方排序存放在CSR数组中，交易金额、
+    时间戳和哈希作为与边对齐的列存储；CSC数组保存指向同一列的边索引，
+    用于反向查询。新边先写入追加缓冲区，累积到阈值或距上次合并超过合并
+    间隔后统一合并。
+    保存后的图可以通过内存映射只读加载，多个工作进程共享同一份物理内存。
+    """
+
+    def __init__(self, merge_threshold: int = 100000, merge_interval_seconds: Optional[float] = None):
+        """初始化CSR图
+
+        Args:
+            merge_threshold: 追加缓冲区达到该边数时自动合并
+            merge_interval_seconds: 距上次合并超过该秒数后，下一次追加时合并；
+                None 表示只按边数合并
+        """
+        self.merge_threshold = merge_threshold
+        self.merge_interval_seconds = merge_interval_seconds
+        self._merged_at = time.monotonic()
+        self.interner = AddressInterner()
+        self.read_only = False
+
+        self.out_indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        self.out_dst = np.zeros(0, dtype=NODE_DTYPE)
+        self.value = np.zeros(0, dtype=np.float64)
+        self.timestamp = np.zeros(0, dtype=np.float64)
+        self.tx_hash = np.zeros(0, dtype=TX_HASH_DTYPE)
+        self.in_indptr = np.zeros(1, dtype=INDEX_DTYPE)
+        self.in_src = np.zeros(0, dtype=NODE_DTYPE)
+        self.in_edge = np.zeros(0, dtype=INDEX_DTYPE)
+        self.out_unique_degree = np.zeros(0, dtype=INDEX_DTYPE)
+        self.in_unique_degree = np.zeros(0, dtype=INDEX_DTYPE)
+        # 按交易哈希排序的边索引，按哈希二分查找边
+        self._tx_hash_order: Optional[np.ndarray] = None
+
+        # 追加缓冲区
+        self._buffer_src: List[int] = []
+        self._buffer_dst: List[int] = []
+        self._buffer_value: List[float] = []
+        self._buffer_timestamp: List[float] = []
+        self._buffer_tx_hash: List[bytes] = []
+        self._lock = threading.Lock()
+
+    @property
+    def node_count(self) -> int:
+        """已合并的节点数量"""
+        return len(self.out_indptr) - 1
+
+    @property
+    def edge_count(self) -> int:
+        """已合并的边数量"""
+        return len(self.out_dst)
+
+    @property
+    def pending_count(self) -> int:
+        """追加缓冲区中尚未合并的边数量"""
+        return len(self._buffer_src)
+
+    @property
+    def src(self) -> np.ndarray:
+        """CSR顺序下每条边的发送方ID"""
+        return np.repeat(np.arange(self.node_count, dtype=NODE_DTYPE), np.diff(self.out_indptr))
+
+    def add_edge(self, from_address: str, to_address: str, value: float, timestamp: float, tx_hash: str = ''):
+        """向追加缓冲区写入一条边"""
+        if self.read_only:
+            raise RuntimeError("内存映射的只读图不能追加边")
+        with self._lock:
+            self._buffer_src.append(self.interner.intern(from_address))
+            self._buffer_dst.append(self.interner.intern(to_address))
+            self._buffer_value.append(float(value))
+            self._buffer_timestamp.append(float(timestamp))
+            self._buffer_tx_hash.append(tx_hash.encode())
+            should_merge = len(self._buffer_src) >= self.merge_threshold or (
+                self.merge_interval_seconds is not None
+                and time.monotonic() - self._merged_at >= self.merge_interval_seconds
+            )
+        if should_merge:
+            self.merge()
+
+    def add_transaction(self, tx: Dict[str, Any]) -> bool:
+        """将交易写入追加缓冲区
+
+        Returns:
+            交易是否包含有效的收发地址
+        """
+        from_addr = tx.get('from_address', '')
+        to_addr = tx.get('to_address', '')
+        if not from_addr or not to_addr:
+            return False
+        self.add_edge(
+            from_addr,
+            to_addr,
+            float(tx.get('value', 0)),
+            to_epoch(tx.get('block_timestamp')),
+            tx.get('tx_hash', '')
+        )
+        return True
+
+    def add_transactions(self, transactions: Iterable[Dict[str, Any]]) -> int:
+        """批量写入交易"""
+        return sum(1 for tx in transactions if self.add_transaction(tx))
+
+    def merge(self):
+        """将追加缓冲区合并到CSR/CSC数组"""
+        with self._lock:
+            self._merged_at = time.monotonic()
+            if not self._buffer_src:
+                return
+            n = len(self.interner)
+            src = np.concatenate([self.src, np.asarray(self._buffer_src, dtype=NODE_DTYPE)])
+            dst = np.concatenate([self.out_dst, np.asarray(self._buffer_dst, dtype=NODE_DTYPE)])
+            value = np.concatenate([self.value, np.asarray(self._buffer_value, dtype=np.float64)])
+            timestamp = np.concatenate([self.timestamp, np.asarray(self._buffer_timestamp, dtype=np.float64)])
+            tx_hash = np.concatenate([self.tx_hash, np.asarray(self._buffer_tx_hash, dtype=TX_HASH_DTYPE)])
+            self._buffer_src, self._buffer_dst = [], []
+            self._buffer_value, self._buffer_timestamp, self._buffer_tx_hash = [], [], []
+
+            # CSR: 按 (发送方, 时间戳) 排序，邻接边按时间有序便于时间递增遍历
+            order = np.lexsort((timestamp, src))
+            src, dst = src[order], dst[order]
+            self.out_dst = dst
+            self.value = value[order]
+            self.timestamp = timestamp[order]
+            self.tx_hash = tx_hash[order]
+            self._tx_hash_order = np.argsort(self.tx_hash, kind='stable').astype(INDEX_DTYPE)
+            self.out_indptr = self._indptr(src, n)
+
+            # CSC: 按 (接收方, 时间戳) 排序，记录指向CSR列的边索引
+            in_order = np.lexsort((self.timestamp, dst))
+            self.in_edge = in_order.astype(INDEX_DTYPE)
+            self.in_src = src[in_order]
+            self.in_indptr = self._indptr(dst[in_order], n)
+
+            # 去重后的度数，与 networkx 中 (发送方, 接收方) 只算一条边的语义一致
+            pairs = np.unique(src.astype(np.int64) * n + dst)
+            self.out_unique_degree = np.bincount(pairs // n, minlength=n).astype(INDEX_DTYPE)
+            self.in_unique_degree = np.bincount(pairs % n, minlength=n).astype(INDEX_DTYPE)
+        logger.info(f"CSR图合并完成: {self.node_count} 个地址, {self.edge_count} 条边")
+
+    @staticmethod
+    def _indptr(sorted_keys: np.ndarray, n: int) -> np.ndarray:
+        """根据已排序的行键构建indptr"""
+        indptr = np.zeros(n + 1, dtype=INDEX_DTYPE)
+        np.cumsum(np.bincount(sorted_keys, minlength=n), out=indptr[1:])
+        return indptr
+
+    @staticmethod
+    def _gather(indptr: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """向量化收集多个节点在CSR中的边位置"""
+        starts = indptr[nodes]
+        lengths = indptr[nodes + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(total, dtype=INDEX_DTYPE)
+
+    def node_ids(self, addresses: Iterable[str]) -> np.ndarray:
+        """将地址批量转换为节点ID，忽略未知地址"""
+        ids = [self.interner.lookup(a) for a in addresses]
+        return np.asarray([i for i in ids if 0 <= i < self.node_count], dtype=NODE_DTYPE)
+
+    def edges_for_tx(self, tx_hash: str) -> np.ndarray:
+        """交易对应的边索引（CSR顺序），按哈希排序索引二分查找
+
+        Args:
+            tx_hash: 交易哈希
+
+        Returns:
+            边索引，升序
+        """
+        order = self._tx_hash_order
+        if order is None or len(order) != len(self.tx_hash):
+            # 从文件加载的图在首次查找时建立排序索引
+            order = np.argsort(self.tx_hash, kind='stable').astype(INDEX_DTYPE)
+            self._tx_hash_order = order
+        key = np.asarray([tx_hash.encode()], dtype=TX_HASH_DTYPE)
+        start = int(np.searchsorted(self.tx_hash, key, side='left', sorter=order)[0])
+        end = int(np.searchsorted(self.tx_hash, key, side='right', sorter=order)[0])
+        return np.sort(order[start:end])
+
+    def out_degree(self, address: str, unique: bool = True) -> int:
+        """地址的流出度数
+
+        Args:
+            address: 地址
+            unique: 是否按不同接收方计数（与 networkx.DiGraph 一致）
+        """
+        node = self.interner.lookup(address)
+        if node < 0 or node >= self.node_count:
+            return 0
+        if unique:
+            return int(self.out_unique_degree[node])
+        return int(self.out_indptr[node + 1] - self.out_indptr[node])
+
+    def in_degree(self, address: str, unique: bool = True) -> int:
+        """地址的流入度数"""
+        node = self.interner.lookup(address)
+        if node < 0 or node >= self.node_count:
+            return 0
+        if unique:
+            return int(self.in_unique_degree[node])
+        return int(self.in_indptr[node + 1] - self.in_indptr[node])
+
+    def out_edges(self, address: str) -> Dict[str, np.ndarray]:
+        """地址的流出边列（按时间排序）"""
+        node = self.interner.lookup(address)
+        if node < 0 or node >= self.node_count:
+            return {'dst': np.zeros(0, dtype=NODE_DTYPE), 'value': np.zeros(0), 'timestamp': np.zeros(0)}
+        start, end = self.out_indptr[node], self.out_indptr[node + 1]
+        return {
+            'dst': self.out_dst[start:end],
+            'value': self.value[start:end],
+            'timestamp': self.timestamp[start:end]
+        }
+
+    def k_hop(self, sources: Iterable[int], k: int, direction: str = 'both') -> np.ndarray:
+        """k跳邻域扩展
+
+        Args:
+            sources: 起点节点ID
+            k: 跳数
+            direction: out / in / both
+
+        Returns:
+            邻域内的节点ID（包含起点）
+        """
+        visited = np.zeros(self.node_count, dtype=bool)
+        frontier = np.unique(np.asarray(list(sources), dtype=NODE_DTYPE))
+        visited[frontier] = True
+        for _ in range(k):
+            if len(frontier) == 0:
+                break
+            neighbours = []
+            if direction in ('out', 'both'):
+                neighbours.append(self.out_dst[self._gather(self.out_indptr, frontier)])
+            if direction in ('in', 'both'):
+                neighbours.append(self.in_src[self._gather(self.in_indptr, frontier)])
+            candidates = np.unique(np.concatenate(neighbours))
+            frontier = candidates[~visited[candidates]]
+            visited[frontier] = True
+        return np.flatnonzero(visited).astype(NODE_DTYPE)
+
+    def mixing_nodes(self, nodes: Optional[np.ndarray] = None) -> np.ndarray:
+        """混币模式节点：不同发送方和不同接收方均多于2个"""
+        mask = (self.in_unique_degree > 2) & (self.out_unique_degree > 2)
+        if nodes is None:
+            return np.flatnonzero(mask).astype(NODE_DTYPE)
+        return nodes[mask[nodes]]
+
+    def dispersion_nodes(self, min_recipients: int = 3) -> np.ndarray:
+        """资金分散节点：不同接收方数量多于 min_recipients"""
+        return np.flatnonzero(self.out_unique_degree > min_recipients).astype(NODE_DTYPE)
+
+    def analyze_fund_flow(self, address: str, hops: int = 2) -> Dict[str, Any]:
+        """与 TransactionAnalyzer.analyze_fund_flow 相同口径的分散与混币检查
+
+        Args:
+            address: 发送方地址
+            hops: 混币检查的邻域跳数
+
+        Returns:
+            资金流向分析结果
+        """
+        flow_analysis = {
+            'fund_dispersion': False,
+            'dispersion_count': 0,
+            'mixing_pattern': False
+        }
+        node = self.interner.lookup(address)
+        if node < 0 or node >= self.node_count:
+            return flow_analysis
+
+        out_degree = int(self.out_unique_degree[node])
+        if out_degree > 3:
+            flow_analysis['fund_dispersion'] = True
+            flow_analysis['dispersion_count'] = out_degree
+
+        if len(self.mixing_nodes(self.k_hop([node], hops))) > 0:
+            flow_analysis['mixing_pattern'] = True
+        return flow_analysis
+
+    def save(self, path: str):
+        """将已合并的数组保存到目录，供内存映射加载
+
+        Args:
+            path: 目标目录
+        """
+        self.merge()
+        os.makedirs(path, exist_ok=True)
+        keys, key_ids = self.interner.sorted_arrays()
+        arrays = {name: getattr(self, name) for name in _ARRAY_FILES[:-2]}
+        arrays['address_keys'] = keys
+        arrays['address_key_ids'] = key_ids
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'node_count': self.node_count, 'edge_count': self.edge_count}, f)
+        logger.info(f"CSR图已保存到: {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'CSRGraph':
+        """从目录加载CSR图
+
+        Args:
+            path: save 写入的目录
+            mmap: 是否以只读内存映射方式加载，多个进程共享页缓存
+
+        Returns:
+            CSR图，内存映射加载时为只读
+        """
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAY_FILES}
+        graph = cls()
+        for name in _ARRAY_FILES[:-2]:
+            setattr(graph, name, arrays[name])
+        graph.interner = AddressInterner.from_sorted_arrays(arrays['address_keys'], arrays['address_key_ids'])
+        graph.read_only = True
+        if not mmap:
+            # 非映射加载时恢复可写的地址表
+            order = np.argsort(arrays['address_key_ids'])
+            graph.interner = AddressInterner(k.decode() for k in arrays['address_keys'][order])
+            graph.read_only = False
+        return graph
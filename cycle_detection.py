@@ -0,0 +1,119 @@
+from typing import Dict, List, Any, Optional, Tuple
+import bisect
+import logging
+import time
+
+from app.config import settings
+from app.analytics.flow_graph import FlowGraph
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TemporalCycleDetector:
+    """有界的时间递增环形转账检测器
+
+    只沿时间戳严格递增的边搜索回到起点的路径，并通过最大跳数、
+    最大结果数和时间预算限制搜索规模，避免在稠密邻域上枚举所有环。
+    """
+
+    def __init__(
+        self,
+        graph: FlowGraph,
+        max_hops: Optional[int] = None,
+        max_cycles: Optional[int] = None,
+        time_budget_ms: Optional[float] = None
+    ):
+        """初始化环形转账检测器
+
+        Args:
+            graph: 资金流向图
+            max_hops: 环的最大边数
+            max_cycles: 找到多少个环后停止
+            time_budget_ms: 单次搜索的时间预算（毫秒）
+        """
+        self.graph = graph
+        self.max_hops = max_hops or settings.CYCLE_MAX_HOPS
+        self.max_cycles = max_cycles or settings.CYCLE_MAX_RESULTS
+        self.time_budget_ms = time_budget_ms or settings.CYCLE_TIME_BUDGET_MS
+
+    def find_cycles(self, start: str, not_before: Optional[float] = None) -> Dict[str, Any]:
+        """查找经过起点地址的时间递增环
+
+        Args:
+            start: 起点地址
+            not_before: 第一条边的最早时间戳（Unix秒），默认不限制
+
+        Returns:
+            包含环证据、是否被截断以及扩展边数的字典
+        """
+        result = {
+            'cycles': [],
+            'truncated': False,
+            'explored_edges': 0
+        }
+        if start not in self.graph:
+            return result
+
+        deadline = time.perf_counter() + self.time_budget_ms / 1000.0
+        # 每个节点的流出边只排序一次: 地址 -> (时间戳列表, 边列表)
+        sorted_edges: Dict[str, Tuple[List[float], List[Tuple[str, Dict[str, Any]]]]] = {}
+
+        def edges_after(node: str, epoch: float) -> List[Tuple[str, Dict[str, Any]]]:
+            if node not in sorted_edges:
+                edges = sorted(self.graph.out_edges(node), key=lambda item: item[1]['epoch'])
+                sorted_edges[node] = ([edge['epoch'] for _, edge in edges], edges)
+            epochs, edges = sorted_edges[node]
+            return edges[bisect.bisect_right(epochs, epoch):]
+
+        first_epoch = float('-inf') if not_before is None else not_before - 1e-9
+        # 栈元素: (当前地址, 到达时间, 路径上的边, 路径上的地址, 待扩展边迭代器)
+        path_edges: List[Tuple[str, str, Dict[str, Any]]] = []
+        on_path = {start}
+        stack = [(start, iter(edges_after(start, first_epoch)))]
+
+        while stack:
+            if len(result['cycles']) >= self.max_cycles:
+                result['truncated'] = True
+                break
+            if time.perf_counter() > deadline:
+                result['truncated'] = True
+                logger.warning(f"环形转账检测超出时间预算: {start}")
+                break
+
+            node, candidates = stack[-1]
+            step = next(candidates, None)
+            if step is None:
+                stack.pop()
+                if path_edges:
+                    _, dst, _ = path_edges.pop()
+                    on_path.discard(dst)
+                continue
+
+            dst, edge = step
+            result['explored_edges'] += 1
+
+            if dst == start:
+                result['cycles'].append(self._evidence(path_edges + [(node, dst, edge)]))
+                continue
+            if dst in on_path or len(path_edges) + 1 >= self.max_hops:
+                continue
+
+            path_edges.append((node, dst, edge))
+            on_path.add(dst)
+            stack.append((dst, iter(edges_after(dst, edge['epoch']))))
+
+        return result
+
+    @staticmethod
+    def _evidence(edges: List[Tuple[str, str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """将环上的边整理为证据"""
+        return {
+            'addresses': [src for src, _, _ in edges] + [edges[-1][1]],
+            'tx_hashes': [edge['tx_hash'] for _, _, edge in edges],
+            'values': [edge['value'] for _, _, edge in edges],
+            'start_time': edges[0][2]['timestamp'],
+            'end_time': edges[-1][2]['timestamp'],
+            'hops': len(edges)
+        }
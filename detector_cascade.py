@@ -0,0 +1,248 @@
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.analytics.flow_graph import to_epoch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StreamingEWMADetector:
+    """按地址的流式EWMA异常评分器
+
+    对每个发送方地址维护交易金额和交易间隔（均取 log1p）的指数加权均值与方差，
+    新交易按z分数评分后再更新统计量。所有状态保存在按地址索引的紧凑数组中，
+    每笔交易的评分与更新都是O(1)。
+    """
+
+    def __init__(self, alpha: Optional[float] = None, warmup: Optional[int] = None, initial_capacity: int = 1024):
+        """初始化流式评分器
+
+        Args:
+            alpha: EWMA平滑系数
+            warmup: 地址至少有多少笔历史交易后才给出有效评分
+            initial_capacity: 初始地址容量，不足时自动扩容
+        """
+        self.alpha = alpha or settings.CASCADE_EWMA_ALPHA
+        self.warmup = settings.CASCADE_WARMUP if warmup is None else warmup
+        self._index: Dict[str, int] = {}
+        # 列: 金额均值, 金额方差, 间隔均值, 间隔方差
+        self._stats = np.zeros((initial_capacity, 4))
+        self._last_seen = np.full(initial_capacity, np.nan)
+        self._count = np.zeros(initial_capacity, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def copy(self) -> 'StreamingEWMADetector':
+        """复制当前状态，用于离线评估而不影响线上状态"""
+        with self._lock:
+            clone = StreamingEWMADetector(self.alpha, self.warmup, initial_capacity=1)
+            clone._index = dict(self._index)
+            clone._stats = self._stats.copy()
+            clone._last_seen = self._last_seen.copy()
+            clone._count = self._count.copy()
+        return clone
+
+    def _row(self, address: str) -> int:
+        """获取地址所在行，不存在时分配（调用方需持有锁）"""
+        row = self._index.get(address)
+        if row is None:
+            row = len(self._index)
+            if row >= len(self._count):
+                capacity = len(self._count) * 2
+                self._stats = np.concatenate([self._stats, np.zeros_like(self._stats)])
+                self._last_seen = np.concatenate([self._last_seen, np.full(capacity - len(self._last_seen), np.nan)])
+                self._count = np.concatenate([self._count, np.zeros_like(self._count)])
+            self._index[address] = row
+        return row
+
+    def score(self, tx: Dict[str, Any]) -> float:
+        """对交易评分并更新发送方统计量
+
+        Args:
+            tx: 交易数据
+
+        Returns:
+            金额z分数与间隔z分数中的较大值；预热期内返回 inf
+        """
+        address = tx.get('from_address', '')
+        if not address:
+            return 0.0
+        value = np.log1p(max(float(tx.get('value', 0)), 0.0))
+        epoch = to_epoch(tx.get('block_timestamp'))
+
+        with self._lock:
+            row = self._row(address)
+            stats = self._stats[row]
+            count = self._count[row]
+            last_seen = self._last_seen[row]
+            interval = np.log1p(max(epoch - last_seen, 0.0)) if not np.isnan(last_seen) else None
+
+            if count >= self.warmup and count > 0:
+                z = abs(value - stats[0]) / np.sqrt(stats[1] + 1e-9)
+                if interval is not None and count > 1:
+                    z = max(z, abs(interval - stats[2]) / np.sqrt(stats[3] + 1e-9))
+                result = float(z)
+            else:
+                result = float('inf')
+
+            self._update(stats, 0, value, count == 0)
+            if interval is not None:
+                self._update(stats, 2, interval, count == 1)
+            self._count[row] = count + 1
+            self._last_seen[row] = epoch if np.isnan(last_seen) else max(last_seen, epoch)
+        return result
+
+    def _update(self, stats: np.ndarray, offset: int, x: float, first: bool):
+        """EWMA均值与方差的增量更新"""
+        if first:
+            stats[offset], stats[offset + 1] = x, 0.0
+            return
+        diff = x - stats[offset]
+        increment = self.alpha * diff
+        stats[offset] += increment
+        stats[offset + 1] = (1 - self.alpha) * (stats[offset + 1] + diff * increment)
+
+    def score_batch(self, transactions: List[Dict[str, Any]]) -> np.ndarray:
+        """按时间顺序对一批交易评分
+
+        Returns:
+            与输入顺序对齐的评分数组
+        """
+        order = sorted(range(len(transactions)), key=lambda i: to_epoch(transactions[i].get('block_timestamp')))
+        scores = np.zeros(len(transactions))
+        for i in order:
+            scores[i] = self.score(transactions[i])
+        return scores
+
+
+class DetectorCascade:
+    """异常检测级联
+
+    第一级为廉价的流式EWMA评分，只有评分不低于阈值的候选交易才送入
+    IsolationForest（TransactionAnalyzer）和LSTM（AIMonitor）等昂贵模型。
+    LSTM需要地址的连续交易序列，因此有候选交易的地址会带上整段序列送入，
+    只保留落在候选交易上的异常。
+    """
+
+    def __init__(
+        self,
+        first_stage: Optional[StreamingEWMADetector] = None,
+        analyzer: Optional[Any] = None,
+        ai_monitor: Optional[Any] = None,
+        threshold: Optional[float] = None
+    ):
+        """初始化检测级联
+
+        Args:
+            first_stage: 第一级流式评分器
+            analyzer: 提供 detect_anomalies 的 TransactionAnalyzer
+            ai_monitor: 提供 detect_anomalies 的 AIMonitor
+            threshold: 第一级评分阈值，不低于该值的交易进入第二级
+        """
+        self.first_stage = first_stage or StreamingEWMADetector()
+        self.analyzer = analyzer
+        self.ai_monitor = ai_monitor
+        self.threshold = settings.CASCADE_THRESHOLD if threshold is None else threshold
+        self.metrics = {'processed': 0, 'passed': 0}
+
+    @property
+    def pass_through_rate(self) -> float:
+        """进入第二级的交易比例"""
+        if not self.metrics['processed']:
+            return 0.0
+        return self.metrics['passed'] / self.metrics['processed']
+
+    def process(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """对一批交易运行级联检测
+
+        Args:
+            transactions: 交易列表
+
+        Returns:
+            第二级模型确认的异常交易
+        """
+        candidates, _ = self._filter(self.first_stage, transactions)
+        self.metrics['processed'] += len(transactions)
+        self.metrics['passed'] += len(candidates)
+        if not candidates:
+            return []
+        return self._run_full_models(candidates, transactions)
+
+    def _filter(self, detector: StreamingEWMADetector, transactions: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """第一级评分并筛选候选交易"""
+        scores = detector.score_batch(transactions)
+        candidates = []
+        for tx, score in zip(transactions, scores):
+            if score >= self.threshold:
+                candidate = tx.copy()
+                candidate['cascade_score'] = float(score)
+                candidates.append(candidate)
+        return candidates, scores
+
+    def _run_full_models(self, candidates: List[Dict[str, Any]], transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在候选交易上运行昂贵模型"""
+        anomalies = []
+        if self.analyzer is not None:
+            anomalies.extend(self.analyzer.detect_anomalies(candidates))
+        if self.ai_monitor is not None:
+            candidate_keys = {self._key(tx) for tx in candidates}
+            addresses = {tx.get('from_address', '') for tx in candidates}
+            sequences = [tx for tx in transactions if tx.get('from_address', '') in addresses]
+            anomalies.extend(
+                tx for tx in self.ai_monitor.detect_anomalies(sequences)
+                if self._key(tx) in candidate_keys
+            )
+        return anomalies
+
+    def _run_baseline(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在全部交易上运行昂贵模型，作为召回率基线"""
+        anomalies = []
+        if self.analyzer is not None:
+            anomalies.extend(self.analyzer.detect_anomalies(transactions))
+        if self.ai_monitor is not None:
+            anomalies.extend(self.ai_monitor.detect_anomalies(transactions))
+        return anomalies
+
+    @staticmethod
+    def _key(tx: Dict[str, Any]) -> Tuple[Any, ...]:
+        """交易的唯一标识"""
+        return (tx.get('tx_hash'), tx.get('from_address'), tx.get('to_address'), str(tx.get('block_timestamp')))
+
+    def evaluate(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """评估级联相对完整模型基线的通过率与召回率
+
+        使用第一级评分器当前状态的副本，不影响线上状态。
+
+        Args:
+            transactions: 评估用交易列表
+
+        Returns:
+            通过率、召回率及各阶段计数
+        """
+        detector = self.first_stage.copy()
+        candidates, _ = self._filter(detector, transactions)
+        cascade = self._run_full_models(candidates, transactions) if candidates else []
+        baseline = self._run_baseline(transactions)
+
+        baseline_keys = {self._key(tx) for tx in baseline}
+        cascade_keys = {self._key(tx) for tx in cascade}
+        recall = len(baseline_keys & cascade_keys) / len(baseline_keys) if baseline_keys else 1.0
+        report = {
+            'transactions': len(transactions),
+            'candidates': len(candidates),
+            'pass_through_rate': len(candidates) / len(transactions) if transactions else 0.0,
+            'baseline_anomalies': len(baseline_keys),
+            'cascade_anomalies': len(cascade_keys),
+            'recall': recall,
+            'threshold': self.threshold
+        }
+        logger.info(f"级联评估: 通过率 {report['pass_through_rate']:.2%}, 召回率 {recall:.2%}")
+        return report
@@ -6,6 +6,7 @@ from datetime import datetime
 import json
 
 from app.config import settings
+from app.analytics.feature_store import FeatureStore
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -14,8 +15,10 @@ logger = logging.getLogger(__name__)
 class EthereumClient:
     """以太坊区块链客户端"""
     
-    def __init__(self, rpc_url: str = settings.ETHEREUM_RPC_URL):
+    def __init__(self, rpc_url: str = settings.ETHEREUM_RPC_URL, feature_store: Optional[FeatureStore] = None):
         """初始化以太坊客户端"""
+        # 挂接的特征存储，已收录的地址直接读取窗口内的转出次数
+        self.feature_store = feature_store
         self.w3 = Web3(Web3.HTTPProvider(rpc_url))
         if not self.w3.is_connected():
             logger.error(f"无法连接到以太坊节点: {rpc_url}")
@@ -147,6 +150,11 @@ class EthereumClient:
         Returns:
             bool: 是否检测到资金分散转出
         """
+        if self.feature_store is not None:
+            out_count = self.feature_store.out_count(address, time_window)
+            if out_count is not None:
+                return out_count >= threshold
+        
         current_block = self.get_latest_block_number()
         # 估算时间窗口内的区块数（以太坊平均出块时间约为15秒）
         blocks_in_window = time_window // 15
@@ -0,0 +1,344 @@
+from typing import Dict, List, Any, Optional, Sequence
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from app.config import settings
+from app.analytics.flow_graph import to_epoch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 每个时间桶中累计的字段
+FIELDS = (
+    'count', 'out_count', 'value_sum', 'value_sq_sum', 'value_max',
+    'interval_sum', 'interval_sq_sum', 'interval_count', 'night_count', 'large_count'
+)
+_F = {name: i for i, name in enumerate(FIELDS)}
+_MAX_FIELD = _F['value_max']
+
+
+class FeatureStore:
+    """按地址维护多时间窗口滚动聚合的特征存储
+
+    每个窗口被切分为固定数量的时间桶，并以环形数组保存，每笔交易只更新
+    对应桶中的一行，代价与历史长度无关。环中额外保留一段已滑出窗口的桶，
+    用于按历史时间点读取特征（point-in-time），训练时不会读到未来数据。
+    存储可以整体快照到磁盘，重启后从快照恢复。
+    """
+
+    def __init__(
+        self,
+        windows: Optional[Sequence[int]] = None,
+        buckets_per_window: Optional[int] = None,
+        history_windows: int = 1,
+        initial_capacity: int = 1024
+    ):
+        """初始化特征存储
+
+        Args:
+            windows: 窗口长度（秒），默认取配置 FEATURE_STORE_WINDOWS
+            buckets_per_window: 每个窗口的时间桶数量
+            history_windows: 为历史时间点读取额外保留的窗口数
+            initial_capacity: 初始地址容量，不足时自动扩容
+        """
+        self.windows = tuple(int(w) for w in (windows or settings.FEATURE_STORE_WINDOWS))
+        self.buckets_per_window = buckets_per_window or settings.FEATURE_STORE_BUCKETS
+        self.ring_size = self.buckets_per_window * (1 + history_windows)
+        self.widths = np.array([w / self.buckets_per_window for w in self.windows])
+
+        self._index: Dict[str, int] = {}
+        self._addresses: List[str] = []
+        shape = (initial_capacity, len(self.windows), self.ring_size)
+        self._buckets = np.zeros(shape + (len(FIELDS),), dtype=np.float64)
+        self._bucket_ids = np.full(shape, -1, dtype=np.int64)
+        self._last_seen = np.full(initial_capacity, np.nan)
+        self.latest = float('-inf')
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._index
+
+    def _row(self, address: str) -> int:
+        """获取地址所在行，不存在时分配（调用方需持有锁）"""
+        row = self._index.get(address)
+        if row is not None:
+            return row
+        row = len(self._addresses)
+        if row >= len(self._last_seen):
+            self._grow()
+        self._index[address] = row
+        self._addresses.append(address)
+        return row
+
+    def _grow(self):
+        """地址容量翻倍"""
+        capacity = len(self._last_seen) * 2
+        buckets = np.zeros((capacity,) + self._buckets.shape[1:], dtype=np.float64)
+        bucket_ids = np.full((capacity,) + self._bucket_ids.shape[1:], -1, dtype=np.int64)
+        last_seen = np.full(capacity, np.nan)
+        n = len(self._addresses)
+        buckets[:n] = self._buckets[:n]
+        bucket_ids[:n] = self._bucket_ids[:n]
+        last_seen[:n] = self._last_seen[:n]
+        self._buckets, self._bucket_ids, self._last_seen = buckets, bucket_ids, last_seen
+
+    def update(self, tx: Dict[str, Any], return_features: bool = False) -> Optional[Dict[str, Dict[str, float]]]:
+        """摄取一笔交易，分别更新发送方和接收方的聚合
+
+        Args:
+            tx: 交易数据
+            return_features: 是否返回发送方在本交易之前的特征（用于无泄漏的训练样本）
+
+        Returns:
+            return_features 为 True 时返回发送方更新前的特征
+        """
+        timestamp = tx.get('block_timestamp')
+        epoch = to_epoch(timestamp)
+        hour = timestamp.hour if isinstance(timestamp, datetime) else datetime.fromtimestamp(epoch).hour
+        value = float(tx.get('value', 0))
+        from_addr = tx.get('from_address', '')
+        to_addr = tx.get('to_address', '')
+
+        features = None
+        with self._lock:
+            if return_features and from_addr:
+                features = self._read(self._index.get(from_addr), None)
+            self.latest = max(self.latest, epoch)
+            for address, outgoing in ((from_addr, True), (to_addr, False)):
+                if not address or (not outgoing and address == from_addr):
+                    continue
+                self._apply(self._row(address), epoch, value, outgoing, 0 <= hour < 5)
+        return features
+
+    def update_many(self, transactions: List[Dict[str, Any]]):
+        """批量摄取交易"""
+        for tx in transactions:
+            self.update(tx)
+
+    def _apply(self, row: int, epoch: float, value: float, outgoing: bool, night: bool):
+        """将一笔交易累加到地址每个窗口的当前桶"""
+        delta = np.zeros(len(FIELDS))
+        delta[_F['count']] = 1
+        delta[_F['out_count']] = outgoing
+        delta[_F['value_sum']] = value
+        delta[_F['value_sq_sum']] = value * value
+        delta[_F['night_count']] = night
+        delta[_F['large_count']] = value >= settings.LARGE_TRANSACTION_THRESHOLD
+
+        last_seen = self._last_seen[row]
+        if not np.isnan(last_seen):
+            interval = max(0.0, epoch - last_seen)
+            delta[_F['interval_sum']] = interval
+            delta[_F['interval_sq_sum']] = interval * interval
+            delta[_F['interval_count']] = 1
+            self._last_seen[row] = max(last_seen, epoch)
+        else:
+            self._last_seen[row] = epoch
+
+        bucket_nos = (epoch // self.widths).astype(np.int64)
+        for w, bucket_no in enumerate(bucket_nos):
+            slot = bucket_no % self.ring_size
+            current = self._bucket_ids[row, w, slot]
+            if current != bucket_no:
+                if current > bucket_no:
+                    # 乱序到达且早于环中保留范围的交易无法计入该窗口
+                    continue
+                self._buckets[row, w, slot] = 0.0
+                self._bucket_ids[row, w, slot] = bucket_no
+            bucket = self._buckets[row, w, slot]
+            bucket += delta
+            bucket[_MAX_FIELD] = max(bucket[_MAX_FIELD], value)
+
+    def get_features(
+        self,
+        address: str,
+        as_of: Optional[Any] = None,
+        windows: Optional[Sequence[str]] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """读取地址的窗口特征
+
+        Args:
+            address: 地址
+            as_of: 历史时间点（datetime或Unix秒）。提供时只使用该时间点所在桶之前
+                已完整结束的桶，保证不含未来数据；默认读取包含当前桶的最新特征
+            windows: 只读取这些窗口（如 ["24h"]），默认读取全部窗口。
+                短窗口可回溯的范围更短，历史读取时可只选取长窗口
+
+        Returns:
+            窗口名 -> 特征字典
+
+        Raises:
+            ValueError: as_of 早于环中保留的历史范围
+        """
+        with self._lock:
+            return self._read(self._index.get(address), None if as_of is None else to_epoch(as_of), windows)
+
+    def get_features_many(
+        self,
+        addresses: List[str],
+        as_of: Optional[Any] = None,
+        windows: Optional[Sequence[str]] = None
+    ) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """批量读取地址的窗口特征"""
+        return {address: self.get_features(address, as_of, windows) for address in addresses}
+
+    def _read(
+        self,
+        row: Optional[int],
+        as_of: Optional[float],
+        windows: Optional[Sequence[str]] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """汇总窗口内的桶并计算派生特征（调用方需持有锁）"""
+        result = {}
+        for w, window in enumerate(self.windows):
+            if windows is not None and self.window_name(window) not in windows:
+                continue
+            width = self.widths[w]
+            if as_of is None:
+                upper = int(self.latest // width) if self.latest > float('-inf') else 0
+            else:
+                upper = int(as_of // width) - 1
+                oldest_kept = int(self.latest // width) - self.ring_size + 1 if self.latest > float('-inf') else upper
+                if upper - self.buckets_per_window + 1 < oldest_kept:
+                    raise ValueError(f"时间点 {as_of} 超出特征存储可回溯的范围")
+            totals = np.zeros(len(FIELDS))
+            if row is not None:
+                ids = self._bucket_ids[row, w]
+                mask = (ids > upper - self.buckets_per_window) & (ids <= upper)
+                if mask.any():
+                    selected = self._buckets[row, w][mask]
+                    totals = selected.sum(axis=0)
+                    totals[_MAX_FIELD] = selected[:, _MAX_FIELD].max()
+            result[self.window_name(window)] = self._derive(totals, window)
+        return result
+
+    def out_count(self, address: str, window: int) -> Optional[float]:
+        """地址在最近窗口内的转出次数
+
+        Args:
+            address: 地址
+            window: 窗口长度（秒）
+
+        Returns:
+            转出次数；窗口未配置或地址尚未出现时返回 None，由调用方回退到原始查询
+        """
+        name = self.window_name(window)
+        if int(window) not in self.windows or address not in self:
+            return None
+        return self.get_features(address, windows=[name])[name]['out_count']
+
+    @staticmethod
+    def window_name(window: int) -> str:
+        """窗口长度的可读名称，如 1h、24h、7d"""
+        if window % 86400 == 0 and window >= 7 * 86400:
+            return f"{window // 86400}d"
+        if window % 3600 == 0:
+            return f"{window // 3600}h"
+        return f"{window}s"
+
+    @staticmethod
+    def _derive(totals: np.ndarray, window: int) -> Dict[str, float]:
+        """由累计值计算均值、标准差和比例等派生特征"""
+        count = totals[_F['count']]
+        intervals = totals[_F['interval_count']]
+        value_mean = totals[_F['value_sum']] / count if count else 0.0
+        interval_mean = totals[_F['interval_sum']] / intervals if intervals else 0.0
+        value_var = totals[_F['value_sq_sum']] / count - value_mean ** 2 if count else 0.0
+        interval_var = totals[_F['interval_sq_sum']] / intervals - interval_mean ** 2 if intervals else 0.0
+        return {
+            'count': float(count),
+            'out_count': float(totals[_F['out_count']]),
+            'in_count': float(count - totals[_F['out_count']]),
+            'value_sum': float(totals[_F['value_sum']]),
+            'value_mean': float(value_mean),
+            'value_std': float(np.sqrt(max(value_var, 0.0))),
+            'value_max': float(totals[_F['value_max']]),
+            'interval_mean': float(interval_mean),
+            'interval_std': float(np.sqrt(max(interval_var, 0.0))),
+            'night_ratio': float(totals[_F['night_count']] / count) if count else 0.0,
+            'large_count': float(totals[_F['large_count']]),
+            'tx_per_day': float(count * 86400 / window)
+        }
+
+    def save(self, path: str):
+        """将存储快照写入磁盘（先写临时文件再原子替换）
+
+        Args:
+            path: 快照文件路径
+        """
+        with self._lock:
+            n = len(self._addresses)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    buckets=self._buckets[:n],
+                    bucket_ids=self._bucket_ids[:n],
+                    last_seen=self._last_seen[:n],
+                    addresses=np.array(self._addresses, dtype=str),
+                    windows=np.array(self.windows),
+                    layout=np.array([self.buckets_per_window, self.ring_size]),
+                    latest=np.array([self.latest])
+                )
+            os.replace(tmp_path, path)
+        logger.info(f"特征存储快照已保存: {path}, {n} 个地址")
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureStore':
+        """从快照恢复特征存储
+
+        Args:
+            path: save 写入的快照文件
+
+        Returns:
+            恢复后的特征存储
+        """
+        with np.load(path) as data:
+            buckets_per_window, ring_size = (int(x) for x in data['layout'])
+            addresses = [str(a) for a in data['addresses']]
+            store = cls(
+                windows=[int(w) for w in data['windows']],
+                buckets_per_window=buckets_per_window,
+                history_windows=ring_size // buckets_per_window - 1,
+                initial_capacity=max(len(addresses), 1)
+            )
+            n = len(addresses)
+            store._buckets[:n] = data['buckets']
+            store._bucket_ids[:n] = data['bucket_ids']
+            store._last_seen[:n] = data['last_seen']
+            store.latest = float(data['latest'][0])
+        store._addresses = addresses
+        store._index = {address: i for i, address in enumerate(addresses)}
+        logger.info(f"特征存储已从快照恢复: {path}, {n} 个地址")
+        return store
+
+    def restore(self, path: str):
+        """从快照就地恢复存储，已持有本实例的模块无需重新获取引用
+
+        Args:
+            path: save 写入的快照文件
+        """
+        restored = self.load(path)
+        with self._lock:
+            self.windows = restored.windows
+            self.buckets_per_window = restored.buckets_per_window
+            self.ring_size = restored.ring_size
+            self.widths = restored.widths
+            self._index = restored._index
+            self._addresses = restored._addresses
+            self._buckets = restored._buckets
+            self._bucket_ids = restored._bucket_ids
+            self._last_seen = restored._last_seen
+            self.latest = restored.latest
+
+
+# 全局特征存储，应用启动时从 FEATURE_STORE_PATH 恢复，关闭时写回
+feature_store = FeatureStore()
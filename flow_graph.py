@@ -0,0 +1,262 @@
+from typing import Dict, List, Any, Optional, Set, Tuple, Iterator
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import networkx as nx
+
+from app.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def to_epoch(timestamp: Any) -> float:
+    """将交易时间戳统一转换为Unix秒
+
+    Args:
+        timestamp: datetime、ISO格式字符串或数值时间戳
+
+    Returns:
+        Unix时间戳（秒），无法解析时返回当前时间
+    """
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str) and timestamp:
+        try:
+            return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return datetime.now().timestamp()
+
+
+class FlowGraph:
+    """持久化增量资金流向图
+
+    由交易摄取流持续追加边，并按时间窗口淘汰过期边。分析时只查询
+    某个地址的局部邻域，代价取决于邻域大小而不是历史交易总量。
+    """
+
+    def __init__(
+        self,
+        window: Optional[timedelta] = None,
+        max_hops: Optional[int] = None,
+        max_neighbourhood: Optional[int] = None
+    ):
+        """初始化资金流向图
+
+        Args:
+            window: 边的保留时间窗口，默认取配置 FLOW_GRAPH_WINDOW_HOURS
+            max_hops: 邻域查询的默认跳数
+            max_neighbourhood: 邻域查询最多返回的节点数，防止热点地址拖慢分析
+        """
+        self.window = window or timedelta(hours=settings.FLOW_GRAPH_WINDOW_HOURS)
+        self.max_hops = max_hops if max_hops is not None else settings.FLOW_GRAPH_MAX_HOPS
+        self.max_neighbourhood = max_neighbourhood or settings.FLOW_GRAPH_MAX_NEIGHBOURHOOD
+
+        # 邻接表: 地址 -> 对端地址 -> 交易哈希 -> 边属性
+        self._out: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        self._in: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        # 按时间排序的淘汰队列: (时间戳, 发送方, 接收方, 交易哈希)
+        self._expiry: List[Tuple[float, str, str, str]] = []
+        self._edge_count = 0
+        self._latest = float('-inf')
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._edge_count
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._out or address in self._in
+
+    @property
+    def node_count(self) -> int:
+        """当前图中的地址数量"""
+        with self._lock:
+            return len(set(self._out) | set(self._in))
+
+    def add_transaction(self, tx: Dict[str, Any]) -> bool:
+        """追加一笔交易对应的边
+
+        同一 (发送方, 接收方, 交易哈希) 重复摄取时只更新属性，不会重复计数。
+
+        Args:
+            tx: 交易数据
+
+        Returns:
+            是否新增了边
+        """
+        from_addr = tx.get('from_address', '')
+        to_addr = tx.get('to_address', '')
+        if not from_addr or not to_addr:
+            return False
+
+        timestamp = tx.get('block_timestamp') or datetime.now()
+        epoch = to_epoch(timestamp)
+        tx_hash = tx.get('tx_hash', '') or f"{from_addr}:{to_addr}:{epoch}"
+        edge = {
+            'tx_hash': tx_hash,
+            'value': float(tx.get('value', 0)),
+            'timestamp': timestamp,
+            'epoch': epoch
+        }
+
+        with self._lock:
+            # 已经超出窗口的历史交易不再入图
+            if epoch < self._latest - self.window.total_seconds():
+                return False
+
+            out_edges = self._out.setdefault(from_addr, {}).setdefault(to_addr, {})
+            is_new = tx_hash not in out_edges
+            out_edges[tx_hash] = edge
+            self._in.setdefault(to_addr, {}).setdefault(from_addr, {})[tx_hash] = edge
+
+            if is_new:
+                self._edge_count += 1
+                heapq.heappush(self._expiry, (epoch, from_addr, to_addr, tx_hash))
+
+            if epoch > self._latest:
+                self._latest = epoch
+                self._evict()
+
+        return is_new
+
+    def add_transactions(self, transactions: List[Dict[str, Any]]) -> int:
+        """批量追加交易
+
+        Args:
+            transactions: 交易列表
+
+        Returns:
+            新增边的数量
+        """
+        return sum(1 for tx in transactions if self.add_transaction(tx))
+
+    def evict(self, now: Optional[datetime] = None) -> int:
+        """按时间窗口淘汰过期边
+
+        Args:
+            now: 参考时间，默认使用已摄取交易中的最新时间
+
+        Returns:
+            淘汰的边数量
+        """
+        with self._lock:
+            if now is not None:
+                self._latest = max(self._latest, now.timestamp())
+            return self._evict()
+
+    def _evict(self) -> int:
+        """淘汰早于窗口下界的边（调用方需持有锁）"""
+        cutoff = self._latest - self.window.total_seconds()
+        evicted = 0
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, from_addr, to_addr, tx_hash = heapq.heappop(self._expiry)
+            self._remove_edge(self._out, from_addr, to_addr, tx_hash)
+            self._remove_edge(self._in, to_addr, from_addr, tx_hash)
+            self._edge_count -= 1
+            evicted += 1
+        return evicted
+
+    @staticmethod
+    def _remove_edge(adjacency: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]], src: str, dst: str, tx_hash: str):
+        """从邻接表中删除一条边，并清理空的节点条目"""
+        neighbours = adjacency.get(src)
+        if neighbours is None:
+            return
+        edges = neighbours.get(dst)
+        if edges is None:
+            return
+        edges.pop(tx_hash, None)
+        if not edges:
+            del neighbours[dst]
+            if not neighbours:
+                del adjacency[src]
+
+    def out_degree(self, address: str) -> int:
+        """不同接收方数量"""
+        return len(self._out.get(address, {}))
+
+    def in_degree(self, address: str) -> int:
+        """不同发送方数量"""
+        return len(self._in.get(address, {}))
+
+    def successors(self, address: str) -> List[str]:
+        """资金流出的对端地址"""
+        with self._lock:
+            return list(self._out.get(address, {}))
+
+    def predecessors(self, address: str) -> List[str]:
+        """资金流入的对端地址"""
+        with self._lock:
+            return list(self._in.get(address, {}))
+
+    def out_edges(self, address: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """遍历地址的所有流出边
+
+        Yields:
+            (接收方地址, 边属性)
+        """
+        with self._lock:
+            items = [(dst, edge) for dst, edges in self._out.get(address, {}).items() for edge in edges.values()]
+        return iter(items)
+
+    def neighbourhood(self, address: str, hops: Optional[int] = None) -> Set[str]:
+        """获取地址在k跳内（双向）的邻域节点
+
+        Args:
+            address: 中心地址
+            hops: 跳数，默认使用 max_hops
+
+        Returns:
+            邻域内的地址集合（包含中心地址），大小不超过 max_neighbourhood
+        """
+        hops = self.max_hops if hops is None else hops
+        with self._lock:
+            if address not in self:
+                return set()
+
+            visited = {address}
+            frontier = [address]
+            for _ in range(hops):
+                next_frontier = []
+                for node in frontier:
+                    for neighbour in list(self._out.get(node, {})) + list(self._in.get(node, {})):
+                        if neighbour in visited:
+                            continue
+                        visited.add(neighbour)
+                        next_frontier.append(neighbour)
+                        if len(visited) >= self.max_neighbourhood:
+                            return visited
+                frontier = next_frontier
+                if not frontier:
+                    break
+            return visited
+
+    def subgraph(self, nodes: Set[str]) -> nx.DiGraph:
+        """导出给定节点集合的诱导子图
+
+        Args:
+            nodes: 节点集合
+
+        Returns:
+            networkx有向图，同一对地址之间保留最新一笔交易作为边属性
+        """
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        with self._lock:
+            for src in nodes:
+                for dst, edges in self._out.get(src, {}).items():
+                    if dst not in nodes:
+                        continue
+                    latest = max(edges.values(), key=lambda e: e['epoch'])
+                    G.add_edge(src, dst, **{
+                        'tx_hash': latest['tx_hash'],
+                        'value': latest['value'],
+                        'timestamp': latest['timestamp']
+                    })
+        return G
@@ -0,0 +1,252 @@
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+import heapq
+import itertools
+import logging
+
+import numpy as np
+
+from app.config import settings
+from app.analytics.csr_graph import CSRGraph
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 支持的污点传播策略
+TAINT_POLICIES = ('haircut', 'poison', 'fifo')
+
+
+class FundTracer:
+    """多跳资金追踪引擎
+
+    从源交易或源地址出发，沿CSR图向前（资金去向）或向后（资金来源）
+    按时间顺序传播污点金额。前沿按时间排序处理，低于最小金额的分支被剪枝，
+    每发现一条被污染的边就立即产出结果，调用方可以边搜索边消费。
+
+    污点策略:
+        haircut: 按污点金额占地址流入总额的比例，等比例污染后续每笔转出
+        poison: 地址一旦收到污点资金，其后所有转出都视为完全污染
+        fifo: 先进先出，后续转出先消耗地址原有余额，再消耗污点资金
+    """
+
+    def __init__(
+        self,
+        graph: CSRGraph,
+        policy: str = 'haircut',
+        max_hops: Optional[int] = None,
+        min_value: Optional[float] = None,
+        max_edges: Optional[int] = None
+    ):
+        """初始化资金追踪引擎
+
+        Args:
+            graph: 已合并的CSR资金流向图
+            policy: 污点传播策略 haircut / poison / fifo
+            max_hops: 最大追踪跳数
+            min_value: 污点金额低于该值的分支不再扩展
+            max_edges: 单次追踪最多产出的边数
+        """
+        if policy not in TAINT_POLICIES:
+            raise ValueError(f"不支持的污点策略: {policy}")
+        self.graph = graph
+        self.policy = policy
+        self.max_hops = max_hops or settings.TRACE_MAX_HOPS
+        self.min_value = settings.TRACE_MIN_VALUE if min_value is None else min_value
+        self.max_edges = max_edges or settings.TRACE_MAX_EDGES
+
+    def trace_transaction(self, tx_hash: str, direction: str = 'forward') -> Iterator[Dict[str, Any]]:
+        """从源交易开始追踪
+
+        Args:
+            tx_hash: 源交易哈希
+            direction: forward 追踪资金去向，backward 追踪资金来源
+
+        Yields:
+            被污染的边
+        """
+        edges = self.graph.edges_for_tx(tx_hash)
+        if len(edges) == 0:
+            logger.debug(f"CSR图中找不到交易: {tx_hash}")
+            return
+        src = self._edge_sources(edges)
+        seeds = []
+        for i, edge in enumerate(edges):
+            node = int(self.graph.out_dst[edge]) if direction == 'forward' else int(src[i])
+            seeds.append((float(self.graph.timestamp[edge]), node, float(self.graph.value[edge])))
+            yield self._hit(int(edge), int(src[i]), int(self.graph.out_dst[edge]), float(self.graph.value[edge]), 0, direction)
+        yield from self._search(seeds, direction)
+
+    def trace_address(
+        self,
+        address: str,
+        direction: str = 'forward',
+        start_time: Optional[float] = None,
+        amount: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """从源地址开始追踪
+
+        Args:
+            address: 源地址
+            direction: forward 追踪资金去向，backward 追踪资金来源
+            start_time: 参考时间（Unix秒）；向前追踪只看此后的转出，向后追踪只看此前的转入
+            amount: 视为污点的金额，默认该地址相关转账全部视为污点
+
+        Yields:
+            被污染的边
+        """
+        node = self.graph.interner.lookup(address)
+        if node < 0 or node >= self.graph.node_count:
+            return
+        if start_time is None:
+            start_time = float('-inf') if direction == 'forward' else float('inf')
+        yield from self._search([(start_time, node, float('inf') if amount is None else amount)], direction)
+
+    def _search(self, seeds: List[Tuple[float, int, float]], direction: str) -> Iterator[Dict[str, Any]]:
+        """按时间顺序扩展前沿"""
+        forward = direction == 'forward'
+        counter = itertools.count()
+        # 向前追踪按时间升序处理，向后追踪按时间降序处理
+        frontier = [((t if forward else -t), next(counter), t, node, amount, 0) for t, node, amount in seeds]
+        heapq.heapify(frontier)
+        poisoned = set()
+        produced = 0
+
+        while frontier:
+            _, _, t, node, amount, hop = heapq.heappop(frontier)
+            if hop >= self.max_hops:
+                continue
+            if self.policy == 'poison':
+                # 污染模式下每个地址只按最早（向后追踪为最晚）的到达时间扩展一次
+                if node in poisoned:
+                    continue
+                poisoned.add(node)
+
+            edges, taint = self._propagate(node, t, amount, forward)
+            keep = taint >= self.min_value
+            edges, taint = edges[keep], taint[keep]
+            if len(edges) == 0:
+                continue
+
+            if forward:
+                counterparts = self.graph.out_dst[edges]
+            else:
+                counterparts = self._edge_sources(edges)
+            timestamps = self.graph.timestamp[edges]
+
+            for edge, other, edge_time, tainted in zip(edges, counterparts, timestamps, taint):
+                src_node, dst_node = (node, int(other)) if forward else (int(other), node)
+                yield self._hit(int(edge), src_node, dst_node, float(tainted), hop + 1, direction)
+                produced += 1
+                if produced >= self.max_edges:
+                    logger.warning("资金追踪达到最大边数限制，提前结束")
+                    return
+                priority = edge_time if forward else -edge_time
+                heapq.heappush(frontier, (priority, next(counter), float(edge_time), int(other), float(tainted), hop + 1))
+
+    def _edge_sources(self, edges: np.ndarray) -> np.ndarray:
+        """根据CSR边索引求发送方ID"""
+        return (np.searchsorted(self.graph.out_indptr, edges, side='right') - 1).astype(np.int64)
+
+    def _propagate(self, node: int, t: float, amount: float, forward: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """计算一次到达在相邻边上的污点金额
+
+        Args:
+            node: 当前地址ID
+            t: 资金到达（向后追踪为离开）的时间
+            amount: 污点金额
+            forward: 是否向前追踪
+
+        Returns:
+            (边索引, 对应的污点金额)
+        """
+        graph = self.graph
+        out_start, out_end = int(graph.out_indptr[node]), int(graph.out_indptr[node + 1])
+        in_start, in_end = int(graph.in_indptr[node]), int(graph.in_indptr[node + 1])
+        out_ts = graph.timestamp[out_start:out_end]
+        in_edges = graph.in_edge[in_start:in_end]
+        in_ts = graph.timestamp[in_edges]
+
+        if forward:
+            lo = int(np.searchsorted(out_ts, t, side='right'))
+            edges = np.arange(out_start + lo, out_end, dtype=np.int64)
+            values = graph.value[edges]
+            if self.policy == 'poison' or np.isinf(amount):
+                return edges, values.copy()
+            if self.policy == 'haircut':
+                inflow = graph.value[in_edges[:int(np.searchsorted(in_ts, t, side='right'))]].sum()
+                ratio = 1.0 if inflow <= 0 else min(1.0, amount / inflow)
+                return edges, self._cap(values * ratio, amount)
+            # fifo: 先消耗到达前的原有余额
+            inflow_before = graph.value[in_edges[:int(np.searchsorted(in_ts, t, side='left'))]].sum()
+            outflow_before = graph.value[out_start:out_start + lo].sum()
+            return edges, self._fifo_overlap(values, max(0.0, inflow_before - outflow_before), amount)
+
+        hi = int(np.searchsorted(in_ts, t, side='left'))
+        edges = in_edges[:hi].astype(np.int64)
+        values = graph.value[edges]
+        if self.policy == 'poison' or np.isinf(amount):
+            return edges, values.copy()
+        if self.policy == 'haircut':
+            inflow = values.sum()
+            ratio = 1.0 if inflow <= 0 else min(1.0, amount / inflow)
+            return edges, values * ratio
+        # fifo: 离开的资金来自最早的未花费流入，跳过此前转出已消耗的部分
+        spent_before = graph.value[out_start:out_start + int(np.searchsorted(out_ts, t, side='left'))].sum()
+        return edges, self._fifo_overlap(values, spent_before, amount)
+
+    @staticmethod
+    def _cap(taint: np.ndarray, amount: float) -> np.ndarray:
+        """按时间顺序累计，总污点金额不超过到达金额"""
+        cumulative = np.cumsum(taint)
+        return np.clip(amount - (cumulative - taint), 0.0, taint)
+
+    @staticmethod
+    def _fifo_overlap(values: np.ndarray, offset: float, amount: float) -> np.ndarray:
+        """按先进先出计算每条边与污点区间 [offset, offset + amount] 的重叠金额"""
+        cumulative = np.cumsum(values)
+        before = cumulative - values
+        upper = np.minimum(np.maximum(cumulative - offset, 0.0), amount)
+        lower = np.minimum(np.maximum(before - offset, 0.0), amount)
+        return upper - lower
+
+    def _hit(self, edge: int, src: int, dst: int, tainted: float, hop: int, direction: str) -> Dict[str, Any]:
+        """将一条被污染的边整理为结果"""
+        from_address, to_address = self.graph.interner.addresses([src, dst])
+        return {
+            'direction': direction,
+            'hop': hop,
+            'address': to_address if direction == 'forward' else from_address,
+            'from_address': from_address,
+            'to_address': to_address,
+            'tx_hash': self.graph.tx_hash[edge].decode(),
+            'value': float(self.graph.value[edge]),
+            'tainted_value': tainted,
+            'timestamp': float(self.graph.timestamp[edge]),
+            'policy': self.policy
+        }
+
+    def summarize(self, hits: Iterator[Dict[str, Any]], limit: int = 20) -> List[Dict[str, Any]]:
+        """按地址汇总追踪结果
+
+        Args:
+            hits: trace_* 产出的结果
+            limit: 返回的地址数量上限
+
+        Returns:
+            按污点金额降序排列的地址列表
+        """
+        entities: Dict[str, Dict[str, Any]] = {}
+        for hit in hits:
+            if hit['hop'] == 0:
+                continue
+            entity = entities.setdefault(hit['address'], {
+                'address': hit['address'],
+                'tainted_value': 0.0,
+                'min_hop': hit['hop'],
+                'tx_hashes': []
+            })
+            entity['tainted_value'] += hit['tainted_value']
+            entity['min_hop'] = min(entity['min_hop'], hit['hop'])
+            if len(entity['tx_hashes']) < 10:
+                entity['tx_hashes'].append(hit['tx_hash'])
+        return sorted(entities.values(), key=lambda e: e['tainted_value'], reverse=True)[:limit]
@@ -0,0 +1,261 @@
+from typing import List, Any, Optional, Union
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 打包模型目录中的数组文件
+_ARRAY_FILES = ('left', 'right', 'feature', 'threshold', 'leaf_depth', 'roots', 'scaler_mean', 'scaler_scale')
+
+
+def average_path_length(n_samples: Union[int, np.ndarray]) -> np.ndarray:
+    """二叉搜索树中未成功查找的平均路径长度 c(n)，与 sklearn 的实现一致
+
+    Args:
+        n_samples: 节点样本数
+
+    Returns:
+        平均路径长度
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n)
+    mask_two = n == 2
+    mask_more = n > 2
+    result[mask_two] = 1.0
+    m = n[mask_more]
+    result[mask_more] = 2.0 * (np.log(m - 1.0) + np.euler_gamma) - 2.0 * (m - 1.0) / m
+    return result
+
+
+class PackedIsolationForest:
+    """打包为NumPy数组的IsolationForest评分器
+
+    将sklearn拟合好的所有树展开并拼接为扁平的节点数组（左右子节点、
+    分裂特征、阈值、叶子路径长度），评分时对一批样本同时沿所有树逐层下降，
+    不再经过sklearn的逐树调用。叶子节点的子节点指向自身，因此固定迭代
+    最大深度次即可，无需逐样本分支。
+
+    评分只读取不可变数组，可在多个线程中并发调用；模型可保存为目录并以
+    内存映射方式加载，多个进程共享页缓存。
+    """
+
+    def __init__(
+        self,
+        left: np.ndarray,
+        right: np.ndarray,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        leaf_depth: np.ndarray,
+        roots: np.ndarray,
+        scaler_mean: np.ndarray,
+        scaler_scale: np.ndarray,
+        max_depth: int,
+        denominator: float,
+        offset: float,
+        feature_names: Optional[List[str]] = None,
+        chunk_size: int = 4096
+    ):
+        """初始化打包评分器，通常通过 from_sklearn 或 load 构造
+
+        Args:
+            left: 左子节点的全局索引，叶子指向自身
+            right: 右子节点的全局索引，叶子指向自身
+            feature: 分裂特征的列索引
+            threshold: 分裂阈值，样本特征值不大于阈值时进入左子树
+            leaf_depth: 叶子节点的路径长度贡献（深度 + c(叶子样本数)）
+            roots: 每棵树根节点的全局索引
+            scaler_mean: 标准化均值
+            scaler_scale: 标准化尺度
+            max_depth: 所有树的最大深度
+            denominator: 树数量 × c(max_samples)
+            offset: sklearn 的 offset_，decision_function = score_samples - offset
+            feature_names: 训练时的特征列顺序
+            chunk_size: 每次遍历的样本数，用于限制中间数组大小
+        """
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_depth = leaf_depth
+        self.roots = roots
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.max_depth = int(max_depth)
+        self.denominator = float(denominator)
+        self.offset = float(offset)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.chunk_size = chunk_size
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.left)
+
+    @classmethod
+    def from_sklearn(cls, model: Any, scaler: Optional[Any] = None, feature_names: Optional[List[str]] = None) -> 'PackedIsolationForest':
+        """从已拟合的 IsolationForest（及可选的 StandardScaler）导出
+
+        Args:
+            model: 已拟合的 sklearn IsolationForest
+            scaler: 已拟合的 StandardScaler，评分时先对原始特征做同样的标准化
+            feature_names: 特征列顺序，默认取 scaler 记录的列名
+
+        Returns:
+            打包评分器
+        """
+        lefts, rights, features, thresholds, leaf_depths, roots = [], [], [], [], [], []
+        max_depth = 0
+        base = 0
+        for tree, estimator_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            local = np.arange(n)
+
+            depth = np.zeros(n, dtype=np.int64)
+            for node in range(n):
+                if not is_leaf[node]:
+                    depth[t.children_left[node]] = depth[node] + 1
+                    depth[t.children_right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+
+            lefts.append(np.where(is_leaf, local, t.children_left) + base)
+            rights.append(np.where(is_leaf, local, t.children_right) + base)
+            # 树内特征索引映射回原始列；叶子节点的特征与阈值不会被使用
+            features.append(np.where(is_leaf, 0, np.asarray(estimator_features)[np.maximum(t.feature, 0)]))
+            thresholds.append(np.where(is_leaf, np.inf, t.threshold))
+            leaf_depths.append(np.where(
+                # sklearn 按路径上的节点数（深度 + 1）计，再加 c(叶子样本数) - 1
+                is_leaf, depth + average_path_length(t.n_node_samples), 0.0
+            ))
+            roots.append(base)
+            base += n
+
+        n_features = model.n_features_in_
+        if scaler is not None:
+            scaler_mean = np.asarray(scaler.mean_, dtype=np.float64)
+            scaler_scale = np.asarray(scaler.scale_, dtype=np.float64)
+            if feature_names is None and hasattr(scaler, 'feature_names_in_'):
+                feature_names = [str(name) for name in scaler.feature_names_in_]
+        else:
+            scaler_mean = np.zeros(n_features)
+            scaler_scale = np.ones(n_features)
+
+        packed = cls(
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            leaf_depth=np.concatenate(leaf_depths).astype(np.float64),
+            roots=np.array(roots, dtype=np.int32),
+            scaler_mean=scaler_mean,
+            scaler_scale=scaler_scale,
+            max_depth=max_depth,
+            denominator=len(model.estimators_) * float(average_path_length([model.max_samples_])[0]),
+            offset=model.offset_,
+            feature_names=feature_names
+        )
+        logger.info(f"IsolationForest已打包: {packed.n_trees} 棵树, {packed.node_count} 个节点")
+        return packed
+
+    def _prepare(self, features: Union[pd.DataFrame, np.ndarray], scale: bool) -> np.ndarray:
+        """按训练列顺序取特征，标准化后转为与 sklearn 相同的 float32 精度"""
+        if isinstance(features, pd.DataFrame):
+            if self.feature_names is not None:
+                features = features[self.feature_names]
+            features = features.to_numpy(dtype=np.float64)
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if scale:
+            X = (X - self.scaler_mean) / self.scaler_scale
+        # sklearn 的树在 float32 上比较阈值
+        return X.astype(np.float32).astype(np.float64)
+
+    def _path_lengths(self, X: np.ndarray) -> np.ndarray:
+        """所有树上路径长度之和"""
+        total = np.zeros(len(X))
+        rows = np.arange(len(X))[None, :]
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X[start:start + self.chunk_size]
+            chunk_rows = rows[:, :len(chunk)]
+            nodes = np.repeat(self.roots[:, None], len(chunk), axis=1)
+            for _ in range(self.max_depth):
+                go_left = chunk[chunk_rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            total[start:start + len(chunk)] = self.leaf_depth[nodes].sum(axis=0)
+        return total
+
+    def score_samples(self, features: Union[pd.DataFrame, np.ndarray], scale: bool = True) -> np.ndarray:
+        """与 IsolationForest.score_samples 相同的异常分数（越小越异常）
+
+        Args:
+            features: 原始特征，DataFrame 会按训练时的列顺序选取
+            scale: 是否先做标准化；输入已标准化时传 False
+
+        Returns:
+            每个样本的分数
+        """
+        X = self._prepare(features, scale)
+        if len(X) == 0:
+            return np.zeros(0)
+        return -np.power(2.0, -self._path_lengths(X) / self.denominator)
+
+    def decision_function(self, features: Union[pd.DataFrame, np.ndarray], scale: bool = True) -> np.ndarray:
+        """与 IsolationForest.decision_function 相同的分数，小于0为异常"""
+        return self.score_samples(features, scale) - self.offset
+
+    def predict(self, features: Union[pd.DataFrame, np.ndarray], scale: bool = True) -> np.ndarray:
+        """与 IsolationForest.predict 相同，-1 表示异常，1 表示正常"""
+        return np.where(self.decision_function(features, scale) < 0, -1, 1)
+
+    def save(self, path: str):
+        """将打包模型保存到目录，供内存映射加载
+
+        Args:
+            path: 目标目录
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAY_FILES:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                'max_depth': self.max_depth,
+                'denominator': self.denominator,
+                'offset': self.offset,
+                'feature_names': self.feature_names,
+                'n_trees': self.n_trees
+            }, f)
+        logger.info(f"打包模型已保存到: {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'PackedIsolationForest':
+        """从目录加载打包模型
+
+        Args:
+            path: save 写入的目录
+            mmap: 是否以只读内存映射方式加载
+
+        Returns:
+            打包评分器
+        """
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAY_FILES}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(
+            max_depth=meta['max_depth'],
+            denominator=meta['denominator'],
+            offset=meta['offset'],
+            feature_names=meta['feature_names'],
+            **arrays
+        )
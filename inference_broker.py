@@ -0,0 +1,201 @@
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import logging
+from concurrent.futures import Executor
+
+import numpy as np
+
+from app.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class InferenceBroker:
+    """跨钱包的异步微批推理代理
+
+    多个协程各自提交少量窗口，代理把排队的请求拼接为一个批次，只调用一次
+    模型前向计算，再把结果切分回每个调用方的 Future。批次在达到最大批量
+    或最早请求等待超过截止时间时触发。队列有最大深度，队列满时提交方等待，
+    形成背压。模型计算在线程池中执行，不阻塞事件循环。
+
+    请求可以指定模型：模型仓库切换版本后，新请求使用新模型，已排队的请求
+    仍由提交时的模型计算，不同模型的请求不会拼入同一批次。
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        max_batch_size: Optional[int] = None,
+        max_delay_ms: Optional[float] = None,
+        max_queue_depth: Optional[int] = None,
+        executor: Optional[Executor] = None
+    ):
+        """初始化推理代理
+
+        Args:
+            model: 提供 predict(X, batch_size, verbose) 的模型（Keras或NumpyLSTMModel），
+                请求未指定模型时使用
+            max_batch_size: 每个批次最多包含的窗口数
+            max_delay_ms: 批次中最早请求的最长等待时间（毫秒）
+            max_queue_depth: 排队请求数上限
+            executor: 执行模型计算的线程池，默认使用事件循环的默认线程池
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size or settings.INFERENCE_MAX_BATCH_SIZE
+        self.max_delay_ms = settings.INFERENCE_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms
+        self.max_queue_depth = max_queue_depth or settings.INFERENCE_MAX_QUEUE_DEPTH
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: Optional[Tuple[np.ndarray, asyncio.Future, float, Any]] = None
+        self._metrics = {
+            'requests': 0,
+            'windows': 0,
+            'batches': 0,
+            'flush_by_size': 0,
+            'flush_by_deadline': 0,
+            'flush_by_model': 0,
+            'max_queue_depth_seen': 0,
+            'errors': 0,
+            'total_wait_ms': 0.0,
+            'total_inference_ms': 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def start(self):
+        """在当前事件循环中启动批处理协程"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_depth)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"推理代理已启动: 批量 {self.max_batch_size}, 截止 {self.max_delay_ms}ms, 队列深度 {self.max_queue_depth}"
+        )
+
+    async def stop(self):
+        """处理完已排队的请求后停止"""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info("推理代理已停止")
+
+    async def predict(self, windows: np.ndarray, model: Optional[Any] = None) -> np.ndarray:
+        """提交窗口并等待预测结果
+
+        Args:
+            windows: 单个窗口 (序列长度, 特征数) 或一组窗口 (窗口数, 序列长度, 特征数)
+            model: 计算这些窗口的模型，默认使用代理的模型
+
+        Returns:
+            与输入窗口一一对应的预测结果
+        """
+        if not self.running:
+            await self.start()
+        windows = np.asarray(windows, dtype=np.float32)
+        single = windows.ndim == 2
+        if single:
+            windows = windows[np.newaxis]
+        if len(windows) == 0:
+            return np.empty((0, 1), dtype=np.float32)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((windows, future, loop.time(), self.model if model is None else model))
+        self._metrics['requests'] += 1
+        self._metrics['max_queue_depth_seen'] = max(self._metrics['max_queue_depth_seen'], self._queue.qsize())
+        result = await future
+        return result[0] if single else result
+
+    async def _run(self):
+        """批处理主循环"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [self._pending or await self._queue.get()]
+            self._pending = None
+            size = len(batch[0][0])
+            # 截止时间从批次中最早请求的提交时刻算起
+            deadline = batch[0][2] + self.max_delay_ms / 1000.0
+            flush_reason = 'flush_by_deadline'
+
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item[3] is not batch[0][3]:
+                    # 使用其他模型的请求留给下一个批次
+                    self._pending = item
+                    flush_reason = 'flush_by_model'
+                    break
+                if size + len(item[0]) > self.max_batch_size:
+                    # 放不下的请求留给下一个批次
+                    self._pending = item
+                    flush_reason = 'flush_by_size'
+                    break
+                batch.append(item)
+                size += len(item[0])
+            else:
+                flush_reason = 'flush_by_size'
+
+            self._metrics[flush_reason] += 1
+            await self._flush(batch, loop)
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[np.ndarray, asyncio.Future, float, Any]], loop: asyncio.AbstractEventLoop):
+        """执行一次批量前向计算并分发结果"""
+        X = np.concatenate([windows for windows, _, _, _ in batch])
+        model = batch[0][3]
+        started = loop.time()
+        for _, _, submitted, _ in batch:
+            self._metrics['total_wait_ms'] += (started - submitted) * 1000.0
+        try:
+            predictions = await loop.run_in_executor(
+                self.executor, lambda: model.predict(X, batch_size=len(X), verbose=0)
+            )
+        except Exception as e:
+            logger.error(f"批量推理出错: {str(e)}")
+            self._metrics['errors'] += 1
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._metrics['total_inference_ms'] += (loop.time() - started) * 1000.0
+        self._metrics['batches'] += 1
+        self._metrics['windows'] += len(X)
+
+        offset = 0
+        for windows, future, _, _ in batch:
+            if not future.done():
+                future.set_result(np.asarray(predictions[offset:offset + len(windows)]))
+            offset += len(windows)
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """可调参数与运行指标的快照"""
+        metrics = dict(self._metrics)
+        batches = metrics['batches']
+        metrics.update({
+            'max_batch_size': self.max_batch_size,
+            'max_delay_ms': self.max_delay_ms,
+            'max_queue_depth': self.max_queue_depth,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'avg_batch_size': metrics['windows'] / batches if batches else 0.0,
+            'avg_wait_ms': metrics['total_wait_ms'] / metrics['requests'] if metrics['requests'] else 0.0,
+            'avg_inference_ms': metrics['total_inference_ms'] / batches if batches else 0.0
+        })
+        return metrics
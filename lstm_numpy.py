@@ -0,0 +1,278 @@
+from typing import Dict, List, Any, Optional
+import logging
+import os
+
+import numpy as np
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 层中的权重数组
+WEIGHT_KEYS = ('kernel', 'recurrent_kernel', 'bias')
+
+# 支持导出的激活函数
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+    'relu': lambda x: np.maximum(x, 0.0)
+}
+
+
+class ArrayMinMaxScaler:
+    """只保存 min_ 和 scale_ 的最小最大缩放器，与 sklearn MinMaxScaler 的变换一致"""
+
+    def __init__(self, min_: np.ndarray, scale_: np.ndarray):
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.scale_ = np.asarray(scale_, dtype=np.float64)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X: np.ndarray) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+class NumpyLSTMModel:
+    """纯NumPy实现的LSTM推理模型
+
+    按层保存从Keras导出的权重，前向计算与Keras一致：LSTM门顺序为
+    输入门、遗忘门、候选记忆、输出门（i, f, c, o），Dense为仿射变换加激活。
+    Dropout只在训练时生效，推理时忽略。predict 的签名与Keras模型兼容，
+    可以直接替换 AIMonitor.model。
+    """
+
+    def __init__(self, layers: List[Dict[str, Any]], dtype: Any = np.float32):
+        """初始化推理模型
+
+        权重可以是量化后的形式（int8 数组加对应的 *_scale 每列缩放系数，或 float16 数组），
+        构造时一次性反量化为计算精度，只保留计算精度的一份权重。量化只是存储格式：
+        NumPy 没有 int8/float16 的 BLAS 矩阵乘法，计算始终使用计算精度，
+        导出时再按 quantization 和缩放系数重新编码（int8 的编码可以无损还原）。
+
+        Args:
+            layers: 层描述列表，每层包含 type、activation 及权重数组
+            dtype: 计算精度
+        """
+        self.dtype = dtype
+        self.layers = [self._dequantize(layer) for layer in layers]
+
+    def _dequantize(self, layer: Dict[str, Any]) -> Dict[str, Any]:
+        """将层权重转换为计算精度"""
+        compute = dict(layer)
+        for key in WEIGHT_KEYS:
+            if key not in layer:
+                continue
+            weights = np.asanyarray(layer[key])
+            scale = layer.get(f"{key}_scale")
+            if scale is not None:
+                weights = weights.astype(np.float32) * np.asarray(scale, dtype=np.float32)
+            # 类型已一致时不复制，内存映射加载的权重保持共享
+            compute[key] = weights.astype(self.dtype, copy=False)
+        return compute
+
+    @property
+    def quantization(self) -> str:
+        """权重存储精度: float32、float16 或 int8"""
+        return str(self.layers[0].get('quantization', 'float32')) if self.layers else 'float32'
+
+    @property
+    def weight_bytes(self) -> int:
+        """推理时常驻内存的权重（计算精度）占用的字节数"""
+        return sum(layer[key].nbytes for layer in self.layers for key in WEIGHT_KEYS if key in layer)
+
+    @property
+    def stored_weight_bytes(self) -> int:
+        """导出文件中权重（含缩放系数）占用的字节数"""
+        return sum(
+            np.asarray(value).nbytes
+            for layer in self.stored_layers()
+            for key, value in layer.items()
+            if key in WEIGHT_KEYS or key.endswith('_scale')
+        )
+
+    def stored_layers(self) -> List[Dict[str, Any]]:
+        """按各层的存储精度重新编码权重，用于导出"""
+        stored = []
+        for layer in self.layers:
+            encoded = dict(layer)
+            for key in WEIGHT_KEYS:
+                if key not in layer:
+                    continue
+                scale = layer.get(f"{key}_scale")
+                if scale is not None:
+                    encoded[key] = np.clip(np.round(layer[key] / scale), -127, 127).astype(np.int8)
+                elif layer.get('quantization') == 'float16' and key != 'bias':
+                    encoded[key] = layer[key].astype(np.float16)
+            stored.append(encoded)
+        return stored
+
+    @classmethod
+    def from_keras(cls, model: Any) -> 'NumpyLSTMModel':
+        """从Keras Sequential模型提取权重
+
+        Args:
+            model: 由 LSTM、Dropout、Dense 层组成的Keras模型
+
+        Returns:
+            推理模型
+        """
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == 'Dropout':
+                continue
+            config = layer.get_config()
+            weights = layer.get_weights()
+            if kind == 'LSTM':
+                if not config.get('use_bias', True):
+                    weights.append(np.zeros(weights[0].shape[1], dtype=np.float32))
+                layers.append({
+                    'type': 'lstm',
+                    'activation': config.get('activation', 'tanh'),
+                    'recurrent_activation': config.get('recurrent_activation', 'sigmoid'),
+                    'return_sequences': bool(config.get('return_sequences', False)),
+                    'kernel': weights[0],
+                    'recurrent_kernel': weights[1],
+                    'bias': weights[2]
+                })
+            elif kind == 'Dense':
+                if not config.get('use_bias', True):
+                    weights.append(np.zeros(weights[0].shape[1], dtype=np.float32))
+                layers.append({
+                    'type': 'dense',
+                    'activation': config.get('activation', 'linear'),
+                    'kernel': weights[0],
+                    'bias': weights[1]
+                })
+            else:
+                raise ValueError(f"不支持导出的层类型: {kind}")
+        for layer in layers:
+            for key in ('activation', 'recurrent_activation'):
+                if key in layer and layer[key] not in _ACTIVATIONS:
+                    raise ValueError(f"不支持导出的激活函数: {layer[key]}")
+        return cls(layers)
+
+    def _lstm(self, layer: Dict[str, Any], x: np.ndarray) -> np.ndarray:
+        """LSTM层前向计算"""
+        activation = _ACTIVATIONS[layer['activation']]
+        recurrent_activation = _ACTIVATIONS[layer['recurrent_activation']]
+        recurrent_kernel = layer['recurrent_kernel']
+        units = recurrent_kernel.shape[0]
+        batch, steps, _ = x.shape
+
+        # 所有时间步的输入投影一次完成
+        inputs = (x.reshape(batch * steps, -1) @ layer['kernel'] + layer['bias']).reshape(batch, steps, -1)
+        h = np.zeros((batch, units), dtype=self.dtype)
+        c = np.zeros((batch, units), dtype=self.dtype)
+        outputs = np.empty((batch, steps, units), dtype=self.dtype) if layer['return_sequences'] else None
+        for t in range(steps):
+            z = inputs[:, t] + h @ recurrent_kernel
+            i = recurrent_activation(z[:, :units])
+            f = recurrent_activation(z[:, units:2 * units])
+            candidate = activation(z[:, 2 * units:3 * units])
+            o = recurrent_activation(z[:, 3 * units:])
+            c = f * c + i * candidate
+            h = o * activation(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        return outputs if outputs is not None else h
+
+    def predict(self, X: np.ndarray, batch_size: Optional[int] = None, verbose: int = 0) -> np.ndarray:
+        """前向推理，签名与Keras的 predict 兼容
+
+        Args:
+            X: 输入 (样本数, 序列长度, 特征数)
+            batch_size: 每次计算的样本数，默认一次全部计算
+            verbose: 兼容参数，忽略
+
+        Returns:
+            预测结果 (样本数, 输出维度)
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        if len(X) == 0:
+            return np.empty((0, self.layers[-1]['kernel'].shape[1]), dtype=self.dtype)
+        step = batch_size or len(X)
+        return np.concatenate([self._forward(X[start:start + step]) for start in range(0, len(X), step)])
+
+    def _forward(self, x: np.ndarray) -> np.ndarray:
+        for layer in self.layers:
+            if layer['type'] == 'lstm':
+                x = self._lstm(layer, x)
+            else:
+                x = _ACTIVATIONS[layer['activation']](x @ layer['kernel'] + layer['bias'])
+        return x
+
+
+def export_lstm(model: Any, scaler: Any, sequence_length: int, path: str):
+    """将模型和缩放器导出为单个 .npz 文件或 .npy 文件目录
+
+    以 .npz 结尾的路径写入单个文件（先写临时文件再原子替换）；其他路径写入
+    每个数组一个 .npy 文件的目录，可被多个进程以只读内存映射方式共享加载。
+
+    Args:
+        model: 已训练的Keras模型，或 NumpyLSTMModel（包括量化后的模型）
+        scaler: 已拟合的 MinMaxScaler
+        sequence_length: 输入序列长度
+        path: 输出文件或目录路径
+    """
+    numpy_model = model if isinstance(model, NumpyLSTMModel) else NumpyLSTMModel.from_keras(model)
+    arrays = {
+        'sequence_length': np.array(sequence_length),
+        'scaler_min': np.asarray(scaler.min_),
+        'scaler_scale': np.asarray(scaler.scale_),
+        'layer_count': np.array(len(numpy_model.layers))
+    }
+    for i, layer in enumerate(numpy_model.stored_layers()):
+        for key, value in layer.items():
+            arrays[f"layer{i}_{key}"] = np.asarray(value)
+    if path.endswith('.npz'):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+    logger.info(f"LSTM权重已导出到: {path}")
+
+
+def load_lstm(path: str, mmap: bool = True) -> Dict[str, Any]:
+    """加载 export_lstm 导出的文件或目录，不依赖TensorFlow
+
+    Args:
+        path: .npz 文件或 .npy 文件目录
+        mmap: 目录形式时是否以只读内存映射方式加载；float32 权重不会被复制，
+            多个进程共享同一份页缓存
+
+    Returns:
+        包含 model、scaler、sequence_length 的字典
+    """
+    if os.path.isdir(path):
+        mode = 'r' if mmap else None
+        data = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode=mode)
+            for name in os.listdir(path) if name.endswith('.npy')
+        }
+        return _from_arrays(data)
+    with np.load(path) as data:
+        return _from_arrays({name: data[name] for name in data.files})
+
+
+def _from_arrays(data: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """由导出的数组重建模型和缩放器"""
+    layers = []
+    for i in range(int(data['layer_count'])):
+        prefix = f"layer{i}_"
+        layer = {}
+        for name, value in data.items():
+            if name.startswith(prefix):
+                layer[name[len(prefix):]] = value.item() if value.ndim == 0 else value
+        layers.append(layer)
+    return {
+        'model': NumpyLSTMModel(layers),
+        'scaler': ArrayMinMaxScaler(np.array(data['scaler_min']), np.array(data['scaler_scale'])),
+        'sequence_length': int(data['sequence_length'])
+    }
@@ -0,0 +1,151 @@
+from typing import Dict, Any, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+
+from app.analytics.lstm_numpy import NumpyLSTMModel, WEIGHT_KEYS
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 支持的量化模式
+QUANTIZATION_MODES = ('int8', 'float16')
+
+# int8 校准时尝试的截断比例
+DEFAULT_CLIP_RATIOS = (1.0, 0.99, 0.97, 0.95, 0.9, 0.8)
+
+
+def quantize_int8(weights: np.ndarray, clip_ratio: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """按输出列对称量化为 int8
+
+    Args:
+        weights: 权重矩阵 (输入, 输出) 或偏置向量
+        clip_ratio: 量化范围占每列最大绝对值的比例，小于1时截断离群值以提高其余权重的分辨率
+
+    Returns:
+        (int8 权重, 每列缩放系数)
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    max_abs = np.abs(weights).max(axis=0) if weights.ndim > 1 else np.abs(weights)
+    scale = np.where(max_abs > 0, max_abs * clip_ratio / 127.0, 1.0).astype(np.float32)
+    quantized = np.clip(np.round(weights / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+
+def _quantize_layer(layer: Dict[str, Any], mode: str, clip_ratio: float) -> Dict[str, Any]:
+    """量化一层的权重；偏置保持 float32"""
+    quantized = {key: value for key, value in layer.items() if key not in WEIGHT_KEYS and not key.endswith('_scale')}
+    quantized['quantization'] = mode
+    for key in WEIGHT_KEYS:
+        if key not in layer:
+            continue
+        weights = np.asarray(layer[key], dtype=np.float32)
+        if key == 'bias':
+            quantized[key] = weights
+        elif mode == 'float16':
+            quantized[key] = weights.astype(np.float16)
+        else:
+            quantized[key], quantized[f"{key}_scale"] = quantize_int8(weights, clip_ratio)
+    return quantized
+
+
+def quantize_model(
+    model: NumpyLSTMModel,
+    mode: str = 'int8',
+    calibration_X: Optional[np.ndarray] = None,
+    clip_ratios: Sequence[float] = DEFAULT_CLIP_RATIOS
+) -> NumpyLSTMModel:
+    """量化 NumpyLSTMModel 的权重
+
+    int8 模式下提供校准数据时，逐层从 clip_ratios 中选择使模型输出与
+    浮点模型差异（均方误差）最小的截断比例；不提供时使用完整范围。
+
+    Args:
+        model: 浮点推理模型
+        mode: int8 或 float16
+        calibration_X: 校准窗口 (样本数, 序列长度, 特征数)
+        clip_ratios: int8 校准时尝试的截断比例
+
+    Returns:
+        权重量化后的推理模型
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"不支持的量化模式: {mode}")
+    if mode == 'float16' or calibration_X is None or len(calibration_X) == 0:
+        return NumpyLSTMModel([_quantize_layer(layer, mode, 1.0) for layer in model.layers])
+
+    reference = model.predict(calibration_X)
+    layers = list(model.layers)
+    chosen = []
+    # 逐层校准，前面已确定的层保持量化状态，后面的层暂时保持浮点
+    for i, layer in enumerate(model.layers):
+        best = None
+        for ratio in clip_ratios:
+            candidate = layers[:i] + [_quantize_layer(layer, mode, ratio)] + layers[i + 1:]
+            error = float(np.mean((NumpyLSTMModel(candidate).predict(calibration_X) - reference) ** 2))
+            if best is None or error < best[0]:
+                best = (error, ratio, candidate[i])
+        layers[i] = best[2]
+        chosen.append(best[1])
+    logger.info(f"int8 校准完成，各层截断比例: {chosen}")
+    return NumpyLSTMModel(layers)
+
+
+def accuracy_report(
+    float_model: Any,
+    quantized_model: NumpyLSTMModel,
+    X_holdout: np.ndarray,
+    y_holdout: np.ndarray,
+    scaler: Optional[Any] = None,
+    batch_size: int = 1024
+) -> Dict[str, Any]:
+    """在保留集上比较浮点模型与量化模型
+
+    Args:
+        float_model: 浮点模型（Keras 或 NumpyLSTMModel）
+        quantized_model: 量化后的模型
+        X_holdout: 保留集窗口
+        y_holdout: 保留集目标（缩放后）
+        scaler: 提供时误差按原始金额计算
+        batch_size: 预测时的批量
+
+    Returns:
+        误差、误差差值、预测差异、常驻和导出的权重大小
+    """
+    y_holdout = np.asarray(y_holdout, dtype=np.float64).reshape(-1, 1)
+    float_pred = np.asarray(float_model.predict(X_holdout, batch_size=batch_size, verbose=0), dtype=np.float64)
+    quant_pred = np.asarray(quantized_model.predict(X_holdout, batch_size=batch_size), dtype=np.float64)
+    if scaler is not None:
+        y_holdout = scaler.inverse_transform(y_holdout)
+        float_pred = scaler.inverse_transform(float_pred)
+        quant_pred = scaler.inverse_transform(quant_pred)
+
+    float_mae = float(np.mean(np.abs(float_pred - y_holdout)))
+    quant_mae = float(np.mean(np.abs(quant_pred - y_holdout)))
+    float_rmse = float(np.sqrt(np.mean((float_pred - y_holdout) ** 2)))
+    quant_rmse = float(np.sqrt(np.mean((quant_pred - y_holdout) ** 2)))
+    float_bytes = float_model.weight_bytes if isinstance(float_model, NumpyLSTMModel) else int(
+        sum(w.size for w in float_model.get_weights()) * 4
+    )
+
+    report = {
+        'mode': quantized_model.quantization,
+        'holdout_windows': len(X_holdout),
+        'float_mae': float_mae,
+        'quantized_mae': quant_mae,
+        'mae_delta': quant_mae - float_mae,
+        'float_rmse': float_rmse,
+        'quantized_rmse': quant_rmse,
+        'rmse_delta': quant_rmse - float_rmse,
+        'max_prediction_diff': float(np.max(np.abs(quant_pred - float_pred))) if len(X_holdout) else 0.0,
+        'float_weight_bytes': float_bytes,
+        # 量化模型加载后反量化为计算精度，常驻内存与浮点模型相同，只有导出文件变小
+        'quantized_weight_bytes': quantized_model.weight_bytes,
+        'quantized_stored_weight_bytes': quantized_model.stored_weight_bytes
+    }
+    logger.info(
+        f"量化评估({report['mode']}): MAE {float_mae:.6f} -> {quant_mae:.6f}, "
+        f"导出权重 {report['float_weight_bytes']} -> {report['quantized_stored_weight_bytes']} 字节"
+    )
+    return report
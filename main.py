@@ -7,8 +7,8 @@ import os
 from datetime import timedelta
 
 from app.database import get_db, engine, Base
-from app.models import User
-from app.schemas import Token, UserCreate, UserResponse
+from app.models import User, Alert, AlertCounter
+from app.schemas import Token, UserCreate, UserResponse, Transaction as TransactionResponse
 from app.security import (
     get_password_hash, 
     verify_password, 
@@ -20,6 +20,11 @@ from app.security import (
 from app.security_middleware import configure_security_middleware as configure_additional_security_middleware
 from app.config import settings
 from app.encryption import EncryptionService, SecureStorage, SENSITIVE_FIELDS
+from app.alerts.monitor_index import watched_address_index
+from app.alerts.alert_counter import rebuild_counts
+from app.alerts.alert_system import AlertSystem
+from app.alerts.notification_dispatcher import notification_dispatcher
+from app.analytics.feature_store import feature_store
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
@@ -176,6 +181,22 @@ async def health_check():
     """系统健康检查"""
     return {"status": "ok", "version": "1.0.0"}
 
+# 警报关联交易查询
+@app.get("/api/v1/alerts/{alert_id}/transaction", response_model=TransactionResponse)
+async def read_alert_transaction(
+    alert_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按警报中的 (blockchain, tx_hash) 引用查询完整交易，警报列表只返回摘要"""
+    transaction = AlertSystem(db, notifier=notification_dispatcher).get_alert_transaction(alert_id, current_user.id)
+    if transaction is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Transaction not found"
+        )
+    return transaction
+
 # 包含其他路由模块
 # from app.routers import wallets, transactions, alerts, analytics
 # app.include_router(wallets.router, prefix="/api/v1/wallets", tags=["wallets"])
@@ -209,12 +230,32 @@ async def startup_event():
         db.add(admin)
         db.commit()
         logger.info(f"Created admin user: {settings.ADMIN_USERNAME}")
+    
+    # 预加载被监控地址索引，警报匹配不再逐笔查询数据库
+    watched_address_index.load(db)
+    
+    # 首次启用警报计数时按已有警报初始化计数器
+    if db.query(AlertCounter.id).first() is None and db.query(Alert.id).first() is not None:
+        rebuild_counts(db)
+    
+    # 从上次关闭时的快照恢复特征存储
+    if os.path.exists(settings.FEATURE_STORE_PATH):
+        feature_store.restore(settings.FEATURE_STORE_PATH)
+    
+    # 启动通知分发器，并重放上次关闭前未投递的通知
+    await notification_dispatcher.start()
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行"""
     logger.info("Application shutdown")
+    
+    # 投递已排队的通知，未投递的写入暂存文件
+    await notification_dispatcher.stop()
+    
+    # 写出特征存储快照，重启后继续使用已有的窗口聚合
+    feature_store.save(settings.FEATURE_STORE_PATH)
 
 # 主入口点
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+"""压缩已有警报的 related_data
+
+旧版本的异常警报在 related_data['anomaly'] 中保存了完整的交易（以太坊
+input、logs，比特币 inputs、outputs 等），本脚本按主键分批将其改写为
+交易引用 {blockchain, tx_hash} 加异常摘要的紧凑格式。已是紧凑格式的警报
+不会改写，脚本可以重复执行或中断后重新执行。
+
+用法: python migrate_alert_payloads.py [--batch-size N] [--dry-run]
+"""
+import argparse
+import json
+import logging
+
+from sqlalchemy import update
+
+from app.models import Alert
+from app.alerts.alert_payload import compact_related_data
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate(db, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """按主键游标分批压缩警报，每批一次批量 UPDATE 并提交
+
+    Args:
+        db: 数据库会话
+        batch_size: 每批读取的警报数
+        dry_run: 只统计不写入
+
+    Returns:
+        统计: 扫描数、改写数、改写前后 related_data 的 JSON 字节数
+    """
+    stats = {'scanned': 0, 'rewritten': 0, 'bytes_before': 0, 'bytes_after': 0}
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Alert.id, Alert.related_data)
+            .filter(Alert.id > last_id, Alert.related_data.isnot(None))
+            .order_by(Alert.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        stats['scanned'] += len(rows)
+
+        updates = []
+        for alert_id, related_data in rows:
+            compacted = compact_related_data(related_data)
+            if compacted is None:
+                continue
+            stats['bytes_before'] += len(json.dumps(related_data, default=str))
+            stats['bytes_after'] += len(json.dumps(compacted))
+            updates.append({'id': alert_id, 'related_data': compacted})
+
+        if updates and not dry_run:
+            try:
+                db.execute(update(Alert), updates)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"压缩警报出错（最后处理的警报ID {last_id}）: {str(e)}")
+                raise
+        stats['rewritten'] += len(updates)
+        logger.info(f"已扫描 {stats['scanned']} 条警报，改写 {stats['rewritten']} 条")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩已有警报的 related_data")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的警报数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不写入")
+    args = parser.parse_args()
+
+    # 在此导入，migrate 可以脱离数据库配置单独使用
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        stats = migrate(db, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(
+        f"扫描 {stats['scanned']} 条，改写 {stats['rewritten']} 条，"
+        f"related_data {stats['bytes_before']} -> {stats['bytes_after']} 字节"
+    )
+
+
+if __name__ == "__main__":
+    main()
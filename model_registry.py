@@ -0,0 +1,326 @@
+from typing import Dict, List, Any, Optional
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from app.config import settings
+from app.analytics.iforest_scorer import PackedIsolationForest
+from app.analytics.lstm_numpy import export_lstm, load_lstm
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 支持的模型类型
+MODEL_KINDS = ('lstm', 'iforest')
+
+# 未按链固定版本时使用的键
+DEFAULT_PIN = 'default'
+
+
+class ModelRegistry:
+    """本地磁盘上的版本化模型仓库
+
+    目录结构为 <root>/<模型名>/<版本>/，每个版本包含模型数组文件和
+    metadata.json（特征结构、缩放参数、训练时间窗口、评估指标），写入时先写
+    临时目录再原子重命名，已发布的版本不会被覆盖。<root>/<模型名>/pins.json
+    记录每条链固定使用的版本，修改固定版本即可回滚，无需重新部署。
+
+    模型按需加载并在进程内按最近使用缓存，数组以只读内存映射方式打开，多个
+    工作进程共享同一份页缓存，内存不随进程数增长。版本列表和固定版本按
+    refresh_seconds 间隔检查目录和文件的修改时间，推理路径上不逐次扫描磁盘。
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        refresh_seconds: Optional[float] = None,
+        cache_size: Optional[int] = None
+    ):
+        """初始化模型仓库
+
+        Args:
+            root: 仓库根目录
+            refresh_seconds: 重新检查版本目录和固定版本文件的最短间隔（秒）
+            cache_size: 进程内缓存的已加载模型版本数上限
+        """
+        self.root = root or settings.MODEL_REGISTRY_PATH
+        self.refresh_seconds = settings.MODEL_REGISTRY_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.cache_size = cache_size or settings.MODEL_REGISTRY_CACHE_SIZE
+        self._models: 'OrderedDict[tuple, Any]' = OrderedDict()
+        self._pins: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _model_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _version_dir(self, name: str, version: str) -> str:
+        return os.path.join(self.root, name, version)
+
+    def versions(self, name: str, refresh: bool = False) -> List[str]:
+        """模型已发布的版本，按发布顺序排列，按 refresh_seconds 间隔检查目录变化"""
+        with self._lock:
+            cached = self._versions.get(name)
+            now = time.monotonic()
+            if cached is not None and not refresh and now - cached['checked'] < self.refresh_seconds:
+                return cached['versions']
+            model_dir = self._model_dir(name)
+            # 发布新版本是目录内的重命名，会更新目录的修改时间
+            mtime = os.path.getmtime(model_dir) if os.path.isdir(model_dir) else None
+            if cached is None or cached['mtime'] != mtime or refresh:
+                versions = []
+                if mtime is not None:
+                    versions = sorted((
+                        v for v in os.listdir(model_dir)
+                        if v.startswith('v') and v[1:].isdigit()
+                        and os.path.isfile(os.path.join(model_dir, v, 'metadata.json'))
+                    ), key=lambda v: int(v[1:]))
+                cached = {'versions': versions, 'mtime': mtime}
+            cached['checked'] = now
+            self._versions[name] = cached
+            return cached['versions']
+
+    def metadata(self, name: str, version: str) -> Dict[str, Any]:
+        """读取版本的元数据"""
+        with open(os.path.join(self._version_dir(name, version), 'metadata.json')) as f:
+            return json.load(f)
+
+    def _publish(self, name: str, kind: str, write, metadata: Dict[str, Any]) -> str:
+        """写入临时目录后原子发布为新版本
+
+        Args:
+            name: 模型名
+            kind: 模型类型
+            write: 接收目录路径并写入模型数组的函数
+            metadata: 调用方提供的元数据
+
+        Returns:
+            新版本号
+        """
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"不支持的模型类型: {kind}")
+        model_dir = self._model_dir(name)
+        os.makedirs(model_dir, exist_ok=True)
+        with self._lock:
+            existing = self.versions(name, refresh=True)
+            number = int(existing[-1][1:]) + 1 if existing else 1
+            while True:
+                version = f"v{number}"
+                tmp_dir = os.path.join(model_dir, f".{version}.tmp")
+                try:
+                    os.makedirs(tmp_dir)
+                    break
+                except FileExistsError:
+                    number += 1
+            try:
+                write(tmp_dir)
+                meta = dict(metadata)
+                meta.update({'name': name, 'version': version, 'kind': kind, 'created_at': datetime.now().isoformat()})
+                with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as f:
+                    json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+                # 其他进程已发布同名版本时换用下一个版本号
+                while os.path.exists(self._version_dir(name, version)):
+                    number += 1
+                    version = f"v{number}"
+                    meta['version'] = version
+                    with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as f:
+                        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+                os.rename(tmp_dir, self._version_dir(name, version))
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            self._versions.pop(name, None)
+        logger.info(f"模型已发布: {name} {version}")
+        return version
+
+    def register_lstm(
+        self,
+        monitor: Any,
+        name: str = 'lstm',
+        training_window: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """发布 AIMonitor 的LSTM模型
+
+        Args:
+            monitor: 已训练的 AIMonitor
+            name: 模型名
+            training_window: 训练数据的时间范围，如 {'start': ..., 'end': ...}
+            metrics: 评估指标
+
+        Returns:
+            新版本号
+        """
+        if not monitor.is_trained or monitor.model is None:
+            raise ValueError("模型尚未训练，无法发布")
+        metadata = {
+            'feature_schema': ['value'],
+            'sequence_length': monitor.sequence_length,
+            'scaler': {
+                'type': 'minmax',
+                'min': np.ravel(monitor.scaler.min_).tolist(),
+                'scale': np.ravel(monitor.scaler.scale_).tolist()
+            },
+            'training_window': training_window or {},
+            'metrics': metrics or {}
+        }
+        return self._publish(
+            name, 'lstm',
+            lambda path: export_lstm(monitor.model, monitor.scaler, monitor.sequence_length, path),
+            metadata
+        )
+
+    def register_iforest(
+        self,
+        analyzer: Any,
+        name: str = 'iforest',
+        training_window: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """发布 TransactionAnalyzer 的IsolationForest模型（打包格式）
+
+        Args:
+            analyzer: 已训练的 TransactionAnalyzer
+            name: 模型名
+            training_window: 训练数据的时间范围
+            metrics: 评估指标
+
+        Returns:
+            新版本号
+        """
+        packed = analyzer.packed_model
+        if packed is None:
+            packed = PackedIsolationForest.from_sklearn(analyzer.model, analyzer.scaler)
+        metadata = {
+            'feature_schema': packed.feature_names,
+            'scaler': {
+                'type': 'standard',
+                'mean': np.asarray(packed.scaler_mean).tolist(),
+                'scale': np.asarray(packed.scaler_scale).tolist()
+            },
+            'training_window': training_window or {},
+            'metrics': metrics or {}
+        }
+        return self._publish(name, 'iforest', packed.save, metadata)
+
+    def _pins_path(self, name: str) -> str:
+        return os.path.join(self._model_dir(name), 'pins.json')
+
+    def pins(self, name: str, refresh: bool = False) -> Dict[str, str]:
+        """读取各链固定的版本，按 refresh_seconds 间隔检查文件变化"""
+        with self._lock:
+            cached = self._pins.get(name)
+            now = time.monotonic()
+            if cached is not None and not refresh and now - cached['checked'] < self.refresh_seconds:
+                return cached['pins']
+            path = self._pins_path(name)
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if cached is None or cached['mtime'] != mtime or refresh:
+                pins = {}
+                if mtime is not None:
+                    with open(path) as f:
+                        pins = json.load(f)
+                cached = {'pins': pins, 'mtime': mtime}
+            cached['checked'] = now
+            self._pins[name] = cached
+            return cached['pins']
+
+    def pin(self, name: str, version: str, chain: Optional[str] = None):
+        """为链固定版本，不指定链时设置默认版本
+
+        Args:
+            name: 模型名
+            version: 版本号
+            chain: 区块链名称
+        """
+        if version not in self.versions(name, refresh=True):
+            raise ValueError(f"模型 {name} 不存在版本 {version}")
+        with self._lock:
+            pins = dict(self.pins(name, refresh=True))
+            pins[(chain or DEFAULT_PIN).lower()] = version
+            self._write_pins(name, pins)
+        logger.info(f"模型 {name} 在 {chain or DEFAULT_PIN} 上固定为 {version}")
+
+    def unpin(self, name: str, chain: Optional[str] = None):
+        """取消链的固定版本，回退到默认版本或最新版本"""
+        with self._lock:
+            pins = dict(self.pins(name, refresh=True))
+            pins.pop((chain or DEFAULT_PIN).lower(), None)
+            self._write_pins(name, pins)
+
+    def _write_pins(self, name: str, pins: Dict[str, str]):
+        """原子写入固定版本文件（调用方需持有锁）"""
+        path = self._pins_path(name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(pins, f, indent=2)
+        os.replace(tmp_path, path)
+        self._pins.pop(name, None)
+
+    def resolve(self, name: str, chain: Optional[str] = None) -> Optional[str]:
+        """链当前使用的版本: 链固定版本 > 默认固定版本 > 最新版本"""
+        pins = self.pins(name)
+        if chain and chain.lower() in pins:
+            return pins[chain.lower()]
+        if DEFAULT_PIN in pins:
+            return pins[DEFAULT_PIN]
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+
+    def rollback(self, name: str, chain: Optional[str] = None) -> str:
+        """将链固定到当前使用版本的上一个版本
+
+        Returns:
+            回滚后的版本号
+        """
+        versions = self.versions(name)
+        current = self.resolve(name, chain)
+        if current not in versions or versions.index(current) == 0:
+            raise ValueError(f"模型 {name} 没有可回滚的早期版本")
+        previous = versions[versions.index(current) - 1]
+        self.pin(name, previous, chain)
+        return previous
+
+    def load(self, name: str, chain: Optional[str] = None, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按需加载链当前使用的模型版本，进程内按版本缓存，超过上限时淘汰最久未使用的版本
+
+        Args:
+            name: 模型名
+            chain: 区块链名称
+            version: 指定版本，默认按固定规则解析
+
+        Returns:
+            {'version', 'metadata', 'model', ...}，仓库中没有版本时为 None。
+            lstm 类型额外包含 scaler 和 sequence_length
+        """
+        version = version or self.resolve(name, chain)
+        if version is None:
+            return None
+        key = (name, version)
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is not None:
+                self._models.move_to_end(key)
+            else:
+                path = self._version_dir(name, version)
+                metadata = self.metadata(name, version)
+                if metadata['kind'] == 'lstm':
+                    loaded = load_lstm(path, mmap=True)
+                else:
+                    loaded = {'model': PackedIsolationForest.load(path, mmap=True)}
+                loaded.update({'version': version, 'metadata': metadata})
+                self._models[key] = loaded
+                while len(self._models) > self.cache_size:
+                    evicted, _ = self._models.popitem(last=False)
+                    logger.info(f"已从缓存淘汰模型 {evicted[0]} {evicted[1]}")
+                logger.info(f"已加载模型 {name} {version}")
+        return loaded
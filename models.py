@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -44,7 +44,7 @@ class WalletMonitor(Base):
     
     # 复合唯一约束
     __table_args__ = (
-        {"UniqueConstraint": ("user_id", "wallet_address", "blockchain")},
+        UniqueConstraint("user_id", "wallet_address", "blockchain"),
     )
 
 
@@ -83,6 +83,31 @@ class Alert(Base):
     
     # 关系
     user = relationship("User", back_populates="alerts")
+    
+    # 按用户分页的游标索引 (user_id, created_at, id)，以及按状态过滤时使用的索引
+    __table_args__ = (
+        Index("ix_alerts_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_alerts_user_status_created_id", "user_id", "status", "created_at", "id"),
+    )
+
+
+class AlertCounter(Base):
+    """用户各状态警报数计数器
+
+    写入警报和更新警报状态时在同一事务内维护，读取角标计数无需 COUNT(*)。
+    """
+    __tablename__ = "alert_counters"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String(20), nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    # 复合唯一约束
+    __table_args__ = (
+        UniqueConstraint("user_id", "status"),
+    )
 
 
 class Transaction(Base):
@@ -104,5 +129,5 @@ class Transaction(Base):
     
     # 复合唯一约束
     __table_args__ = (
-        {"UniqueConstraint": ("blockchain", "tx_hash")},
+        UniqueConstraint("blockchain", "tx_hash"),
     )
@@ -0,0 +1,424 @@
+from typing import Dict, List, Any, Optional, NamedTuple, Tuple, Callable, Set
+import logging
+import threading
+import time
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from app.models import AlertConfig, WalletMonitor
+from app.config import settings
+from app.alerts.notification_channels import channel_targets
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 会话中暂存未提交变更的键
+_PENDING_KEY = 'watched_address_changes'
+
+
+class MonitorEntry(NamedTuple):
+    """索引中的钱包监控，只保留匹配警报所需的字段"""
+    user_id: int
+    wallet_address: str
+    blockchain: str
+    threshold: Optional[float]
+    monitor_id: Optional[int] = None
+
+
+class ConfigEntry(NamedTuple):
+    """索引中的启用的警报配置"""
+    user_id: int
+    alert_type: str
+    threshold: Optional[float]
+    # 渠道名 -> 用户配置的投递目标
+    channels: Dict[str, Any]
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """规范化地址用于匹配
+
+    以太坊地址（0x开头）和 bech32 地址不区分大小写，统一转为小写；
+    Base58 地址区分大小写，只去除首尾空白。
+    """
+    address = (address or '').strip()
+    lowered = address.lower()
+    if lowered.startswith(('0x', 'bc1', 'tb1', 'ltc1')):
+        return lowered
+    return address
+
+
+def index_key(blockchain: Optional[str], address: Optional[str]) -> Tuple[str, str]:
+    """索引键: (小写链名, 规范化地址)"""
+    return (blockchain or '').strip().lower(), normalize_address(address)
+
+
+class WatchedAddressIndex:
+    """进程内的被监控地址索引
+
+    将 (区块链, 规范化地址) 映射到启用警报的钱包监控列表，并按警报类型
+    保存启用了全局警报的用户及其通知渠道，警报匹配不再访问数据库。
+
+    启动时整体加载。本进程中 WalletMonitor 或 AlertConfig 的增删改由
+    SQLAlchemy 事件记录在会话中，提交后增量应用到索引，回滚则丢弃；
+    Query.update()/delete() 无法得知具体行，提交后将索引标记为过期并在下一次
+    ensure_fresh 时整体重新加载。其他进程的修改通过 refresh_seconds 间隔的
+    版本检查同步：先查询两张表的行数、最大ID和最大更新时间，只有变化时才在
+    刷新锁内重新加载。每次变更版本号加一，订阅者收到变更的索引键。
+    """
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        """初始化索引
+
+        Args:
+            refresh_seconds: 定期重新加载的间隔（秒），0 表示只在变更通知时重新加载
+        """
+        self.refresh_seconds = settings.MONITOR_INDEX_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._monitors: Dict[Tuple[str, str], List[MonitorEntry]] = {}
+        self._monitor_keys: Dict[int, Tuple[str, str]] = {}
+        self._configs: Dict[int, ConfigEntry] = {}
+        self._global_users: Dict[str, List[int]] = {}
+        self._channels: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._config_thresholds: Dict[Tuple[int, str], float] = {}
+        self._listeners: List[Callable[[Optional[Set[Tuple[str, str]]], bool], None]] = []
+        self._version = 0
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        # 上次加载时两张表的数据版本，用于判断定期刷新是否需要重新加载
+        self._data_version: Optional[Tuple[Any, ...]] = None
+        # 加载期间本进程提交的增量变更，换入新快照后重放
+        self._replay: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._listening = False
+        # 每个索引在会话中使用独立的暂存键，多个监听的索引互不影响
+        self._pending_key = f"{_PENDING_KEY}:{id(self)}"
+
+    @property
+    def version(self) -> int:
+        """当前快照的版本号，未加载时为 0"""
+        return self._version
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._monitors)
+
+    def subscribe(self, listener: Callable[[Optional[Set[Tuple[str, str]]], bool], None]):
+        """订阅索引变更
+
+        Args:
+            listener: 回调 (变更的索引键, 警报配置是否变更)，整体重新加载时索引键为 None
+        """
+        self._listeners.append(listener)
+
+    def _publish(self, keys: Optional[Set[Tuple[str, str]]], configs_changed: bool):
+        """通知订阅者（调用方需持有锁）"""
+        for listener in self._listeners:
+            listener(keys, configs_changed)
+
+    def load(self, db: Session) -> int:
+        """从数据库加载全部启用的监控和警报配置
+
+        Args:
+            db: 数据库会话
+
+        Returns:
+            新快照的版本号
+        """
+        # 先清除过期标记，加载期间收到的变更通知会让下一次检查重新加载
+        self._stale = False
+        with self._lock:
+            self._replay = []
+        # 在读取行之前记录数据版本，读取期间的提交会在下一次检查时被发现
+        data_version = self._read_data_version(db)
+        monitors: Dict[Tuple[str, str], List[MonitorEntry]] = {}
+        monitor_keys: Dict[int, Tuple[str, str]] = {}
+        rows = db.query(
+            WalletMonitor.id, WalletMonitor.user_id, WalletMonitor.wallet_address,
+            WalletMonitor.blockchain, WalletMonitor.threshold
+        ).filter(WalletMonitor.alert_enabled == True).order_by(WalletMonitor.id).all()
+        for monitor_id, user_id, wallet_address, blockchain, threshold in rows:
+            key = index_key(blockchain, wallet_address)
+            monitors.setdefault(key, []).append(MonitorEntry(user_id, wallet_address, blockchain, threshold, monitor_id))
+            monitor_keys[monitor_id] = key
+
+        configs = {
+            config_id: ConfigEntry(user_id, alert_type, threshold, channel_targets(notification_channels))
+            for config_id, user_id, alert_type, threshold, notification_channels in db.query(
+                AlertConfig.id, AlertConfig.user_id, AlertConfig.alert_type,
+                AlertConfig.threshold, AlertConfig.notification_channels
+            ).filter(AlertConfig.enabled == True).order_by(AlertConfig.id).all()
+        }
+
+        with self._lock:
+            first_load = self._loaded_at is None
+            old_monitors, old_configs = self._monitors, self._configs
+            self._monitors = monitors
+            self._monitor_keys = monitor_keys
+            self._configs = configs
+            self._rebuild_configs()
+            # 查询与换入之间本进程提交的变更可能不在查询结果中，重放到新快照（重复应用无副作用）
+            replay, self._replay = self._replay or [], None
+            self._apply_locked(replay)
+            self._version += 1
+            self._loaded_at = time.monotonic()
+            self._data_version = data_version
+            version = self._version
+            if first_load:
+                self._publish(None, True)
+            else:
+                # 只通知内容变化的索引键，订阅者不必丢弃全部缓存
+                changed_keys = {
+                    key for key in set(old_monitors) | set(self._monitors)
+                    if old_monitors.get(key) != self._monitors.get(key)
+                }
+                self._publish(changed_keys, old_configs != self._configs)
+        logger.info(f"被监控地址索引已加载: 版本 {version}, {len(rows)} 个监控, {len(configs)} 条警报配置")
+        return version
+
+    def _rebuild_configs(self):
+        """由警报配置重建全局用户、通知渠道和阈值（调用方需持有锁）"""
+        global_users: Dict[str, List[int]] = {}
+        channels: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        thresholds: Dict[Tuple[int, str], float] = {}
+        for config_id in sorted(self._configs):
+            config = self._configs[config_id]
+            users = global_users.setdefault(config.alert_type, [])
+            if config.user_id not in users:
+                users.append(config.user_id)
+            user_channels = channels.setdefault((config.user_id, config.alert_type), {})
+            for name, target in config.channels.items():
+                user_channels.setdefault(name, target)
+            if config.threshold is not None:
+                key = (config.user_id, config.alert_type)
+                thresholds[key] = min(thresholds.get(key, config.threshold), config.threshold)
+        self._global_users = global_users
+        self._channels = channels
+        self._config_thresholds = thresholds
+
+    def invalidate(self):
+        """标记索引过期，下一次 ensure_fresh 时重新加载"""
+        self._stale = True
+
+    @staticmethod
+    def _read_data_version(db: Session) -> Tuple[Any, ...]:
+        """两张表的行数、最大ID和最大更新时间，任何增删改都会改变其中一项"""
+        version: Tuple[Any, ...] = ()
+        for model in (WalletMonitor, AlertConfig):
+            version += tuple(db.query(func.count(model.id), func.max(model.id), func.max(model.updated_at)).one())
+        return version
+
+    def _expired(self) -> bool:
+        return (
+            self._loaded_at is None
+            or (self.refresh_seconds > 0 and time.monotonic() - self._loaded_at >= self.refresh_seconds)
+        )
+
+    def ensure_fresh(self, db: Session) -> int:
+        """索引过期、尚未加载或超过刷新间隔且数据版本变化时重新加载
+
+        并发调用方在刷新锁上等待，同一时刻只有一个调用方检查版本或重新加载。
+
+        Returns:
+            当前快照的版本号
+        """
+        if not self._stale and not self._expired():
+            return self._version
+        with self._refresh_lock:
+            # 等待期间其他调用方可能已经完成刷新
+            if self._stale or self._loaded_at is None:
+                return self.load(db)
+            if not self._expired():
+                return self._version
+            if self._read_data_version(db) != self._data_version:
+                return self.load(db)
+            self._loaded_at = time.monotonic()
+            return self._version
+
+    def apply_changes(self, changes: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """增量应用已提交的变更
+
+        Args:
+            changes: (模型名, 行快照) 列表，行快照含 id 和 deleted 标记
+
+        Returns:
+            当前快照的版本号
+        """
+        if not changes:
+            return self._version
+        with self._lock:
+            if self._replay is not None:
+                self._replay.extend(changes)
+            changed_keys, configs_changed = self._apply_locked(changes)
+            self._version += 1
+            version = self._version
+            self._publish(changed_keys, configs_changed)
+        logger.info(f"被监控地址索引增量更新: 版本 {version}, {len(changed_keys)} 个地址")
+        return version
+
+    def _apply_locked(self, changes: List[Tuple[str, Dict[str, Any]]]) -> Tuple[Set[Tuple[str, str]], bool]:
+        """应用变更，返回受影响的索引键和警报配置是否变更（调用方需持有锁）"""
+        changed_keys: Set[Tuple[str, str]] = set()
+        configs_changed = False
+        for model, row in changes:
+            if model == 'monitor':
+                changed_keys |= self._apply_monitor(row)
+            else:
+                self._configs.pop(row['id'], None)
+                if not row['deleted'] and row['enabled']:
+                    self._configs[row['id']] = ConfigEntry(
+                        row['user_id'], row['alert_type'], row['threshold'],
+                        channel_targets(row['notification_channels'])
+                    )
+                configs_changed = True
+        if configs_changed:
+            self._rebuild_configs()
+        return changed_keys, configs_changed
+
+    def _apply_monitor(self, row: Dict[str, Any]) -> Set[Tuple[str, str]]:
+        """应用一个监控的变更，返回受影响的索引键（调用方需持有锁）
+
+        只替换受影响地址的列表，读取方持有的旧列表不受影响。
+        """
+        changed = set()
+        old_key = self._monitor_keys.pop(row['id'], None)
+        if old_key is not None:
+            entries = [entry for entry in self._monitors.get(old_key, []) if entry.monitor_id != row['id']]
+            if entries:
+                self._monitors[old_key] = entries
+            else:
+                self._monitors.pop(old_key, None)
+            changed.add(old_key)
+        if not row['deleted'] and row['alert_enabled']:
+            key = index_key(row['blockchain'], row['wallet_address'])
+            entry = MonitorEntry(row['user_id'], row['wallet_address'], row['blockchain'], row['threshold'], row['id'])
+            entries = sorted(self._monitors.get(key, []) + [entry], key=lambda e: e.monitor_id or 0)
+            self._monitors[key] = entries
+            self._monitor_keys[row['id']] = key
+            changed.add(key)
+        return changed
+
+    def monitors(self, blockchain: Optional[str], address: Optional[str]) -> List[MonitorEntry]:
+        """监控该地址且启用警报的钱包监控"""
+        if not address:
+            return []
+        return self._monitors.get(index_key(blockchain, address), [])
+
+    def monitors_by_key(self, key: Tuple[str, str]) -> List[MonitorEntry]:
+        """按索引键获取钱包监控"""
+        return self._monitors.get(key, [])
+
+    def entries(self) -> List[MonitorEntry]:
+        """全部启用的钱包监控"""
+        return [entry for entries in list(self._monitors.values()) for entry in entries]
+
+    def global_users(self, alert_type: str) -> List[int]:
+        """启用了该类型全局警报的用户ID"""
+        return self._global_users.get(alert_type, [])
+
+    def channels(self, user_id: int, alert_type: str) -> List[str]:
+        """用户为该警报类型启用的通知渠道"""
+        return list(self._channels.get((user_id, alert_type), {}))
+
+    def channel_targets(self, user_id: int, alert_type: str) -> Dict[str, Any]:
+        """用户为该警报类型启用的通知渠道及其投递目标，多条配置时先配置的优先"""
+        return self._channels.get((user_id, alert_type), {})
+
+    def config_threshold(self, user_id: int, alert_type: str) -> Optional[float]:
+        """用户该警报类型配置的阈值，多条配置取最小值，未设置时为 None"""
+        return self._config_thresholds.get((user_id, alert_type))
+
+    def _events(self) -> List[Tuple[Any, str, Callable]]:
+        """监听的 SQLAlchemy 事件"""
+        return [
+            (WalletMonitor, 'after_insert', self._on_monitor_change),
+            (WalletMonitor, 'after_update', self._on_monitor_change),
+            (WalletMonitor, 'after_delete', self._on_monitor_delete),
+            (AlertConfig, 'after_insert', self._on_config_change),
+            (AlertConfig, 'after_update', self._on_config_change),
+            (AlertConfig, 'after_delete', self._on_config_delete),
+            (Session, 'after_commit', self._on_commit),
+            (Session, 'after_rollback', self._on_rollback),
+            # Query.update()/delete() 不触发映射器事件
+            (Session, 'after_bulk_update', self._on_bulk_change),
+            (Session, 'after_bulk_delete', self._on_bulk_change)
+        ]
+
+    def listen(self):
+        """注册 SQLAlchemy 事件，本进程提交的监控或配置变更增量更新索引"""
+        if self._listening:
+            return
+        for target, name, handler in self._events():
+            event.listen(target, name, handler)
+        self._listening = True
+
+    def unlisten(self):
+        """移除 listen 注册的事件"""
+        if not self._listening:
+            return
+        for target, name, handler in self._events():
+            event.remove(target, name, handler)
+        self._listening = False
+
+    def _record(self, target: Any, model: str, row: Dict[str, Any]):
+        """在会话中暂存变更，提交后应用"""
+        session = object_session(target)
+        if session is None:
+            self.invalidate()
+            return
+        session.info.setdefault(self._pending_key, []).append((model, row))
+
+    def _on_monitor_change(self, mapper: Any, connection: Any, target: Any, deleted: bool = False):
+        self._record(target, 'monitor', {
+            'id': target.id,
+            'user_id': target.user_id,
+            'wallet_address': target.wallet_address,
+            'blockchain': target.blockchain,
+            'threshold': target.threshold,
+            'alert_enabled': target.alert_enabled is not False,
+            'deleted': deleted
+        })
+
+    def _on_monitor_delete(self, mapper: Any, connection: Any, target: Any):
+        self._on_monitor_change(mapper, connection, target, deleted=True)
+
+    def _on_config_change(self, mapper: Any, connection: Any, target: Any, deleted: bool = False):
+        self._record(target, 'config', {
+            'id': target.id,
+            'user_id': target.user_id,
+            'alert_type': target.alert_type,
+            'threshold': target.threshold,
+            'enabled': target.enabled is not False,
+            'notification_channels': target.notification_channels,
+            'deleted': deleted
+        })
+
+    def _on_config_delete(self, mapper: Any, connection: Any, target: Any):
+        self._on_config_change(mapper, connection, target, deleted=True)
+
+    def _on_commit(self, session: Session):
+        changes = session.info.pop(self._pending_key, None)
+        if not changes or not self.loaded:
+            return
+        if any(model == 'bulk' for model, _ in changes):
+            # 批量修改的具体行未知，提交后整体重新加载
+            self.invalidate()
+            return
+        self.apply_changes(changes)
+
+    def _on_rollback(self, session: Session):
+        session.info.pop(self._pending_key, None)
+
+    def _on_bulk_change(self, context: Any):
+        if context.mapper is not None and context.mapper.class_ in (WalletMonitor, AlertConfig):
+            # 与逐行变更一样等到提交后再处理，提交前重新加载会读到旧数据并清除过期标记
+            context.session.info.setdefault(self._pending_key, []).append(('bulk', {}))
+
+
+# 进程内共享的索引
+watched_address_index = WatchedAddressIndex()
+watched_address_index.listen()
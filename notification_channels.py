@@ -0,0 +1,20 @@
+from typing import Dict, List, Any, Optional
+import logging
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def enabled_channels(notification_channels: Optional[Dict[str, Any]]) -> List[str]:
+    """AlertConfig.notification_channels 中启用的渠道名"""
+    return [name for name, config in (notification_channels or {}).items() if config]
+
+
+def channel_targets(notification_channels: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """AlertConfig.notification_channels 中启用的渠道及其配置
+
+    配置值为 True 时使用渠道的默认目标；为字符串（如 Webhook 地址）或字典
+    （如 {"url": ...}）时作为该用户的投递目标随通知一起传给渠道。
+    """
+    return {name: config for name, config in (notification_channels or {}).items() if config}
@@ -0,0 +1,513 @@
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Mapping, Set
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from app.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def alert_payload(alert: Any) -> Dict[str, Any]:
+    """警报的通知内容
+
+    Args:
+        alert: Alert 对象
+
+    Returns:
+        可JSON序列化的通知字典
+    """
+    created_at = getattr(alert, 'created_at', None)
+    return {
+        'alert_id': alert.id,
+        'user_id': alert.user_id,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'title': alert.title,
+        'description': alert.description,
+        'created_at': created_at.isoformat() if isinstance(created_at, datetime) else created_at
+    }
+
+
+class FileSink:
+    """将通知追加写入 JSONL 文件的本地渠道，用于测试和离线审计"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for payload in batch:
+                f.write(json.dumps(payload, ensure_ascii=False, default=str) + '\n')
+
+    async def send(self, batch: List[Dict[str, Any]]):
+        await asyncio.to_thread(self._write, batch)
+
+
+class WebhookSink:
+    """Webhook 渠道，同一批次中发往同一地址的通知合并为一个 POST 请求
+
+    通知的 target 为用户在 notification_channels 中配置的地址（字符串或含 url 的字典），
+    未配置时投递到默认地址。
+    """
+
+    def __init__(self, url: Optional[str] = None, timeout_seconds: float = 10.0):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _target_url(self, payload: Dict[str, Any]) -> Optional[str]:
+        target = payload.get('target')
+        if isinstance(target, str):
+            return target
+        if isinstance(target, dict) and target.get('url'):
+            return target['url']
+        return self.url
+
+    def routable(self, payload: Dict[str, Any]) -> bool:
+        """通知是否有可投递的地址"""
+        return bool(self._target_url(payload))
+
+    async def send(self, batch: List[Dict[str, Any]]):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        by_url: Dict[str, List[Dict[str, Any]]] = {}
+        for payload in batch:
+            notification = {key: value for key, value in payload.items() if key != 'target'}
+            by_url.setdefault(self._target_url(payload), []).append(notification)
+        for url, notifications in by_url.items():
+            async with self._session.post(url, json={'notifications': notifications}) as response:
+                response.raise_for_status()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class EchoWebhookServer:
+    """本地的 Webhook 回显服务器，记录收到的通知，可模拟投递失败"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.received: List[Dict[str, Any]] = []
+        self.requests = 0
+        self._failures = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/notify"
+
+    def fail_next(self, count: int):
+        """接下来的 count 个请求返回 503"""
+        self._failures = count
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self._failures > 0:
+            self._failures -= 1
+            return web.Response(status=503)
+        body = await request.json()
+        self.received.extend(body.get('notifications', []))
+        return web.json_response({'received': len(body.get('notifications', []))})
+
+    async def start(self) -> str:
+        """启动服务器，返回通知地址"""
+        app = web.Application()
+        app.router.add_post('/notify', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class SpoolWriter:
+    """在后台线程中追加写入暂存文件
+
+    write 只入队立即返回，后台线程把积压的条目合并为一次写入和一次 fsync，
+    生成警报的线程和事件循环都不等待磁盘。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # 暂存文件的写入与重放时的改名互斥
+        self.file_lock = threading.Lock()
+        self._queue: 'queue.Queue[List[Dict[str, Any]]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def write(self, entries: List[Dict[str, Any]]):
+        """提交待写入的条目"""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-spool', daemon=True)
+                self._thread.start()
+        self._queue.put(entries)
+
+    def flush(self):
+        """等待已提交的条目全部写入磁盘（阻塞）"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.file_lock:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        for entries in pending:
+                            for entry in entries:
+                                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+                        f.flush()
+                        os.fsync(f.fileno())
+            except Exception as e:
+                logger.error(f"写入通知暂存文件出错: {str(e)}")
+            finally:
+                for _ in pending:
+                    self._queue.task_done()
+
+
+class NotificationDispatcher:
+    """异步通知分发器
+
+    每个渠道一个有界队列和若干投递协程。投递协程把排队的通知按批量上限
+    或等待截止时间合并为一批，调用渠道的 send 一次投递；失败时按指数退避
+    重试，仍失败则写入持久化的 JSONL 暂存文件，由后台任务定期重放。
+
+    notify 可以在任意线程调用，只做入队，不等待投递：分发器未启动或
+    队列已满时交给后台线程写入暂存文件，调用方不等待磁盘。
+    """
+
+    def __init__(
+        self,
+        sinks: Dict[str, Any],
+        batch_size: Optional[int] = None,
+        max_delay_ms: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        workers_per_channel: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_base_ms: Optional[float] = None,
+        backoff_max_ms: Optional[float] = None,
+        spool_path: Optional[str] = None,
+        spool_replay_seconds: Optional[float] = None
+    ):
+        """初始化分发器
+
+        Args:
+            sinks: 渠道名 -> 提供 async send(batch) 的投递渠道
+            batch_size: 每批最多投递的通知数
+            max_delay_ms: 批次中最早通知的最长等待时间（毫秒）
+            queue_size: 每个渠道的队列容量
+            workers_per_channel: 每个渠道的投递协程数
+            max_retries: 投递失败后的重试次数
+            backoff_base_ms: 第一次重试前的等待时间，之后每次翻倍
+            backoff_max_ms: 重试等待时间上限
+            spool_path: 暂存文件路径
+            spool_replay_seconds: 重放暂存文件的间隔（秒）
+        """
+        self.sinks = dict(sinks)
+        self.batch_size = batch_size or settings.NOTIFY_BATCH_SIZE
+        self.max_delay_ms = settings.NOTIFY_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms
+        self.queue_size = queue_size or settings.NOTIFY_QUEUE_SIZE
+        self.workers_per_channel = workers_per_channel or settings.NOTIFY_WORKERS_PER_CHANNEL
+        self.max_retries = settings.NOTIFY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base_ms = settings.NOTIFY_BACKOFF_BASE_MS if backoff_base_ms is None else backoff_base_ms
+        self.backoff_max_ms = settings.NOTIFY_BACKOFF_MAX_MS if backoff_max_ms is None else backoff_max_ms
+        self.spool_path = spool_path or settings.NOTIFY_SPOOL_PATH
+        self.spool_replay_seconds = settings.NOTIFY_SPOOL_REPLAY_SECONDS if spool_replay_seconds is None else spool_replay_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._spool_writer = SpoolWriter(self.spool_path)
+        self._metrics: Dict[str, Dict[str, Any]] = {name: self._new_metrics() for name in self.sinks}
+        self._unroutable = 0
+        self._warned_unroutable: Set[str] = set()
+
+    @staticmethod
+    def _new_metrics() -> Dict[str, Any]:
+        return {
+            'enqueued': 0,
+            'delivered': 0,
+            'batches': 0,
+            'retries': 0,
+            'failed_batches': 0,
+            'spooled': 0,
+            'replayed': 0,
+            'total_latency_ms': 0.0,
+            'max_latency_ms': 0.0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    async def start(self):
+        """在当前事件循环中启动投递协程，并重放暂存文件"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        for name in self.sinks:
+            self._queues[name] = asyncio.Queue(maxsize=self.queue_size)
+            for _ in range(self.workers_per_channel):
+                self._tasks.append(asyncio.create_task(self._worker(name)))
+        if self.spool_replay_seconds > 0:
+            self._tasks.append(asyncio.create_task(self._replay_loop()))
+        await self.replay_spool()
+        logger.info(f"通知分发器已启动: 渠道 {list(self.sinks)}, 每渠道 {self.workers_per_channel} 个投递协程")
+
+    async def stop(self, drain: bool = True):
+        """停止分发器
+
+        Args:
+            drain: 是否先投递完已排队的通知
+        """
+        if not self.running:
+            return
+        if drain:
+            await asyncio.gather(*(channel_queue.join() for channel_queue in self._queues.values()))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # 未投递的通知写入暂存文件，下次启动时重放
+        for name, channel_queue in self._queues.items():
+            while not channel_queue.empty():
+                payload, _ = channel_queue.get_nowait()
+                self._spool(name, [payload], 'dispatcher stopped')
+        await asyncio.to_thread(self._spool_writer.flush)
+        for sink in self.sinks.values():
+            close = getattr(sink, 'close', None)
+            if close is not None:
+                await close()
+        self._tasks = []
+        self._queues = {}
+        self._loop = None
+        logger.info("通知分发器已停止")
+
+    def notify(self, payload: Dict[str, Any], channels: Iterable[str]):
+        """提交通知，立即返回，可在任意线程调用
+
+        Args:
+            payload: 通知内容
+            channels: 渠道名，或 渠道名 -> 用户配置的投递目标（True 表示使用渠道默认目标）
+        """
+        enqueued_at = time.monotonic()
+        targets = channels if isinstance(channels, Mapping) else dict.fromkeys(channels, True)
+        for name, target in targets.items():
+            sink = self.sinks.get(name)
+            channel_payload = payload if target is True else dict(payload, target=target)
+            routable = getattr(sink, 'routable', None)
+            if sink is None or (routable is not None and not routable(channel_payload)):
+                self._count_unroutable(name)
+                continue
+            loop = self._loop
+            if loop is None:
+                self._spool(name, [channel_payload], 'dispatcher not running')
+                continue
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                self._enqueue(name, channel_payload, enqueued_at)
+                continue
+            try:
+                loop.call_soon_threadsafe(self._enqueue, name, channel_payload, enqueued_at)
+            except RuntimeError:
+                # 事件循环已关闭
+                self._spool(name, [channel_payload], 'event loop closed')
+
+    def _count_unroutable(self, name: str):
+        """记录没有投递渠道的通知，每个渠道名只警告一次"""
+        self._unroutable += 1
+        if name not in self._warned_unroutable:
+            self._warned_unroutable.add(name)
+            logger.warning(f"通知渠道 {name} 未配置或缺少投递目标，相关通知不会投递")
+
+    def notify_alerts(self, alerts: List[Any], channels_for: Any):
+        """为一批警报提交通知
+
+        Args:
+            alerts: Alert 对象
+            channels_for: (用户ID, 警报类型) -> 渠道名列表或 渠道名 -> 投递目标 的函数
+        """
+        for alert in alerts:
+            channels = channels_for(alert.user_id, alert.alert_type)
+            if channels:
+                self.notify(alert_payload(alert), channels)
+
+    def _enqueue(self, name: str, payload: Dict[str, Any], enqueued_at: float):
+        """在事件循环线程中入队，队列满时写入暂存文件"""
+        channel_queue = self._queues.get(name)
+        if channel_queue is None:
+            self._spool(name, [payload], 'dispatcher not running')
+            return
+        try:
+            channel_queue.put_nowait((payload, enqueued_at))
+            self._metrics[name]['enqueued'] += 1
+        except asyncio.QueueFull:
+            self._spool(name, [payload], 'queue full')
+
+    async def _worker(self, name: str):
+        """渠道投递协程"""
+        channel_queue = self._queues[name]
+        while True:
+            batch = [await channel_queue.get()]
+            deadline = time.monotonic() + self.max_delay_ms / 1000.0
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(channel_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._deliver(name, batch)
+            finally:
+                for _ in batch:
+                    channel_queue.task_done()
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间（带抖动的指数退避）"""
+        delay = min(self.backoff_base_ms * (2 ** attempt), self.backoff_max_ms)
+        return delay * random.uniform(0.5, 1.0) / 1000.0
+
+    async def _deliver(self, name: str, batch: List[Tuple[Dict[str, Any], float]]):
+        """投递一批通知，失败时重试，最终失败写入暂存文件"""
+        sink = self.sinks[name]
+        metrics = self._metrics[name]
+        payloads = [payload for payload, _ in batch]
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                metrics['retries'] += 1
+                await asyncio.sleep(self._backoff_seconds(attempt - 1))
+            try:
+                await sink.send(payloads)
+            except Exception as e:
+                error = e
+                logger.warning(f"渠道 {name} 投递失败（第 {attempt + 1} 次）: {str(e)}")
+                continue
+            delivered_at = time.monotonic()
+            metrics['delivered'] += len(batch)
+            metrics['batches'] += 1
+            for _, enqueued_at in batch:
+                latency_ms = (delivered_at - enqueued_at) * 1000.0
+                metrics['total_latency_ms'] += latency_ms
+                metrics['max_latency_ms'] = max(metrics['max_latency_ms'], latency_ms)
+            return
+        metrics['failed_batches'] += 1
+        self._spool(name, payloads, str(error))
+
+    def _spool(self, name: str, payloads: List[Dict[str, Any]], reason: str):
+        """交给后台线程追加写入暂存文件，不等待磁盘"""
+        spooled_at = datetime.utcnow().isoformat()
+        self._spool_writer.write([
+            {'channel': name, 'payload': payload, 'reason': reason, 'spooled_at': spooled_at}
+            for payload in payloads
+        ])
+        if name in self._metrics:
+            self._metrics[name]['spooled'] += len(payloads)
+        logger.warning(f"{len(payloads)} 条 {name} 通知已写入暂存文件: {reason}")
+
+    def flush_spool(self):
+        """等待已提交的暂存条目写入磁盘（阻塞），用于关闭前或测试"""
+        self._spool_writer.flush()
+
+    def _read_spool(self) -> List[Dict[str, Any]]:
+        """取出暂存文件中的全部条目（在线程池中执行）"""
+        self._spool_writer.flush()
+        with self._spool_writer.file_lock:
+            if not os.path.exists(self.spool_path) or os.path.getsize(self.spool_path) == 0:
+                return []
+            replaying = f"{self.spool_path}.replay"
+            os.replace(self.spool_path, replaying)
+        with open(replaying, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        os.remove(replaying)
+        return entries
+
+    async def replay_spool(self) -> int:
+        """将暂存文件中的通知重新入队，文件读写在线程池中执行
+
+        Returns:
+            重新入队的通知数
+        """
+        if not self.running:
+            return 0
+        entries = await asyncio.to_thread(self._read_spool)
+        count = 0
+        now = time.monotonic()
+        for entry in entries:
+            name = entry['channel']
+            if name not in self.sinks:
+                self._count_unroutable(name)
+                continue
+            self._enqueue(name, entry['payload'], now)
+            self._metrics[name]['replayed'] += 1
+            count += 1
+        if count:
+            logger.info(f"已从暂存文件重放 {count} 条通知")
+        return count
+
+    async def _replay_loop(self):
+        """定期重放暂存文件"""
+        while True:
+            await asyncio.sleep(self.spool_replay_seconds)
+            try:
+                await self.replay_spool()
+            except Exception as e:
+                logger.error(f"重放暂存文件出错: {str(e)}")
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """各渠道的投递指标快照"""
+        channels = {}
+        for name, metrics in self._metrics.items():
+            metrics = dict(metrics)
+            channel_queue = self._queues.get(name)
+            metrics['queue_depth'] = channel_queue.qsize() if channel_queue is not None else 0
+            metrics['avg_latency_ms'] = metrics['total_latency_ms'] / metrics['delivered'] if metrics['delivered'] else 0.0
+            channels[name] = metrics
+        return {'channels': channels, 'unroutable': self._unroutable}
+
+
+def build_sinks() -> Dict[str, Any]:
+    """按配置创建投递渠道
+
+    Returns:
+        渠道名 -> 投递渠道。webhook 渠道总是启用，NOTIFY_WEBHOOK_URL 只作为
+        用户未配置地址时的默认地址；file 渠道只在配置了路径时启用
+    """
+    sinks: Dict[str, Any] = {'webhook': WebhookSink(settings.NOTIFY_WEBHOOK_URL or None)}
+    if settings.NOTIFY_FILE_PATH:
+        sinks['file'] = FileSink(settings.NOTIFY_FILE_PATH)
+    return sinks
+
+
+# 全局分发器，由应用启动/关闭事件启动和停止
+notification_dispatcher = NotificationDispatcher(build_sinks())
@@ -0,0 +1,270 @@
+from typing import Dict, List, Any, Optional
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.analytics.flow_graph import to_epoch
+from app.analytics.feature_store import FeatureStore
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 规则名称，与 AIMonitor._detect_unusual_patterns 的输出一致
+FREQUENCY_SPIKE = "交易频率突然增加"
+AMOUNT_SPIKE = "交易金额突然增加"
+NIGHT_ACTIVITY = "频繁深夜交易"
+
+# 最近窗口长度
+RECENT = 3
+
+# 状态列: 交易数, 最早时间, 最新时间, 金额总和, 深夜交易数
+_COUNT, _FIRST, _LAST, _VALUE_SUM, _NIGHT = range(5)
+
+
+def evaluate_patterns(
+    count: int,
+    avg_interval: float,
+    recent_interval: float,
+    avg_value: float,
+    recent_value: float,
+    night_count: int
+) -> List[str]:
+    """根据汇总统计量判断异常模式
+
+    Args:
+        count: 交易数
+        avg_interval: 全部相邻交易的平均间隔（秒）
+        recent_interval: 最近（至多）3个间隔的平均值
+        avg_value: 平均金额
+        recent_value: 最近（至多）3笔交易的平均金额
+        night_count: 0-5点的交易数
+
+    Returns:
+        检测到的异常模式列表
+    """
+    patterns = []
+    if count < 3:
+        return patterns
+    # 检查交易频率突然增加
+    if count >= 5 and recent_interval < avg_interval * 0.3:
+        patterns.append(FREQUENCY_SPIKE)
+    # 检查交易金额突然增加
+    if recent_value > avg_value * 3:
+        patterns.append(AMOUNT_SPIKE)
+    # 检查深夜交易模式
+    if night_count and night_count / count > 0.5:
+        patterns.append(NIGHT_ACTIVITY)
+    return patterns
+
+
+def evaluate_window_patterns(features: Dict[str, Dict[str, float]]) -> List[str]:
+    """根据特征存储的窗口聚合判断异常模式
+
+    窗口按配置从短到长排列：以最长窗口作为基线、最短窗口作为“最近”，
+    代替最近3笔交易的统计。最短窗口内没有交易时视为频率未变化。
+
+    Args:
+        features: FeatureStore.get_features 的结果（窗口名 -> 特征字典）
+
+    Returns:
+        检测到的异常模式列表
+    """
+    windows = list(features.values())
+    recent, baseline = windows[0], windows[-1]
+    count = int(baseline['count'])
+    avg_interval = baseline['interval_mean']
+    recent_interval = recent['interval_mean'] if recent['count'] else avg_interval
+    return evaluate_patterns(
+        count,
+        avg_interval,
+        recent_interval,
+        baseline['value_mean'],
+        recent['value_mean'],
+        int(round(baseline['night_ratio'] * count))
+    )
+
+
+def _hour(timestamp: Any, epoch: float) -> int:
+    """交易发生的小时"""
+    return timestamp.hour if isinstance(timestamp, datetime) else datetime.fromtimestamp(epoch).hour
+
+
+class IncrementalPatternDetector:
+    """按地址增量维护的异常模式检测器
+
+    每个地址只保存交易数、最早和最新时间、金额总和、深夜交易数，
+    以及最近3个间隔和最近3笔金额的环形缓冲区。平均间隔等于
+    (最新时间 - 最早时间) / (交易数 - 1)，因此每笔交易的更新和规则判断都是O(1)。
+    交易需按时间顺序到达。
+
+    挂接特征存储时不再单独维护这些统计：交易写入存储，规则按
+    evaluate_window_patterns 读取存储的窗口聚合。
+    """
+
+    def __init__(self, initial_capacity: int = 1024, feature_store: Optional[FeatureStore] = None):
+        """初始化增量检测器
+
+        Args:
+            initial_capacity: 初始地址容量，不足时自动扩容
+            feature_store: 特征存储，提供时由存储维护按地址的聚合
+        """
+        self.feature_store = feature_store
+        self._index: Dict[str, int] = {}
+        self._stats = np.zeros((initial_capacity, 5))
+        self._recent_intervals = np.zeros((initial_capacity, RECENT))
+        self._recent_values = np.zeros((initial_capacity, RECENT))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index) if self.feature_store is None else len(self.feature_store)
+
+    def __contains__(self, address: str) -> bool:
+        return address in (self._index if self.feature_store is None else self.feature_store)
+
+    def _row(self, address: str) -> int:
+        """获取地址所在行，不存在时分配（调用方需持有锁）"""
+        row = self._index.get(address)
+        if row is None:
+            row = len(self._index)
+            if row >= len(self._stats):
+                self._stats = np.concatenate([self._stats, np.zeros_like(self._stats)])
+                self._recent_intervals = np.concatenate([self._recent_intervals, np.zeros_like(self._recent_intervals)])
+                self._recent_values = np.concatenate([self._recent_values, np.zeros_like(self._recent_values)])
+            self._index[address] = row
+        return row
+
+    def update(self, tx: Dict[str, Any]) -> Dict[str, List[str]]:
+        """摄取一笔交易，更新发送方和接收方的统计并判断模式
+
+        Args:
+            tx: 交易数据
+
+        Returns:
+            地址 -> 更新后检测到的异常模式
+        """
+        if self.feature_store is not None:
+            self.feature_store.update(tx)
+            addresses = dict.fromkeys(address for address in (tx.get('from_address', ''), tx.get('to_address', '')) if address)
+            return {address: self.patterns(address) for address in addresses}
+
+        timestamp = tx.get('block_timestamp')
+        epoch = to_epoch(timestamp)
+        night = _hour(timestamp, epoch) < 5
+        value = float(tx.get('value', 0))
+
+        result = {}
+        with self._lock:
+            for address in (tx.get('from_address', ''), tx.get('to_address', '')):
+                if not address or address in result:
+                    continue
+                row = self._row(address)
+                self._apply(row, epoch, value, night)
+                result[address] = self._evaluate(row)
+        return result
+
+    def update_many(self, transactions: List[Dict[str, Any]]):
+        """按顺序摄取一批交易"""
+        for tx in transactions:
+            self.update(tx)
+
+    def _apply(self, row: int, epoch: float, value: float, night: bool):
+        """累加一笔交易（调用方需持有锁）"""
+        stats = self._stats[row]
+        count = int(stats[_COUNT])
+        if count == 0:
+            stats[_FIRST] = epoch
+        else:
+            self._recent_intervals[row, (count - 1) % RECENT] = epoch - stats[_LAST]
+        stats[_LAST] = epoch
+        self._recent_values[row, count % RECENT] = value
+        stats[_VALUE_SUM] += value
+        stats[_NIGHT] += night
+        stats[_COUNT] = count + 1
+
+    def _evaluate(self, row: int) -> List[str]:
+        """根据地址当前统计判断模式（调用方需持有锁）"""
+        stats = self._stats[row]
+        count = int(stats[_COUNT])
+        intervals = count - 1
+        avg_interval = (stats[_LAST] - stats[_FIRST]) / intervals if intervals else 0.0
+        recent_interval = self._recent_intervals[row, :min(intervals, RECENT)].mean() if intervals else 0.0
+        recent_value = self._recent_values[row, :min(count, RECENT)].mean() if count else 0.0
+        avg_value = stats[_VALUE_SUM] / count if count else 0.0
+        return evaluate_patterns(count, avg_interval, recent_interval, avg_value, recent_value, int(stats[_NIGHT]))
+
+    def patterns(self, address: str) -> List[str]:
+        """地址当前的异常模式"""
+        if self.feature_store is not None:
+            if address not in self.feature_store:
+                return []
+            return evaluate_window_patterns(self.feature_store.get_features(address))
+        with self._lock:
+            row = self._index.get(address)
+            return [] if row is None else self._evaluate(row)
+
+
+def detect_patterns_batch(transactions: List[Dict[str, Any]], addresses: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """向量化的批量模式检测，用于历史评估
+
+    将交易展开为 (地址, 时间, 金额) 长表，每笔交易同时计入发送方和接收方，
+    按地址分组一次性计算与增量检测器相同的统计量。
+
+    Args:
+        transactions: 交易列表
+        addresses: 只返回这些地址，默认返回全部
+
+    Returns:
+        地址 -> 检测到的异常模式
+    """
+    if not transactions:
+        return {}
+    timestamps = [tx.get('block_timestamp') for tx in transactions]
+    epochs = [to_epoch(timestamp) for timestamp in timestamps]
+    frame = pd.DataFrame({
+        'from_address': [tx.get('from_address', '') for tx in transactions],
+        'to_address': [tx.get('to_address', '') for tx in transactions],
+        'epoch': epochs,
+        'value': [float(tx.get('value', 0)) for tx in transactions],
+        'night': [_hour(timestamp, epoch) < 5 for timestamp, epoch in zip(timestamps, epochs)]
+    })
+    frame['order'] = np.arange(len(frame))
+    long = pd.concat([
+        frame.rename(columns={'from_address': 'address'}).drop(columns='to_address'),
+        frame[frame['to_address'] != frame['from_address']].rename(columns={'to_address': 'address'}).drop(columns='from_address')
+    ])
+    long = long[long['address'] != '']
+    if addresses is not None:
+        long = long[long['address'].isin(addresses)]
+    long = long.sort_values(['address', 'epoch', 'order'], kind='stable')
+
+    grouped = long.groupby('address', sort=False)
+    long['interval'] = grouped['epoch'].diff()
+    tail = long.groupby('address', sort=False).tail(RECENT)
+    recent_intervals = long.dropna(subset=['interval']).groupby('address', sort=False).tail(RECENT)
+
+    summary = pd.DataFrame({
+        'n': grouped.size(),
+        'first': grouped['epoch'].min(),
+        'last': grouped['epoch'].max(),
+        'avg_value': grouped['value'].mean(),
+        'night_count': grouped['night'].sum(),
+        'recent_value': tail.groupby('address', sort=False)['value'].mean(),
+        'recent_interval': recent_intervals.groupby('address', sort=False)['interval'].mean()
+    }).fillna({'recent_interval': 0.0})
+    intervals = summary['n'] - 1
+    summary['avg_interval'] = np.where(intervals > 0, (summary['last'] - summary['first']) / intervals.clip(lower=1), 0.0)
+
+    result = {
+        address: evaluate_patterns(
+            int(row.n), row.avg_interval, row.recent_interval, row.avg_value, row.recent_value, int(row.night_count)
+        )
+        for address, row in zip(summary.index, summary.itertuples(index=False))
+    }
+    if addresses is not None:
+        for address in addresses:
+            result.setdefault(address, [])
+    return result
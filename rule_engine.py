@@ -0,0 +1,173 @@
+from typing import Dict, List, Any, Optional, Tuple, Set
+import logging
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.alerts.monitor_index import MonitorEntry, WatchedAddressIndex, index_key, watched_address_index
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 使用阈值规则的警报类型
+LARGE_TRANSACTION = "large_transaction"
+
+
+class AlertRuleEngine:
+    """编译后的大额交易警报规则
+
+    每个被监控地址的订阅者按阈值升序编译为 (阈值数组, 监控列表)，
+    交易金额用二分查找定位，阈值不超过金额的前缀即全部匹配的订阅者；
+    全局大额交易配置同样按阈值编译为一个数组。
+
+    阈值优先级: WalletMonitor.threshold > 该用户 large_transaction 配置的
+    AlertConfig.threshold > settings.LARGE_TRANSACTION_THRESHOLD。
+
+    编译结果按地址缓存，订阅索引变更：监控变更只重新编译受影响的地址，
+    警报配置变更（可能改变默认阈值）或索引整体重新加载时清空全部缓存。
+    """
+
+    def __init__(self, index: Optional[WatchedAddressIndex] = None, default_threshold: Optional[float] = None):
+        """初始化规则引擎
+
+        Args:
+            index: 被监控地址索引，默认使用进程内共享的索引
+            default_threshold: 未配置阈值时使用的阈值
+        """
+        self.index = watched_address_index if index is None else index
+        self.default_threshold = settings.LARGE_TRANSACTION_THRESHOLD if default_threshold is None else default_threshold
+        self._compiled: Dict[Tuple[str, str], Tuple[np.ndarray, List[MonitorEntry]]] = {}
+        self._global: Optional[Tuple[np.ndarray, List[int]]] = None
+        self._min_threshold: Optional[float] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._metrics = {'compiled_addresses': 0, 'invalidations': 0}
+        self.index.subscribe(self._on_index_change)
+
+    def _on_index_change(self, keys: Optional[Set[Tuple[str, str]]], configs_changed: bool):
+        """索引变更时使受影响的编译结果失效"""
+        with self._lock:
+            self._generation += 1
+            self._metrics['invalidations'] += 1
+            if keys is None or configs_changed:
+                self._compiled = {}
+                self._global = None
+            else:
+                for key in keys:
+                    self._compiled.pop(key, None)
+            self._min_threshold = None
+
+    def threshold(self, entry: MonitorEntry) -> float:
+        """监控实际使用的阈值"""
+        if entry.threshold is not None:
+            return float(entry.threshold)
+        configured = self.index.config_threshold(entry.user_id, LARGE_TRANSACTION)
+        return float(configured) if configured is not None else float(self.default_threshold)
+
+    def _global_threshold(self, user_id: int) -> float:
+        configured = self.index.config_threshold(user_id, LARGE_TRANSACTION)
+        return float(configured) if configured is not None else float(self.default_threshold)
+
+    def _compile(self, key: Tuple[str, str]) -> Tuple[np.ndarray, List[MonitorEntry]]:
+        """编译一个地址的订阅者，阈值升序（相同阈值保持监控ID顺序）"""
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+        generation = self._generation
+        entries = self.index.monitors_by_key(key)
+        thresholds = np.array([self.threshold(entry) for entry in entries], dtype=np.float64)
+        order = np.argsort(thresholds, kind='stable')
+        compiled = (thresholds[order], [entries[i] for i in order])
+        with self._lock:
+            # 编译期间索引发生变更时不缓存，下次重新编译
+            if generation == self._generation:
+                self._compiled[key] = compiled
+                self._metrics['compiled_addresses'] += 1
+        return compiled
+
+    def _compile_global(self) -> Tuple[np.ndarray, List[int]]:
+        """编译全局大额交易配置"""
+        compiled = self._global
+        if compiled is not None:
+            return compiled
+        generation = self._generation
+        users = self.index.global_users(LARGE_TRANSACTION)
+        thresholds = np.array([self._global_threshold(user_id) for user_id in users], dtype=np.float64)
+        order = np.argsort(thresholds, kind='stable')
+        compiled = (thresholds[order], [users[i] for i in order])
+        with self._lock:
+            if generation == self._generation:
+                self._global = compiled
+        return compiled
+
+    def monitors(self, blockchain: Optional[str], address: Optional[str], value: float) -> List[MonitorEntry]:
+        """阈值不超过金额的监控该地址的订阅者"""
+        if not address:
+            return []
+        key = index_key(blockchain, address)
+        if not self.index.monitors_by_key(key):
+            return []
+        thresholds, entries = self._compile(key)
+        return entries[:int(np.searchsorted(thresholds, value, side='right'))]
+
+    def global_users(self, value: float) -> List[int]:
+        """阈值不超过金额的全局大额交易订阅用户"""
+        thresholds, users = self._compile_global()
+        return users[:int(np.searchsorted(thresholds, value, side='right'))]
+
+    def min_threshold(self) -> float:
+        """所有订阅者中的最小阈值，金额低于它的交易不会匹配任何规则"""
+        cached = self._min_threshold
+        if cached is not None:
+            return cached
+        generation = self._generation
+        thresholds = [self.threshold(entry) for entry in self.index.entries()]
+        thresholds.extend(self._global_threshold(user_id) for user_id in self.index.global_users(LARGE_TRANSACTION))
+        minimum = min(thresholds) if thresholds else float('inf')
+        with self._lock:
+            if generation == self._generation:
+                self._min_threshold = minimum
+        return minimum
+
+    def match_large_transaction(self, transaction: Dict[str, Any]) -> List[Tuple[int, str, Optional[str]]]:
+        """匹配需要收到大额交易警报的用户
+
+        Args:
+            transaction: 交易数据
+
+        Returns:
+            (用户ID, 交易方向, 钱包地址) 列表，每个全局配置用户最多一条
+        """
+        value = float(transaction.get('value', 0))
+        blockchain = transaction.get('blockchain', '')
+        matches = []
+
+        # 监控发送方地址的订阅者
+        for monitor in self.monitors(blockchain, transaction.get('from_address', ''), value):
+            matches.append((monitor.user_id, "outgoing", monitor.wallet_address))
+
+        # 监控接收方地址的订阅者
+        for monitor in self.monitors(blockchain, transaction.get('to_address', ''), value):
+            matches.append((monitor.user_id, "incoming", monitor.wallet_address))
+
+        # 全局大额交易订阅者，已有监控警报的用户不重复
+        matched_users = {user_id for user_id, _, _ in matches}
+        for user_id in self.global_users(value):
+            if user_id not in matched_users:
+                matches.append((user_id, "global", None))
+                matched_users.add(user_id)
+
+        return matches
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """编译缓存指标的快照"""
+        metrics = dict(self._metrics)
+        metrics['cached_addresses'] = len(self._compiled)
+        return metrics
+
+
+# 进程内共享的规则引擎
+alert_rule_engine = AlertRuleEngine()
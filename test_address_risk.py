@@ -0,0 +1,78 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+from app.config import settings
+
+class TestBatchAddressRisk(unittest.TestCase):
+    """测试批量地址风险评分与逐地址计算结果一致"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.analyzer = TransactionAnalyzer()
+        rng = random.Random(7)
+        start = datetime(2025, 3, 25)
+        addresses = [f"0x{i:040x}" for i in range(30)]
+        self.transactions = []
+        for i in range(600):
+            tx = {
+                "tx_hash": f"0x{i:064x}",
+                "from_address": rng.choice(addresses[:10]),
+                "to_address": rng.choice(addresses),
+                "value": rng.choice([0.5, 3.0, settings.LARGE_TRANSACTION_THRESHOLD * 2])
+            }
+            # 部分交易缺少时间戳
+            if rng.random() > 0.1:
+                tx["block_timestamp"] = start + timedelta(minutes=rng.randint(0, 60 * 24 * rng.choice([1, 30])))
+            self.transactions.append(tx)
+        # 资金分散：一个地址向多个新地址各转一笔
+        for i in range(8):
+            self.transactions.append({
+                "from_address": "0xdispersion",
+                "to_address": f"0xrecipient{i}",
+                "value": 1.0,
+                "block_timestamp": start + timedelta(days=i)
+            })
+        # 高频交易：一小时内20笔
+        for i in range(20):
+            self.transactions.append({
+                "from_address": "0xbusy",
+                "to_address": addresses[0],
+                "value": 1.0,
+                "block_timestamp": start + timedelta(minutes=3 * i)
+            })
+
+    def test_matches_single_address_semantics(self):
+        """测试每个地址的评分、风险因素和交易数与单地址计算完全一致"""
+        batch = self.analyzer.calculate_address_risk_batch(self.transactions)
+
+        for address, row in batch.iterrows():
+            address_txs = [tx for tx in self.transactions
+                           if tx.get("from_address") == address or tx.get("to_address") == address]
+            expected = self.analyzer.calculate_address_risk(address, address_txs)
+
+            self.assertEqual(row["risk_score"], expected["risk_score"], address)
+            self.assertEqual(row["risk_factors"], expected["risk_factors"], address)
+            self.assertEqual(row["transaction_count"], expected["transaction_count"], address)
+
+        self.assertTrue(batch.loc["0xdispersion", "fund_dispersion"])
+        self.assertTrue(batch.loc["0xbusy", "high_frequency"])
+
+    def test_columnar_input_and_address_filter(self):
+        """测试列式输入和地址过滤"""
+        frame = pd.DataFrame(self.transactions)
+        addresses = ["0xdispersion", f"0x{3:040x}"]
+
+        batch = self.analyzer.calculate_address_risk_batch(frame, addresses=addresses)
+
+        self.assertEqual(sorted(batch.index), sorted(addresses))
+        self.assertEqual(
+            batch.loc["0xdispersion", "risk_factors"],
+            self.analyzer.calculate_address_risk("0xdispersion", self.transactions[-28:-20])["risk_factors"]
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.analytics.ai_monitor import AIMonitor
+from app.analytics.wallet_stream import WalletStreamPredictor
+from app.analytics.inference_broker import InferenceBroker
+
+class TestAIMonitorInference(unittest.TestCase):
+    """测试LSTM滑动窗口推理"""
+
+    @classmethod
+    def setUpClass(cls):
+        """训练一个小模型供所有用例共享"""
+        start = datetime(2025, 3, 25, 0, 0, 0)
+        cls.transactions = [
+            {
+                "tx_hash": f"0x{i}",
+                "from_address": f"addr{i % 3}",
+                "to_address": "sink",
+                "value": (1.0 + (i % 4) * 0.25) * (15 if i % 17 == 0 else 1),
+                "block_timestamp": start + timedelta(minutes=i)
+            }
+            for i in range(90)
+        ]
+        cls.monitor = AIMonitor()
+        cls.monitor.train(cls.transactions, epochs=1, batch_size=32)
+
+    def test_batched_matches_per_window(self):
+        """测试批量推理与逐窗口推理返回相同的异常"""
+        batched = self.monitor.detect_anomalies(self.transactions, threshold=0.3)
+        per_window = self.monitor.detect_anomalies(self.transactions, threshold=0.3, batched=False)
+
+        self.assertEqual([tx["tx_hash"] for tx in batched], [tx["tx_hash"] for tx in per_window])
+        np.testing.assert_allclose(
+            [tx["predicted_value"] for tx in batched],
+            [tx["predicted_value"] for tx in per_window],
+            rtol=1e-5
+        )
+
+    def test_prepare_data_is_strided_view(self):
+        """测试训练窗口是序列上的视图而不是复制"""
+        monitor = AIMonitor()
+        X, y = monitor.prepare_data(self.transactions)
+        series = monitor.prepare_series(self.transactions)
+
+        self.assertEqual(X.shape, (80, 10, 1))
+        self.assertEqual(y.shape, (80, 1))
+        self.assertTrue(np.shares_memory(X, y))
+        np.testing.assert_array_equal(X[5, :, 0], series[5:15])
+        self.assertEqual(y[5, 0], series[15])
+
+    def test_window_batches(self):
+        """测试流式批次覆盖全部窗口"""
+        monitor = AIMonitor()
+        X, y = monitor.prepare_data(self.transactions)
+        batches = monitor.window_batches(monitor.prepare_series(self.transactions), batch_size=32, shuffle=False)
+
+        first = [next(batches) for _ in range(3)]
+        self.assertEqual([len(bx) for bx, _ in first], [32, 32, 16])
+        np.testing.assert_array_equal(np.concatenate([bx for bx, _ in first]), X)
+        np.testing.assert_array_equal(np.concatenate([by for _, by in first]), y)
+        # 生成器在一轮结束后重新开始
+        np.testing.assert_array_equal(next(batches)[0], X[:32])
+
+    def test_numpy_backend_matches_keras(self):
+        """测试导出权重后NumPy推理与Keras预测一致"""
+        X, _ = self.monitor.prepare_data(self.transactions)
+        X = np.ascontiguousarray(X)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "lstm.npz")
+            self.monitor.export_weights(path)
+            serving = AIMonitor(model_path=path)
+
+        np.testing.assert_allclose(
+            serving.model.predict(X), self.monitor.model.predict(X, verbose=0), atol=1e-5
+        )
+        expected = self.monitor.detect_anomalies(self.transactions, threshold=0.3)
+        anomalies = serving.detect_anomalies(self.transactions, threshold=0.3)
+        self.assertEqual([tx["tx_hash"] for tx in anomalies], [tx["tx_hash"] for tx in expected])
+
+    def test_serving_does_not_import_tensorflow(self):
+        """测试仅加载导出权重推理时不导入TensorFlow"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "lstm.npz")
+            self.monitor.export_weights(path)
+            code = (
+                "import sys\n"
+                "from app.analytics.ai_monitor import AIMonitor\n"
+                f"monitor = AIMonitor(model_path={path!r})\n"
+                "assert monitor.is_trained\n"
+                "assert 'tensorflow' not in sys.modules\n"
+            )
+            subprocess.run([sys.executable, "-c", code], check=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+    def test_wallet_stream_matches_batch_detection(self):
+        """测试按钱包增量预测与批量滑动窗口检测给出相同的异常"""
+        predictor = WalletStreamPredictor(self.monitor, threshold=0.3)
+        signals = predictor.update_many(self.transactions)
+        expected = self.monitor.detect_anomalies(self.transactions, threshold=0.3)
+
+        self.assertEqual(len(signals), len(self.transactions))
+        self.assertEqual(len(predictor), 3)
+        self.assertIsNone(signals[0]["predicted_value"])
+        self.assertEqual(
+            sorted(s["tx_hash"] for s in signals if s["is_anomaly"]),
+            sorted(tx["tx_hash"] for tx in expected)
+        )
+        self.assertIsNotNone(predictor.pending_prediction("addr0"))
+
+    def test_monitor_wallet_async_through_broker(self):
+        """测试多个钱包通过推理代理并发监控，结果与同步监控一致"""
+        broker = InferenceBroker(self.monitor.model, max_batch_size=512, max_delay_ms=10)
+        addresses = ["addr0", "addr1", "addr2"]
+
+        async def run():
+            results = await asyncio.gather(*(
+                self.monitor.monitor_wallet_async(address, self.transactions, broker) for address in addresses
+            ))
+            await broker.stop()
+            return results
+
+        results = asyncio.run(run())
+        for address, result in zip(addresses, results):
+            expected = self.monitor.monitor_wallet(address, self.transactions)
+            self.assertEqual(result["risk_level"], expected["risk_level"])
+            self.assertEqual(result["anomalies_detected"], expected["anomalies_detected"])
+            self.assertAlmostEqual(
+                result["predicted_next_transaction"]["predicted_value"],
+                expected["predicted_next_transaction"]["predicted_value"],
+                places=4
+            )
+        self.assertEqual(broker.metrics["batches"], 1)
+
+    def test_quantized_export(self):
+        """测试int8和float16量化导出及精度报告，进程内推理仍使用浮点模型"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "lstm.npz")
+            self.monitor.export_weights(path)
+            for mode in ("int8", "float16"):
+                monitor = AIMonitor(model_path=path)
+                float_model = monitor.model
+                quantized_path = os.path.join(temp_dir, f"lstm_{mode}.npz")
+                report = monitor.export_weights(quantized_path, mode, self.transactions[:45], self.transactions[45:])
+
+                self.assertEqual(report["mode"], mode)
+                self.assertIs(monitor.model, float_model)
+                self.assertEqual(monitor.model.quantization, "float32")
+                self.assertLess(report["quantized_stored_weight_bytes"], report["float_weight_bytes"])
+                # 常驻内存只保留一份计算精度的权重
+                self.assertEqual(report["quantized_weight_bytes"], report["float_weight_bytes"])
+                self.assertLess(abs(report["mae_delta"]), 0.05 * report["float_mae"] + 1e-3)
+                self.assertNotIn("quantized_windows_per_sec", report)
+
+                # 量化文件更小，重新加载后按量化权重推理
+                reloaded = AIMonitor(model_path=quantized_path)
+                self.assertEqual(reloaded.model.quantization, mode)
+                self.assertLess(os.path.getsize(quantized_path), os.path.getsize(path))
+                X, _ = monitor._build_windows(monitor._group_sequences(self.transactions))
+                np.testing.assert_allclose(reloaded.model.predict(X), float_model.predict(X), atol=0.05)
+
+    def test_short_sequences_skipped(self):
+        """测试不足一个窗口的地址不参与检测"""
+        self.assertEqual(self.monitor.detect_anomalies(self.transactions[:20]), [])
+
+if __name__ == "__main__":
+    unittest.main()
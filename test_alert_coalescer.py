@@ -0,0 +1,119 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, WalletMonitor, Alert
+from app.alerts.alert_system import AlertSystem
+from app.alerts.alert_coalescer import AlertCoalescer
+from app.alerts.monitor_index import WatchedAddressIndex
+
+
+class TestAlertCoalescer(unittest.TestCase):
+    """测试警报合并窗口"""
+
+    def setUp(self):
+        """测试前准备"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        for i in range(2):
+            self.db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+        self.db.commit()
+        self.db.add(WalletMonitor(user_id=1, wallet_address="0xABC", blockchain="ethereum", threshold=100))
+        self.db.add(WalletMonitor(user_id=2, wallet_address="0xABC", blockchain="ethereum", threshold=100))
+        self.db.commit()
+        self.coalescer = AlertCoalescer(window_seconds=300, max_samples=10)
+        self.alert_system = AlertSystem(self.db, index=WatchedAddressIndex(), coalescer=self.coalescer)
+
+    def _transfers(self, count: int, start: int = 0, value: float = 1000.0) -> list:
+        return [
+            {
+                "blockchain": "ethereum",
+                "from_address": "0xabc",
+                "to_address": f"0x{i}",
+                "value": value,
+                "tx_hash": f"h{i}"
+            }
+            for i in range(start, start + count)
+        ]
+
+    def _user_alerts(self, user_id: int) -> list:
+        self.db.expire_all()
+        return self.db.query(Alert).filter(Alert.user_id == user_id).order_by(Alert.id).all()
+
+    def test_repeated_transfers_coalesce(self):
+        """测试同一钱包的50笔转出合并为每个用户一条警报"""
+        first = self.alert_system.process_transactions(self._transfers(30))
+        self.assertEqual({user_id: len(alerts) for user_id, alerts in first.items()}, {1: 1, 2: 1})
+
+        # 窗口内的后续事件只更新已写入的警报，不返回新警报
+        self.assertEqual(self.alert_system.process_transactions(self._transfers(20, start=30)), {})
+
+        for user_id in (1, 2):
+            alerts = self._user_alerts(user_id)
+            self.assertEqual(len(alerts), 1)
+            coalesced = alerts[0].related_data["coalesced"]
+            self.assertEqual(coalesced["count"], 50)
+            self.assertEqual(coalesced["total_value"], 50000.0)
+            self.assertEqual(len(coalesced["samples"]), 10)
+        self.assertEqual(self.coalescer.metrics["merged"], 98)
+
+    def test_status_change_closes_group(self):
+        """测试警报被处理后新事件产生新警报，已处理的警报不再被改写"""
+        alert = self.alert_system.process_transactions(self._transfers(2))[1][0]
+        self.alert_system.update_alert_status(alert.id, "resolved")
+
+        created = self.alert_system.process_transactions(self._transfers(3, start=2))
+        self.assertEqual(len(created[1]), 1)
+
+        alerts = self._user_alerts(1)
+        self.assertEqual(len(alerts), 2)
+        self.assertEqual(alerts[0].status, "resolved")
+        self.assertEqual(alerts[0].related_data["coalesced"]["count"], 2)
+        self.assertEqual(alerts[1].related_data["coalesced"]["count"], 3)
+        # 另一用户的警报未被处理，继续合并
+        self.assertEqual(len(self._user_alerts(2)), 1)
+
+    def test_persist_skips_handled_alerts(self):
+        """测试其他进程已处理的警报不被合并结果覆盖，后续事件写入为新警报"""
+        alert = self.alert_system.process_transactions(self._transfers(1))[1][0]
+        self.db.query(Alert).filter(Alert.id == alert.id).update({"status": "read"})
+        self.db.commit()
+
+        created = self.alert_system.process_transactions(self._transfers(5, start=1))
+        self.assertEqual(list(created), [1])
+        self.assertEqual(len(created[1]), 1)
+
+        stored, reopened = self._user_alerts(1)
+        self.assertEqual(stored.status, "read")
+        self.assertEqual(stored.related_data["coalesced"]["count"], 1)
+        self.assertEqual(reopened.status, "new")
+        self.assertEqual(reopened.related_data["coalesced"]["count"], 5)
+        self.assertEqual([s["tx_hash"] for s in reopened.related_data["coalesced"]["samples"]],
+                         ["h1", "h2", "h3", "h4", "h5"])
+
+        # 用户2的警报仍为 new，继续合并
+        user2_alerts = self._user_alerts(2)
+        self.assertEqual(len(user2_alerts), 1)
+        self.assertEqual(user2_alerts[0].related_data["coalesced"]["count"], 6)
+        metrics = self.coalescer.metrics
+        self.assertEqual(metrics["reopened"], 5)
+        self.assertEqual(metrics["events"], 12)
+        self.assertEqual(metrics["alerts"], 3)
+        self.assertEqual(metrics["merged"], 5 + 4)
+
+        # 新警报打开的组继续合并后续事件
+        self.assertEqual(self.alert_system.process_transactions(self._transfers(1, start=6)), {})
+        self.assertEqual(self.coalescer.metrics["reopened"], 5)
+        self.assertEqual(self._user_alerts(1)[1].related_data["coalesced"]["count"], 6)
+
+    def test_zero_window_does_not_merge(self):
+        """测试窗口为0时每个事件都产生警报"""
+        self.alert_system.coalescer = AlertCoalescer(window_seconds=0)
+        created = self.alert_system.process_transactions(self._transfers(3))
+        self.assertEqual(len(created[1]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
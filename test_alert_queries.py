@@ -0,0 +1,150 @@
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, Alert, Transaction
+from app.schemas import AlertCreate
+from app.alerts.alert_system import AlertSystem
+from app.alerts.alert_writer import BulkAlertWriter
+from app.alerts.alert_coalescer import AlertCoalescer
+from app.alerts.alert_counter import get_counts, rebuild_counts
+from app.alerts.monitor_index import WatchedAddressIndex
+from app.alerts.alert_payload import compact_related_data
+from app.migrate_alert_payloads import migrate
+
+
+class TestAlertQueries(unittest.TestCase):
+    """测试警报游标分页、状态计数与紧凑负载"""
+
+    def setUp(self):
+        """测试前准备"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        for i in range(2):
+            self.db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+        self.db.commit()
+        self.alert_system = AlertSystem(
+            self.db,
+            index=WatchedAddressIndex(),
+            coalescer=AlertCoalescer(window_seconds=0)
+        )
+
+    def _alert_data(self, user_id: int, n: int) -> AlertCreate:
+        return AlertCreate(
+            user_id=user_id,
+            alert_type="large_transaction",
+            severity="high",
+            title=f"alert {n}",
+            related_data={"wallet_address": f"0x{n}"}
+        )
+
+    def test_keyset_pagination(self):
+        """测试游标分页按 (created_at, id) 倒序遍历全部警报且不重复"""
+        self.alert_system.writer.write_many([self._alert_data(1, n) for n in range(25)])
+        self.alert_system.writer.write_many([self._alert_data(2, n) for n in range(3)])
+        # 部分警报时间戳相同，验证 id 作为次序键
+        base = datetime(2024, 1, 1)
+        for alert in self.db.query(Alert).filter(Alert.user_id == 1):
+            alert.created_at = base + timedelta(minutes=alert.id // 3)
+        self.db.commit()
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = self.alert_system.get_user_alerts_page(1, limit=10, cursor=cursor)
+            seen.extend(alert.id for alert in page)
+            if cursor is None:
+                break
+
+        expected = [alert.id for alert in self.db.query(Alert).filter(Alert.user_id == 1)
+                    .order_by(Alert.created_at.desc(), Alert.id.desc())]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 25)
+
+    def test_invalid_cursor(self):
+        """测试无效游标"""
+        with self.assertRaises(ValueError):
+            self.alert_system.get_user_alerts(1, cursor="not-a-cursor")
+
+    def test_counters_follow_inserts_and_status_updates(self):
+        """测试计数随写入和状态更新维护"""
+        alerts = self.alert_system.writer.write_many([self._alert_data(1, n) for n in range(5)])
+        self.alert_system.create_alert(self._alert_data(1, 5))
+        BulkAlertWriter(self.db, max_batch_size=2).write_many([self._alert_data(2, n) for n in range(3)])
+        self.assertEqual(self.alert_system.get_alert_counts(1), {"new": 6})
+        self.assertEqual(self.alert_system.get_alert_counts(2), {"new": 3})
+
+        self.alert_system.update_alert_status(alerts[0].id, "resolved")
+        self.alert_system.update_alert_status(alerts[1].id, "resolved")
+        self.alert_system.update_alert_status(alerts[1].id, "resolved")
+        self.assertEqual(self.alert_system.get_alert_counts(1), {"new": 4, "resolved": 2})
+
+    def test_rebuild_counts(self):
+        """测试按警报表重建计数"""
+        self.alert_system.writer.write_many([self._alert_data(1, n) for n in range(4)])
+        self.db.query(Alert).filter(Alert.id <= 2).update({"status": "read"})
+        self.db.commit()
+
+        rebuild_counts(self.db)
+        self.assertEqual(get_counts(self.db, 1), {"new": 2, "read": 2})
+
+    def _anomaly(self) -> dict:
+        return {
+            "blockchain": "ethereum",
+            "tx_hash": "0xabc",
+            "block_timestamp": datetime(2024, 1, 1),
+            "from_address": "0xfrom",
+            "to_address": "0xto",
+            "value": 12.5,
+            "ai_anomaly": True,
+            "deviation": 3.2,
+            "data": {"input": "0x" + "00" * 4096, "logs": [{"topics": ["0x1"] * 50}] * 20}
+        }
+
+    def test_anomaly_alert_stores_reference(self):
+        """测试异常警报只保存交易引用和摘要，完整交易按需查询"""
+        self.db.add(Transaction(
+            blockchain="ethereum", tx_hash="0xabc", block_number=1,
+            block_timestamp=datetime(2024, 1, 1), from_address="0xfrom", to_address="0xto",
+            value=12.5, fee=0.1, status="success", data={"input": "0x"}
+        ))
+        self.db.commit()
+        alert = self.alert_system.create_alert(
+            self.alert_system._anomaly_alert_data(self._anomaly(), 1, "ai_anomaly", "0xfrom")
+        )
+
+        related = self.db.query(Alert).get(alert.id).related_data
+        self.assertEqual(related["ref"], {"blockchain": "ethereum", "tx_hash": "0xabc"})
+        self.assertNotIn("data", related["anomaly"])
+        self.assertEqual(related["anomaly"]["deviation"], 3.2)
+        self.assertEqual(related["anomaly"]["block_timestamp"], "2024-01-01T00:00:00")
+
+        transaction = self.alert_system.get_alert_transaction(alert.id, 1)
+        self.assertEqual(transaction.tx_hash, "0xabc")
+        self.assertIsNone(self.alert_system.get_alert_transaction(alert.id, 2))
+
+    def test_migrate_compacts_existing_alerts(self):
+        """测试迁移压缩旧格式警报且可重复执行"""
+        anomaly = self._anomaly()
+        anomaly["block_timestamp"] = anomaly["block_timestamp"].isoformat()
+        self.alert_system.writer.write_many([
+            AlertCreate(user_id=1, alert_type="ai_anomaly", severity="medium", title="old",
+                        related_data={"anomaly": anomaly, "wallet_address": None}),
+            self._alert_data(1, 0)
+        ])
+
+        stats = migrate(self.db, batch_size=1)
+        self.assertEqual(stats["scanned"], 2)
+        self.assertEqual(stats["rewritten"], 1)
+        self.assertLess(stats["bytes_after"] * 10, stats["bytes_before"])
+
+        related = self.db.query(Alert).filter(Alert.alert_type == "ai_anomaly").one().related_data
+        self.assertEqual(related["ref"]["tx_hash"], "0xabc")
+        self.assertIsNone(compact_related_data(related))
+        self.assertEqual(migrate(self.db)["rewritten"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
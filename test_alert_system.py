@@ -0,0 +1,89 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, WalletMonitor, AlertConfig
+from app.alerts.alert_system import AlertSystem
+from app.alerts.alert_coalescer import AlertCoalescer
+from app.alerts.monitor_index import WatchedAddressIndex
+from app.alerts.rule_engine import AlertRuleEngine
+
+
+def make_alert_system() -> AlertSystem:
+    """在独立的 SQLite 数据库上构建警报系统"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    for i in range(3):
+        db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+    db.commit()
+    db.add_all([
+        WalletMonitor(user_id=1, wallet_address="0xA", blockchain="ethereum", threshold=100),
+        WalletMonitor(user_id=2, wallet_address="0xB", blockchain="ethereum", threshold=500),
+        AlertConfig(user_id=3, alert_type="large_transaction", threshold=1000)
+    ])
+    db.commit()
+    index = WatchedAddressIndex(refresh_seconds=0)
+    return AlertSystem(
+        db,
+        index=index,
+        coalescer=AlertCoalescer(window_seconds=0),
+        rules=AlertRuleEngine(index, default_threshold=10000)
+    )
+
+
+class TestProcessTransactions(unittest.TestCase):
+    """测试批量交易处理"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.batch = [
+            {"blockchain": "ethereum", "from_address": "0xa", "to_address": "0xc", "value": 50, "tx_hash": "t0"},
+            {"blockchain": "ethereum", "from_address": "0xa", "to_address": "0xb", "value": 200, "tx_hash": "t1"},
+            {"blockchain": "ethereum", "from_address": "0xc", "to_address": "0xb", "value": 600, "tx_hash": "t2"},
+            {"blockchain": "ethereum", "from_address": "0xd", "to_address": "0xe", "value": 99, "tx_hash": "t3"},
+            {"blockchain": "ethereum", "from_address": "0xb", "to_address": "0xa", "value": 1500, "tx_hash": "t4"}
+        ]
+
+    @staticmethod
+    def _summary(alerts) -> list:
+        return [
+            (alert.user_id, alert.related_data["transaction"]["tx_hash"], alert.related_data["direction"])
+            for alert in alerts
+        ]
+
+    def test_groups_alerts_by_user(self):
+        """测试按用户分组，低于所有阈值的交易不产生警报"""
+        alerts = make_alert_system().process_transactions(self.batch)
+
+        self.assertEqual(self._summary(alerts[1]), [(1, "t1", "outgoing"), (1, "t4", "incoming")])
+        self.assertEqual(self._summary(alerts[2]), [(2, "t2", "incoming"), (2, "t4", "outgoing")])
+        self.assertEqual(self._summary(alerts[3]), [(3, "t4", "global")])
+        hashes = {tx_hash for user_alerts in alerts.values() for _, tx_hash, _ in self._summary(user_alerts)}
+        self.assertNotIn("t0", hashes)
+        self.assertNotIn("t3", hashes)
+
+    def test_matches_per_transaction_processing(self):
+        """测试批量结果与逐笔调用 process_transaction 一致"""
+        batched = make_alert_system().process_transactions(self.batch)
+
+        single = make_alert_system()
+        expected = {}
+        for transaction in self.batch:
+            for alert in single.process_transaction(transaction):
+                expected.setdefault(alert.user_id, []).append(alert)
+
+        self.assertEqual(sorted(batched), sorted(expected))
+        for user_id in expected:
+            self.assertEqual(self._summary(batched[user_id]), self._summary(expected[user_id]))
+
+    def test_empty_and_small_batches(self):
+        """测试空批次和全部低于阈值的批次"""
+        alert_system = make_alert_system()
+        self.assertEqual(alert_system.process_transactions([]), {})
+        self.assertEqual(alert_system.process_transactions([self.batch[0], self.batch[3]]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, Alert
+from app.schemas import AlertCreate
+from app.alerts.alert_writer import BulkAlertWriter
+from app.alerts.alert_counter import get_counts
+
+
+class TestBulkAlertWriter(unittest.TestCase):
+    """测试批量警报写入器"""
+
+    def setUp(self):
+        """测试前准备"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        for i in range(2):
+            self.db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+        self.db.commit()
+
+    def _alert_data(self, n: int, user_id: int = 1) -> AlertCreate:
+        return AlertCreate(
+            user_id=user_id,
+            alert_type="large_transaction",
+            severity="high",
+            title=f"alert {n}"
+        )
+
+    def test_write_many_chunks_and_commits(self):
+        """测试超过批量上限时分块插入，只提交一次"""
+        writer = BulkAlertWriter(self.db, max_batch_size=3)
+        with patch.object(self.db, "commit", wraps=self.db.commit) as commit:
+            alerts = writer.write_many([self._alert_data(n) for n in range(7)])
+        self.assertEqual(commit.call_count, 1)
+        self.assertEqual(len(alerts), 7)
+        self.assertEqual(self.db.query(Alert).count(), 7)
+        self.assertEqual(writer.metrics, {"flushes": 1, "alerts_written": 7, "errors": 0})
+        self.assertEqual(writer.write_many([]), [])
+
+    def test_failed_write_rolls_back(self):
+        """测试写入失败时回滚，警报和计数都不写入，重试成功"""
+        writer = BulkAlertWriter(self.db, max_batch_size=2)
+        data = [self._alert_data(n) for n in range(3)]
+
+        with patch.object(self.db, "scalars", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                writer.write_many(data)
+        self.assertEqual(writer.metrics["errors"], 1)
+        self.assertEqual(self.db.query(Alert).count(), 0)
+        self.assertEqual(get_counts(self.db, 1), {})
+
+        self.assertEqual(len(writer.write_many(data)), 3)
+        self.assertEqual(self.db.query(Alert).count(), 3)
+        self.assertEqual(get_counts(self.db, 1), {"new": 3})
+
+    def test_write_many_pairs_ids_with_rows(self):
+        """测试 write_many 返回的警报ID与输入一一对应，跨多个分块也成立"""
+        writer = BulkAlertWriter(self.db, max_batch_size=4)
+        writer.write_many([self._alert_data(-1, user_id=2)])
+        data = [self._alert_data(n, user_id=1 + n % 2) for n in range(10)]
+        alerts = writer.write_many(data)
+
+        self.assertEqual(len(alerts), 10)
+        for alert, alert_data in zip(alerts, data):
+            stored = self.db.get(Alert, alert.id)
+            self.assertEqual(stored.title, alert_data.title)
+            self.assertEqual(stored.user_id, alert_data.user_id)
+        self.assertEqual(self.db.query(Alert).count(), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
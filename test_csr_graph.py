@@ -0,0 +1,193 @@
+import unittest
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.analytics.csr_graph import CSRGraph
+from app.analytics.fund_tracer import FundTracer
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+
+class TestCSRGraph(unittest.TestCase):
+    """测试CSR数组资金流向图"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.start = datetime(2025, 3, 25, 10, 0, 0)
+        self.graph = CSRGraph(merge_threshold=4)
+        edges = [
+            ("mixer", "a"), ("mixer", "b"), ("mixer", "c"),
+            ("x", "mixer"), ("y", "mixer"), ("z", "mixer"),
+            ("source", "d1"), ("source", "d2"), ("source", "d3"), ("source", "d4"),
+            ("source", "d1")
+        ]
+        for i, (src, dst) in enumerate(edges):
+            self.graph.add_transaction({
+                "tx_hash": f"0x{i}",
+                "from_address": src,
+                "to_address": dst,
+                "value": float(i),
+                "block_timestamp": self.start + timedelta(minutes=len(edges) - i)
+            })
+        self.graph.merge()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_periodic_merge(self):
+        """测试追加缓冲区达到阈值后自动合并"""
+        graph = CSRGraph(merge_threshold=2)
+        graph.add_transaction({"from_address": "a", "to_address": "b", "value": 1})
+        self.assertEqual(graph.pending_count, 1)
+        graph.add_transaction({"from_address": "b", "to_address": "c", "value": 1})
+        self.assertEqual(graph.pending_count, 0)
+        self.assertEqual(graph.edge_count, 2)
+
+        # 按时间间隔合并
+        graph = CSRGraph(merge_interval_seconds=3600)
+        graph.add_transaction({"from_address": "a", "to_address": "b", "value": 1})
+        self.assertEqual(graph.pending_count, 1)
+        graph.merge_interval_seconds = 0
+        graph.add_transaction({"from_address": "b", "to_address": "c", "value": 1})
+        self.assertEqual(graph.edge_count, 2)
+
+    def test_degree_queries(self):
+        """测试去重和不去重的度数查询"""
+        self.assertEqual(self.graph.out_degree("source"), 4)
+        self.assertEqual(self.graph.out_degree("source", unique=False), 5)
+        self.assertEqual(self.graph.in_degree("mixer"), 3)
+        self.assertEqual(self.graph.out_degree("unknown"), 0)
+
+    def test_edges_sorted_by_time(self):
+        """测试每个地址的流出边按时间排序"""
+        timestamps = self.graph.out_edges("source")["timestamp"]
+        self.assertTrue(np.all(np.diff(timestamps) >= 0))
+
+    def test_k_hop_and_mixing(self):
+        """测试k跳扩展与混币、分散检查"""
+        node = self.graph.interner.lookup("x")
+        one_hop = set(self.graph.interner.addresses(self.graph.k_hop([node], 1)))
+        two_hop = set(self.graph.interner.addresses(self.graph.k_hop([node], 2, direction="out")))
+
+        self.assertEqual(one_hop, {"x", "mixer"})
+        self.assertEqual(two_hop, {"x", "mixer", "a", "b", "c"})
+        self.assertEqual(self.graph.interner.addresses(self.graph.mixing_nodes()), ["mixer"])
+
+        flow = self.graph.analyze_fund_flow("source")
+        self.assertTrue(flow["fund_dispersion"])
+        self.assertEqual(flow["dispersion_count"], 4)
+        self.assertFalse(flow["mixing_pattern"])
+        self.assertTrue(self.graph.analyze_fund_flow("x")["mixing_pattern"])
+
+    def test_edges_for_tx(self):
+        """测试按交易哈希查找边，与逐边比较的结果一致"""
+        self.graph.add_transaction({"tx_hash": "0x3", "from_address": "q", "to_address": "r", "value": 1})
+        self.graph.merge()
+        for tx_hash in ("0x0", "0x3", "0x10", "missing"):
+            expected = np.flatnonzero(self.graph.tx_hash == tx_hash.encode())
+            np.testing.assert_array_equal(self.graph.edges_for_tx(tx_hash), expected)
+        self.assertEqual(len(self.graph.edges_for_tx("0x3")), 2)
+
+        self.graph.save(self.temp_dir)
+        loaded = CSRGraph.load(self.temp_dir)
+        np.testing.assert_array_equal(loaded.edges_for_tx("0x5"), self.graph.edges_for_tx("0x5"))
+
+    def test_memory_mapped_load(self):
+        """测试保存后以只读内存映射加载"""
+        self.graph.save(self.temp_dir)
+        loaded = CSRGraph.load(self.temp_dir)
+
+        self.assertTrue(loaded.read_only)
+        self.assertIsInstance(loaded.out_dst, np.memmap)
+        self.assertEqual(loaded.out_degree("source"), 4)
+        self.assertEqual(loaded.analyze_fund_flow("x"), self.graph.analyze_fund_flow("x"))
+        with self.assertRaises(RuntimeError):
+            loaded.add_transaction({"from_address": "a", "to_address": "b"})
+
+
+class TestFundTracer(unittest.TestCase):
+    """测试多跳资金追踪与污点策略"""
+
+    def setUp(self):
+        """测试前准备"""
+        # C 先向 A 转入 10，随后 S 向 A 转入污点资金 10，A 再分两笔转出
+        self.graph = CSRGraph()
+        for tx_hash, src, dst, value, ts in [
+            ("0xc", "C", "A", 10.0, 0),
+            ("0xs", "S", "A", 10.0, 1),
+            ("0xb", "A", "B", 5.0, 2),
+            ("0xd", "A", "D", 15.0, 3),
+            ("0xe", "D", "E", 15.0, 4)
+        ]:
+            self.graph.add_transaction({
+                "tx_hash": tx_hash, "from_address": src, "to_address": dst,
+                "value": value, "block_timestamp": ts
+            })
+        self.graph.merge()
+
+    def _taint(self, policy, tx_hash, direction="forward"):
+        tracer = FundTracer(self.graph, policy=policy, max_hops=3, min_value=0.01)
+        hits = tracer.trace_transaction(tx_hash, direction)
+        return {hit["tx_hash"]: hit["tainted_value"] for hit in hits if hit["hop"] > 0}
+
+    def test_forward_policies(self):
+        """测试三种策略下的资金去向"""
+        self.assertEqual(self._taint("poison", "0xs"), {"0xb": 5.0, "0xd": 15.0, "0xe": 15.0})
+        self.assertEqual(self._taint("haircut", "0xs"), {"0xb": 2.5, "0xd": 7.5, "0xe": 7.5})
+        # 先进先出: A->B 消耗原有余额，A->D 中有 10 来自污点资金
+        self.assertEqual(self._taint("fifo", "0xs"), {"0xd": 10.0, "0xe": 10.0})
+
+    def test_backward_policies(self):
+        """测试向后追踪资金来源"""
+        self.assertEqual(self._taint("haircut", "0xd", "backward"), {"0xc": 7.5, "0xs": 7.5})
+        self.assertEqual(self._taint("fifo", "0xd", "backward"), {"0xc": 5.0, "0xs": 10.0})
+
+    def test_streaming_and_pruning(self):
+        """测试结果按搜索进度逐条产出，并按最小金额剪枝"""
+        tracer = FundTracer(self.graph, policy="haircut", max_hops=3, min_value=5.0)
+        hits = tracer.trace_address("S")
+
+        first = next(hits)
+        self.assertEqual(first["tx_hash"], "0xs")
+        self.assertEqual([hit["tx_hash"] for hit in hits], ["0xd", "0xe"])
+
+    def test_summarize_related_entities(self):
+        """测试按地址汇总追踪结果"""
+        tracer = FundTracer(self.graph, policy="poison", max_hops=3, min_value=0.01)
+        entities = tracer.summarize(tracer.trace_transaction("0xs"))
+
+        self.assertEqual([e["address"] for e in entities], ["D", "E", "B"])
+        self.assertEqual(entities[0]["min_hop"], 1)
+
+    def test_analyzer_related_entities(self):
+        """测试分析器摄取的交易进入追踪图，已合并和未合并的交易都能得到相关实体"""
+        tracer = FundTracer(CSRGraph(), policy="poison", max_hops=3, min_value=0.01)
+        analyzer = TransactionAnalyzer(tracer=tracer)
+        self.assertEqual(tracer.graph.merge_interval_seconds, 30)
+        history = [
+            {"tx_hash": "0xc", "from_address": "C", "to_address": "A", "value": 10.0, "block_timestamp": 0},
+            {"tx_hash": "0xs", "from_address": "S", "to_address": "A", "value": 10.0, "block_timestamp": 1},
+            {"tx_hash": "0xd", "from_address": "A", "to_address": "D", "value": 15.0, "block_timestamp": 3}
+        ]
+        analyzer.ingest_transactions(history)
+        tracer.graph.merge()
+        latest = {"tx_hash": "0xe", "from_address": "D", "to_address": "E", "value": 15.0, "block_timestamp": 4}
+        analyzer.ingest_transaction(latest)
+        self.assertEqual(tracer.graph.pending_count, 1)
+
+        with self.assertNoLogs("app.analytics.fund_tracer", level="WARNING"):
+            # 尚未合并的交易从发送方向后追踪资金来源
+            recent = analyzer.analyze_transaction(latest)
+            merged = analyzer.analyze_transaction(history[1])
+        self.assertEqual([e["address"] for e in recent["related_entities"]], ["A", "C", "S"])
+        self.assertEqual([e["address"] for e in merged["related_entities"]], ["D"])
+
+        tracer.graph.merge()
+        merged = analyzer.analyze_transaction(history[1])
+        self.assertEqual([e["address"] for e in merged["related_entities"]], ["D", "E"])
+
+if __name__ == "__main__":
+    unittest.main()
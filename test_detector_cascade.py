@@ -0,0 +1,113 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+
+from app.analytics.detector_cascade import StreamingEWMADetector, DetectorCascade
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+
+
+class FlaggingModel:
+    """只标记指定交易的完整模型替身，记录每次调用收到的交易数"""
+
+    def __init__(self, flagged):
+        self.flagged = set(flagged)
+        self.calls = []
+
+    def detect_anomalies(self, transactions):
+        self.calls.append(len(transactions))
+        return [tx for tx in transactions if tx["tx_hash"] in self.flagged]
+
+
+class TestDetectorCascade(unittest.TestCase):
+    """测试流式第一级检测与级联"""
+
+    def setUp(self):
+        """测试前准备"""
+        rng = random.Random(3)
+        start = datetime(2025, 3, 25)
+        self.transactions = []
+        for address in range(20):
+            for i in range(50):
+                self.transactions.append({
+                    "tx_hash": f"0x{address:02x}{i:04x}",
+                    "from_address": f"addr{address}",
+                    "to_address": f"dest{rng.randint(0, 5)}",
+                    "value": rng.uniform(1.0, 2.0),
+                    "fee": 0.01,
+                    "block_timestamp": start + timedelta(hours=i, minutes=rng.randint(0, 10))
+                })
+        # 注入明显异常的大额交易
+        self.spikes = {tx["tx_hash"] for tx in self.transactions[45::50]}
+        for tx in self.transactions:
+            if tx["tx_hash"] in self.spikes:
+                tx["value"] = 5000.0
+
+    def test_ewma_scores_spikes(self):
+        """测试EWMA评分对金额突增给出高分"""
+        detector = StreamingEWMADetector(alpha=0.1, warmup=5)
+        scores = detector.score_batch(self.transactions)
+
+        spike_scores = [s for tx, s in zip(self.transactions, scores) if tx["tx_hash"] in self.spikes]
+        self.assertEqual(len(detector), 20)
+        self.assertTrue(all(s > 10 for s in spike_scores))
+        self.assertEqual(scores[0], float("inf"))
+
+    def test_cascade_catches_spikes(self):
+        """测试级联只放行少量候选，且完整模型仍能发现注入的突增"""
+        analyzer = TransactionAnalyzer()
+        analyzer.train_model(self.transactions)
+        cascade = DetectorCascade(StreamingEWMADetector(alpha=0.1, warmup=5), analyzer=analyzer, threshold=4.0)
+
+        report = cascade.evaluate(self.transactions)
+        anomalies = cascade.process(self.transactions)
+
+        self.assertLess(report["pass_through_rate"], 0.3)
+        self.assertEqual(report["candidates"], cascade.metrics["passed"])
+        self.assertAlmostEqual(cascade.pass_through_rate, report["pass_through_rate"])
+        self.assertTrue(self.spikes <= {tx["tx_hash"] for tx in anomalies})
+
+    def test_exact_pass_through_and_recall(self):
+        """测试已知候选数与已知完整模型结果下的通过率和召回率"""
+        start = datetime(2025, 3, 25)
+        transactions = []
+        for address in range(20):
+            for i in range(50):
+                transactions.append({
+                    "tx_hash": f"{address}:{i}",
+                    "from_address": f"addr{address}",
+                    "to_address": "dest",
+                    # 金额在1和2之间交替、间隔恒为1小时，只有第45笔突增
+                    "value": 5000.0 if i == 45 else (2.0 if i % 2 else 1.0),
+                    "block_timestamp": start + timedelta(hours=i)
+                })
+        # 第一级放行每个地址预热期内的5笔和突增的1笔
+        expected_candidates = {f"{address}:{i}" for address in range(20) for i in (0, 1, 2, 3, 4, 45)}
+        spikes = {f"{address}:45" for address in range(20)}
+        # 完整模型另外标记5笔第一级不会放行的普通交易
+        missed = {f"{address}:30" for address in range(5)}
+
+        detector = StreamingEWMADetector(alpha=0.1, warmup=5)
+        scores = detector.copy().score_batch(transactions)
+        passed = {tx["tx_hash"] for tx, score in zip(transactions, scores) if score >= 4.0}
+        self.assertEqual(passed, expected_candidates)
+
+        model = FlaggingModel(spikes | missed)
+        cascade = DetectorCascade(detector, analyzer=model, threshold=4.0)
+        report = cascade.evaluate(transactions)
+
+        self.assertEqual(report["candidates"], 120)
+        self.assertEqual(report["pass_through_rate"], 120 / 1000)
+        self.assertEqual(report["baseline_anomalies"], 25)
+        self.assertEqual(report["cascade_anomalies"], 20)
+        self.assertEqual(report["recall"], 20 / 25)
+        # 级联只把候选交易送入完整模型，基线送入全部交易
+        self.assertEqual(model.calls, [120, 1000])
+
+        anomalies = cascade.process(transactions)
+        self.assertEqual({tx["tx_hash"] for tx in anomalies}, spikes)
+        self.assertEqual(cascade.metrics, {"processed": 1000, "passed": 120})
+        self.assertEqual(cascade.pass_through_rate, 0.12)
+
+
+if __name__ == "__main__":
+    unittest.main()
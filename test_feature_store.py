@@ -0,0 +1,134 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from app.analytics.feature_store import FeatureStore
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+from app.analytics.ai_monitor import AIMonitor
+from app.analytics.pattern_detector import FREQUENCY_SPIKE
+from app.config import settings
+
+class TestFeatureStore(unittest.TestCase):
+    """测试按地址滚动聚合的特征存储"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.start = datetime(2025, 3, 25, 0, 0, 0)
+        self.store = FeatureStore(windows=[3600, 86400], buckets_per_window=12)
+        self.temp_path = os.path.join(tempfile.mkdtemp(), "features.npz")
+
+    def tearDown(self):
+        """测试后清理"""
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def _tx(self, minutes, value=1.0, from_address="a", to_address="b"):
+        return {
+            "from_address": from_address,
+            "to_address": to_address,
+            "value": value,
+            "block_timestamp": self.start + timedelta(minutes=minutes)
+        }
+
+    def test_rolling_aggregates(self):
+        """测试窗口内的计数、金额和间隔统计"""
+        for minutes, value in [(0, 1.0), (10, 2.0), (30, 3.0)]:
+            self.store.update(self._tx(minutes, value))
+
+        features = self.store.get_features("a")
+        self.assertEqual(features["1h"]["count"], 3)
+        self.assertEqual(features["1h"]["out_count"], 3)
+        self.assertEqual(features["1h"]["value_sum"], 6.0)
+        self.assertEqual(features["1h"]["value_max"], 3.0)
+        self.assertAlmostEqual(features["1h"]["interval_mean"], 900.0)
+        self.assertEqual(features["1h"]["night_ratio"], 1.0)
+        self.assertEqual(self.store.get_features("b")["1h"]["in_count"], 3)
+
+    def test_window_expiry(self):
+        """测试交易滑出短窗口后仍保留在长窗口"""
+        self.store.update(self._tx(0))
+        self.store.update(self._tx(180))
+
+        features = self.store.get_features("a")
+        self.assertEqual(features["1h"]["count"], 1)
+        self.assertEqual(features["24h"]["count"], 2)
+
+    def test_point_in_time_reads_exclude_future(self):
+        """测试历史时间点读取不包含该时间点之后的数据"""
+        self.store.update(self._tx(0))
+        self.store.update(self._tx(250))
+
+        # 24h 窗口的桶宽为2小时，as_of 取桶边界时恰好包含此前的全部交易
+        as_of = self.start + timedelta(minutes=240)
+        self.assertEqual(self.store.get_features("a", as_of=as_of, windows=["24h"])["24h"]["count"], 1)
+        self.assertEqual(self.store.get_features("a")["24h"]["count"], 2)
+
+        before = self.store.update(self._tx(260), return_features=True)
+        self.assertEqual(before["24h"]["count"], 2)
+
+        with self.assertRaises(ValueError):
+            self.store.get_features("a", as_of=self.start - timedelta(days=3), windows=["24h"])
+
+    def test_snapshot_survives_restart(self):
+        """测试快照保存后恢复"""
+        for i in range(2000):
+            self.store.update(self._tx(i % 50, from_address=f"addr{i % 1500}"))
+        self.store.save(self.temp_path)
+
+        restored = FeatureStore.load(self.temp_path)
+        self.assertEqual(len(restored), len(self.store))
+        self.assertEqual(restored.get_features("addr7"), self.store.get_features("addr7"))
+
+        restored.update(self._tx(55, from_address="addr7"))
+        self.assertEqual(restored.get_features("addr7")["1h"]["count"], self.store.get_features("addr7")["1h"]["count"] + 1)
+
+    def test_restore_in_place(self):
+        """测试就地恢复后已持有的引用读到快照内容"""
+        for i in range(30):
+            self.store.update(self._tx(i, from_address=f"addr{i % 7}"))
+        self.store.save(self.temp_path)
+
+        shared = FeatureStore(windows=[600], buckets_per_window=4)
+        shared.restore(self.temp_path)
+        self.assertEqual(shared.windows, self.store.windows)
+        self.assertEqual(len(shared), len(self.store))
+        self.assertEqual(shared.get_features("addr3"), self.store.get_features("addr3"))
+
+    def test_out_count(self):
+        """测试按窗口长度读取转出次数"""
+        for minutes in (0, 120, 150, 170):
+            self.store.update(self._tx(minutes))
+
+        self.assertEqual(self.store.out_count("a", 3600), 3)
+        self.assertEqual(self.store.out_count("a", 86400), 4)
+        self.assertEqual(self.store.out_count("b", 3600), 0)
+        # 未配置的窗口或未收录的地址由调用方回退到原始查询
+        self.assertIsNone(self.store.out_count("a", 600))
+        self.assertIsNone(self.store.out_count("unknown", 3600))
+
+    def test_monitor_patterns_from_store(self):
+        """测试AI监控的异常模式读取特征存储的窗口聚合"""
+        monitor = AIMonitor()
+        offsets = [i * 30 for i in range(20)] + [570 + i / 6 for i in range(1, 11)]
+        for minutes in offsets:
+            self.store.update(self._tx(minutes))
+
+        self.assertEqual(monitor._detect_unusual_patterns([], "a"), [])
+        monitor.feature_store = self.store
+        self.assertEqual(monitor._detect_unusual_patterns([], "a"), [FREQUENCY_SPIKE])
+        self.assertEqual(monitor._detect_unusual_patterns([], "unknown"), [])
+
+    def test_windowed_address_risk(self):
+        """测试检测器从特征存储读取聚合"""
+        analyzer = TransactionAnalyzer(feature_store=self.store)
+        for i in range(20):
+            analyzer.ingest_transaction(self._tx(i, value=settings.LARGE_TRANSACTION_THRESHOLD))
+
+        risk = analyzer.calculate_windowed_address_risk("a", window="24h")
+        self.assertEqual(risk["transaction_count"], 20)
+        self.assertEqual(risk["risk_factors"], ["有20笔大额交易", "交易频率高 (20.0笔/天)", "大量深夜交易"])
+        self.assertAlmostEqual(risk["risk_score"], 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+from datetime import datetime, timedelta
+
+from app.analytics.flow_graph import FlowGraph
+from app.analytics.cycle_detection import TemporalCycleDetector
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+
+class TestFlowGraph(unittest.TestCase):
+    """测试持久化资金流向图"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.start = datetime(2025, 3, 25, 10, 0, 0)
+        self.graph = FlowGraph(window=timedelta(hours=1))
+
+    def _tx(self, tx_hash, from_address, to_address, minutes, value=1.0):
+        return {
+            "tx_hash": tx_hash,
+            "from_address": from_address,
+            "to_address": to_address,
+            "value": value,
+            "block_timestamp": self.start + timedelta(minutes=minutes)
+        }
+
+    def test_incremental_append_is_idempotent(self):
+        """测试重复摄取同一交易不会重复计数"""
+        self.assertTrue(self.graph.add_transaction(self._tx("0x1", "a", "b", 0)))
+        self.assertFalse(self.graph.add_transaction(self._tx("0x1", "a", "b", 0)))
+        self.assertEqual(len(self.graph), 1)
+        self.assertEqual(self.graph.out_degree("a"), 1)
+        self.assertEqual(self.graph.in_degree("b"), 1)
+
+    def test_time_window_eviction(self):
+        """测试超出时间窗口的边被淘汰"""
+        self.graph.add_transaction(self._tx("0x1", "a", "b", 0))
+        self.graph.add_transaction(self._tx("0x2", "b", "c", 30))
+        self.graph.add_transaction(self._tx("0x3", "c", "d", 90))
+
+        self.assertEqual(len(self.graph), 2)
+        self.assertNotIn("a", self.graph)
+        self.assertEqual(self.graph.in_degree("b"), 0)
+
+        # 早于窗口下界的交易直接丢弃
+        self.assertFalse(self.graph.add_transaction(self._tx("0x4", "x", "y", 0)))
+
+    def test_neighbourhood_is_local(self):
+        """测试邻域查询只返回k跳内的地址"""
+        for i, (src, dst) in enumerate([("a", "b"), ("b", "c"), ("c", "d"), ("x", "y")]):
+            self.graph.add_transaction(self._tx(f"0x{i}", src, dst, i))
+
+        self.assertEqual(self.graph.neighbourhood("a", hops=2), {"a", "b", "c"})
+        self.assertEqual(self.graph.neighbourhood("unknown"), set())
+
+
+class TestTemporalCycleDetector(unittest.TestCase):
+    """测试有界时间递增环形转账检测"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.start = datetime(2025, 3, 25, 10, 0, 0)
+        self.graph = FlowGraph(window=timedelta(days=1))
+
+    def _add(self, tx_hash, from_address, to_address, minutes):
+        self.graph.add_transaction({
+            "tx_hash": tx_hash,
+            "from_address": from_address,
+            "to_address": to_address,
+            "value": 1.0,
+            "block_timestamp": self.start + timedelta(minutes=minutes)
+        })
+
+    def test_cycle_evidence(self):
+        """测试时间递增的环被找到并返回证据"""
+        self._add("0x1", "a", "b", 0)
+        self._add("0x2", "b", "c", 1)
+        self._add("0x3", "c", "a", 2)
+
+        result = TemporalCycleDetector(self.graph, max_hops=3).find_cycles("a")
+
+        self.assertEqual(len(result["cycles"]), 1)
+        self.assertEqual(result["cycles"][0]["addresses"], ["a", "b", "c", "a"])
+        self.assertEqual(result["cycles"][0]["tx_hashes"], ["0x1", "0x2", "0x3"])
+        self.assertFalse(result["truncated"])
+
+    def test_ignores_time_reversed_cycle(self):
+        """测试时间倒序的环不被视为环形转账"""
+        self._add("0x1", "a", "b", 2)
+        self._add("0x2", "b", "c", 1)
+        self._add("0x3", "c", "a", 0)
+
+        result = TemporalCycleDetector(self.graph).find_cycles("a")
+
+        self.assertEqual(result["cycles"], [])
+
+    def test_respects_max_hops(self):
+        """测试超过最大跳数的环不被返回"""
+        for i, (src, dst) in enumerate([("a", "b"), ("b", "c"), ("c", "d"), ("d", "a")]):
+            self._add(f"0x{i}", src, dst, i)
+
+        self.assertEqual(TemporalCycleDetector(self.graph, max_hops=3).find_cycles("a")["cycles"], [])
+        self.assertEqual(len(TemporalCycleDetector(self.graph, max_hops=4).find_cycles("a")["cycles"]), 1)
+
+    def test_stops_after_max_cycles_on_dense_graph(self):
+        """测试稠密图上找到K个环后停止"""
+        nodes = [f"n{i}" for i in range(12)]
+        minute = 0
+        for src in nodes:
+            for dst in nodes:
+                if src != dst:
+                    self._add(f"{src}-{dst}", src, dst, minute)
+                    minute += 1
+
+        result = TemporalCycleDetector(self.graph, max_hops=6, max_cycles=3).find_cycles("n0")
+
+        self.assertEqual(len(result["cycles"]), 3)
+        self.assertTrue(result["truncated"])
+
+
+class TestFundFlowAnalysis(unittest.TestCase):
+    """测试基于流向图的资金流向分析"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.analyzer = TransactionAnalyzer()
+        self.start = datetime(2025, 3, 25, 10, 0, 0)
+
+    def test_dispersion_from_ingested_stream(self):
+        """测试由摄取流累积的边检测资金分散"""
+        for i in range(5):
+            self.analyzer.ingest_transaction({
+                "tx_hash": f"0x{i}",
+                "from_address": "source",
+                "to_address": f"dest{i}",
+                "value": 0.2,
+                "block_timestamp": self.start + timedelta(minutes=i)
+            })
+
+        tx = {
+            "tx_hash": "0x5",
+            "from_address": "source",
+            "to_address": "dest5",
+            "value": 0.2,
+            "block_timestamp": self.start + timedelta(minutes=5)
+        }
+        flow = self.analyzer.analyze_fund_flow(tx)
+
+        self.assertTrue(flow["fund_dispersion"])
+        self.assertEqual(flow["dispersion_count"], 6)
+        self.assertFalse(flow["circular_transfer"])
+
+    def test_circular_transfer_with_related_transactions(self):
+        """测试相关交易追加后检测环形转账"""
+        tx = {"tx_hash": "0x1", "from_address": "a", "to_address": "b", "value": 1.0, "block_timestamp": self.start}
+        related = [
+            {"tx_hash": "0x2", "from_address": "b", "to_address": "c", "value": 1.0, "block_timestamp": self.start + timedelta(minutes=1)},
+            {"tx_hash": "0x3", "from_address": "c", "to_address": "a", "value": 1.0, "block_timestamp": self.start + timedelta(minutes=2)}
+        ]
+
+        flow = self.analyzer.analyze_fund_flow(tx, related)
+
+        self.assertTrue(flow["circular_transfer"])
+
+if __name__ == "__main__":
+    unittest.main()
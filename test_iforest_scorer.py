@@ -0,0 +1,67 @@
+import unittest
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+from app.analytics.iforest_scorer import PackedIsolationForest
+
+class TestPackedIsolationForest(unittest.TestCase):
+    """测试打包的IsolationForest评分器"""
+
+    def setUp(self):
+        """测试前准备"""
+        rng = np.random.default_rng(7)
+        start = datetime(2025, 3, 25, 0, 0, 0)
+        self.transactions = [
+            {
+                "tx_hash": f"0x{i}",
+                "from_address": f"addr{i % 20}",
+                "to_address": f"addr{(i + 1) % 20}",
+                "value": float(rng.lognormal(0, 1) * (100 if i % 50 == 0 else 1)),
+                "fee": float(rng.uniform(0.0001, 0.01)),
+                "block_timestamp": start + timedelta(minutes=int(rng.integers(0, 10000)))
+            }
+            for i in range(500)
+        ]
+        self.analyzer = TransactionAnalyzer()
+        self.analyzer.train_model(self.transactions)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_scores_match_sklearn(self):
+        """测试打包评分与sklearn一致"""
+        features = self.analyzer._extract_features(self.transactions)
+        expected = self.analyzer.model.decision_function(self.analyzer.scaler.transform(features))
+        packed = PackedIsolationForest.from_sklearn(self.analyzer.model, self.analyzer.scaler)
+
+        np.testing.assert_allclose(packed.decision_function(features), expected, atol=1e-9)
+        np.testing.assert_array_equal(
+            packed.predict(features),
+            self.analyzer.model.predict(self.analyzer.scaler.transform(features))
+        )
+
+    def test_export_and_mmap_load(self):
+        """测试导出到磁盘后内存映射加载，检测结果不变"""
+        expected = self.analyzer.detect_anomalies(self.transactions)
+        self.analyzer.export_packed_model(self.temp_dir)
+
+        analyzer = TransactionAnalyzer()
+        packed = analyzer.load_packed_model(self.temp_dir)
+        self.assertIsInstance(packed.left, np.memmap)
+
+        anomalies = analyzer.detect_anomalies(self.transactions)
+        self.assertEqual([tx["tx_hash"] for tx in anomalies], [tx["tx_hash"] for tx in expected])
+        np.testing.assert_allclose(
+            [tx["anomaly_score"] for tx in anomalies],
+            [tx["anomaly_score"] for tx in expected],
+            atol=1e-9
+        )
+
+if __name__ == "__main__":
+    unittest.main()
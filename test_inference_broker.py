@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+
+import numpy as np
+
+from app.analytics.inference_broker import InferenceBroker
+
+class SumModel:
+    """按窗口求和的假模型，记录每次调用的批量大小"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X, batch_size=None, verbose=0):
+        self.calls.append(len(X))
+        return X.sum(axis=(1, 2))[:, np.newaxis]
+
+class TestInferenceBroker(unittest.TestCase):
+    """测试跨钱包微批推理代理"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.model = SumModel()
+
+    def test_concurrent_requests_share_batches(self):
+        """测试并发请求合并为少量批次，结果回到各自调用方"""
+        broker = InferenceBroker(self.model, max_batch_size=64, max_delay_ms=20, max_queue_depth=1000)
+
+        async def run():
+            windows = [np.full((10, 1), i, dtype=np.float32) for i in range(100)]
+            results = await asyncio.gather(*(broker.predict(w) for w in windows))
+            await broker.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual([float(r[0]) for r in results], [i * 10.0 for i in range(100)])
+        self.assertEqual(sum(self.model.calls), 100)
+        self.assertLessEqual(max(self.model.calls), 64)
+        self.assertLessEqual(len(self.model.calls), 3)
+
+        metrics = broker.metrics
+        self.assertEqual(metrics["requests"], 100)
+        self.assertEqual(metrics["windows"], 100)
+        self.assertGreaterEqual(metrics["flush_by_size"], 1)
+        self.assertEqual(metrics["max_batch_size"], 64)
+        self.assertEqual(metrics["queue_depth"], 0)
+
+    def test_deadline_flush_and_multi_window_requests(self):
+        """测试截止时间触发的批次，以及一次提交多个窗口"""
+        broker = InferenceBroker(self.model, max_batch_size=1000, max_delay_ms=5)
+
+        async def run():
+            result = await broker.predict(np.ones((3, 10, 1), dtype=np.float32))
+            await broker.stop()
+            return result
+
+        result = asyncio.run(run())
+        self.assertEqual(result.shape, (3, 1))
+        self.assertEqual(broker.metrics["flush_by_deadline"], 1)
+
+    def test_requests_routed_to_their_model(self):
+        """测试请求由提交时指定的模型计算，不同模型的请求不拼入同一批次"""
+        class ScaledModel(SumModel):
+            def predict(self, X, batch_size=None, verbose=0):
+                return super().predict(X) * 100
+
+        other = ScaledModel()
+        broker = InferenceBroker(self.model, max_batch_size=64, max_delay_ms=20)
+
+        async def run():
+            window = np.ones((10, 1), dtype=np.float32)
+            results = await asyncio.gather(
+                broker.predict(window), broker.predict(window, model=other), broker.predict(window)
+            )
+            await broker.stop()
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual([float(r[0]) for r in results], [10.0, 1000.0, 10.0])
+        self.assertEqual(other.calls, [1])
+        self.assertEqual(sum(self.model.calls), 2)
+        self.assertGreaterEqual(broker.metrics["flush_by_model"], 1)
+
+    def test_errors_propagate_to_callers(self):
+        """测试模型出错时异常传递给每个调用方"""
+        class BrokenModel:
+            def predict(self, X, batch_size=None, verbose=0):
+                raise RuntimeError("boom")
+
+        broker = InferenceBroker(BrokenModel(), max_delay_ms=1)
+
+        async def run():
+            try:
+                with self.assertRaises(RuntimeError):
+                    await broker.predict(np.ones((10, 1)))
+            finally:
+                await broker.stop()
+
+        asyncio.run(run())
+        self.assertEqual(broker.metrics["errors"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
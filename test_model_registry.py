@@ -0,0 +1,271 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.analytics.ai_monitor import AIMonitor
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+from app.analytics.lstm_numpy import NumpyLSTMModel, ArrayMinMaxScaler
+from app.analytics.model_registry import ModelRegistry
+from app.analytics.inference_broker import InferenceBroker
+from app.analytics.wallet_stream import WalletStreamPredictor
+
+def make_numpy_monitor(seed, sequence_length=5):
+    """构造使用随机权重的NumPy推理监控器"""
+    rng = np.random.default_rng(seed)
+    units = 4
+    layers = [
+        {
+            'type': 'lstm', 'activation': 'tanh', 'recurrent_activation': 'sigmoid', 'return_sequences': False,
+            'kernel': rng.normal(size=(1, 4 * units)).astype(np.float32),
+            'recurrent_kernel': rng.normal(size=(units, 4 * units)).astype(np.float32),
+            'bias': np.zeros(4 * units, dtype=np.float32)
+        },
+        {
+            'type': 'dense', 'activation': 'linear',
+            'kernel': rng.normal(size=(units, 1)).astype(np.float32),
+            'bias': np.zeros(1, dtype=np.float32)
+        }
+    ]
+    monitor = AIMonitor()
+    monitor.model = NumpyLSTMModel(layers)
+    monitor.scaler = ArrayMinMaxScaler(np.array([0.0]), np.array([0.01]))
+    monitor.sequence_length = sequence_length
+    monitor.is_trained = True
+    return monitor
+
+class TestModelRegistry(unittest.TestCase):
+    """测试版本化模型仓库"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = ModelRegistry(self.temp_dir, refresh_seconds=0)
+        rng = np.random.default_rng(3)
+        start = datetime(2025, 3, 25, 0, 0, 0)
+        self.transactions = [
+            {
+                "tx_hash": f"0x{i}",
+                "blockchain": "ethereum" if i % 2 else "bitcoin",
+                "from_address": "addr0",
+                "to_address": f"addr{i % 7 + 1}",
+                "value": float(rng.lognormal(0, 1)),
+                "fee": float(rng.uniform(0.0001, 0.01)),
+                "block_timestamp": start + timedelta(minutes=int(rng.integers(0, 5000)))
+            }
+            for i in range(300)
+        ]
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_register_versions_and_metadata(self):
+        """测试发布版本并记录元数据"""
+        monitor = make_numpy_monitor(0)
+        window = {'start': '2025-03-01', 'end': '2025-03-25'}
+        v1 = self.registry.register_lstm(monitor, training_window=window, metrics={'mae': 0.1})
+        v2 = self.registry.register_lstm(make_numpy_monitor(1))
+        self.assertEqual((v1, v2), ('v1', 'v2'))
+        self.assertEqual(self.registry.versions('lstm'), ['v1', 'v2'])
+
+        metadata = self.registry.metadata('lstm', 'v1')
+        self.assertEqual(metadata['kind'], 'lstm')
+        self.assertEqual(metadata['feature_schema'], ['value'])
+        self.assertEqual(metadata['sequence_length'], 5)
+        self.assertEqual(metadata['training_window'], window)
+        self.assertEqual(metadata['metrics'], {'mae': 0.1})
+        self.assertEqual(metadata['scaler']['scale'], [0.01])
+
+    def test_pin_per_chain_and_rollback(self):
+        """测试按链固定版本与回滚"""
+        self.registry.register_lstm(make_numpy_monitor(0))
+        self.registry.register_lstm(make_numpy_monitor(1))
+        self.registry.register_lstm(make_numpy_monitor(2))
+        self.assertEqual(self.registry.resolve('lstm', 'ethereum'), 'v3')
+
+        self.registry.pin('lstm', 'v1', 'ethereum')
+        self.assertEqual(self.registry.resolve('lstm', 'ethereum'), 'v1')
+        self.assertEqual(self.registry.resolve('lstm', 'bitcoin'), 'v3')
+
+        self.registry.pin('lstm', 'v2')
+        self.assertEqual(self.registry.resolve('lstm', 'bitcoin'), 'v2')
+        self.assertEqual(self.registry.rollback('lstm', 'bitcoin'), 'v1')
+        self.assertEqual(self.registry.resolve('lstm', 'bitcoin'), 'v1')
+        with self.assertRaises(ValueError):
+            self.registry.rollback('lstm', 'bitcoin')
+
+        self.registry.unpin('lstm', 'ethereum')
+        self.assertEqual(self.registry.resolve('lstm', 'ethereum'), 'v2')
+        with self.assertRaises(ValueError):
+            self.registry.pin('lstm', 'v9')
+
+    def test_pins_shared_between_registries(self):
+        """测试其他进程修改固定版本后无需重启即可生效"""
+        self.registry.register_lstm(make_numpy_monitor(0))
+        self.registry.register_lstm(make_numpy_monitor(1))
+        other = ModelRegistry(self.temp_dir, refresh_seconds=0)
+        self.assertEqual(other.resolve('lstm'), 'v2')
+        self.registry.pin('lstm', 'v1')
+        self.assertEqual(other.resolve('lstm'), 'v1')
+
+    def test_load_is_lazy_cached_and_memory_mapped(self):
+        """测试按需加载、缓存并内存映射"""
+        monitor = make_numpy_monitor(0)
+        self.registry.register_lstm(monitor)
+        self.assertEqual(self.registry._models, {})
+        loaded = self.registry.load('lstm')
+        self.assertIs(self.registry.load('lstm'), loaded)
+        self.assertIsInstance(loaded['model'].layers[0]['kernel'], np.memmap)
+
+        X = np.random.default_rng(0).random((8, 5, 1))
+        np.testing.assert_allclose(loaded['model'].predict(X), monitor.model.predict(X), rtol=1e-6)
+
+    def test_versions_cached_until_directory_changes(self):
+        """测试解析版本时不重复扫描目录，发布新版本后重新扫描"""
+        self.registry.register_lstm(make_numpy_monitor(0))
+        self.assertEqual(self.registry.resolve('lstm'), 'v1')
+        with patch('os.listdir', wraps=os.listdir) as listdir:
+            for _ in range(10):
+                self.assertEqual(self.registry.resolve('lstm'), 'v1')
+            listdir.assert_not_called()
+
+        # 其他进程发布的版本在目录修改时间变化后可见
+        ModelRegistry(self.temp_dir).register_lstm(make_numpy_monitor(1))
+        self.assertEqual(self.registry.resolve('lstm'), 'v2')
+
+        cached = ModelRegistry(self.temp_dir, refresh_seconds=3600)
+        self.assertEqual(cached.versions('lstm'), ['v1', 'v2'])
+        self.registry.register_lstm(make_numpy_monitor(2))
+        self.assertEqual(cached.versions('lstm'), ['v1', 'v2'])
+        self.assertEqual(cached.versions('lstm', refresh=True), ['v1', 'v2', 'v3'])
+
+    def test_loaded_models_are_lru_bounded(self):
+        """测试已加载模型的缓存按最近使用淘汰"""
+        registry = ModelRegistry(self.temp_dir, refresh_seconds=0, cache_size=2)
+        for seed in range(3):
+            registry.register_lstm(make_numpy_monitor(seed))
+        registry.load('lstm', version='v1')
+        registry.load('lstm', version='v2')
+        registry.load('lstm', version='v1')
+        registry.load('lstm', version='v3')
+        self.assertEqual(list(registry._models), [('lstm', 'v1'), ('lstm', 'v3')])
+
+    def test_async_monitor_follows_rollback(self):
+        """测试通过推理代理监控时回滚后使用新版本的模型、缩放参数和序列长度"""
+        first = make_numpy_monitor(0, sequence_length=7)
+        self.registry.register_lstm(first)
+        self.registry.register_lstm(make_numpy_monitor(1))
+
+        monitor = AIMonitor()
+        monitor.attach_registry(self.registry)
+        broker = InferenceBroker(monitor.model, max_delay_ms=1)
+        self.registry.rollback('lstm')
+
+        async def run():
+            result = await monitor.monitor_wallet_async('addr0', self.transactions, broker)
+            await broker.stop()
+            return result
+
+        result = asyncio.run(run())
+        expected = first.monitor_wallet('addr0', self.transactions)
+        self.assertEqual(monitor.model_version, 'v1')
+        self.assertEqual(monitor.sequence_length, 7)
+        self.assertEqual(result['anomalies_detected'], expected['anomalies_detected'])
+        self.assertAlmostEqual(
+            result['predicted_next_transaction']['predicted_value'],
+            expected['predicted_next_transaction']['predicted_value'],
+            places=4
+        )
+
+    def test_wallet_stream_follows_rollback(self):
+        """测试增量预测器在回滚后使用新版本的模型和缩放参数"""
+        first = make_numpy_monitor(0)
+        second = make_numpy_monitor(1)
+        second.scaler = ArrayMinMaxScaler(np.array([0.1]), np.array([0.02]))
+        self.registry.register_lstm(first)
+        self.registry.register_lstm(second)
+
+        monitor = AIMonitor()
+        monitor.attach_registry(self.registry)
+        predictor = WalletStreamPredictor(monitor)
+        recent = [
+            {'from_address': 'a', 'value': float(i + 1), 'block_timestamp': datetime(2025, 3, 25, 0, i)}
+            for i in range(6)
+        ]
+        predictor.update_many(recent[:5])
+        self.assertAlmostEqual(
+            predictor.pending_prediction('a'), second.predict_next_transaction(recent[:5])['predicted_value'], places=4
+        )
+
+        self.registry.rollback('lstm')
+        predictor.update(recent[5])
+        self.assertEqual(monitor.model_version, 'v1')
+        self.assertAlmostEqual(
+            predictor.pending_prediction('a'), first.predict_next_transaction(recent[1:])['predicted_value'], places=4
+        )
+
+    def test_monitor_follows_rollback(self):
+        """测试挂接仓库的监控器随回滚切换模型"""
+        first = make_numpy_monitor(0)
+        second = make_numpy_monitor(1)
+        self.registry.register_lstm(first)
+        self.registry.register_lstm(second)
+
+        monitor = AIMonitor()
+        monitor.attach_registry(self.registry, chain='ethereum')
+        self.assertTrue(monitor.is_trained)
+        self.assertEqual(monitor.model_version, 'v2')
+        recent = [{'value': float(i), 'block_timestamp': datetime(2025, 3, 25, 0, i)} for i in range(5)]
+        self.assertAlmostEqual(
+            monitor.predict_next_transaction(recent)['predicted_value'],
+            second.predict_next_transaction(recent)['predicted_value'],
+            places=4
+        )
+
+        self.registry.rollback('lstm', 'ethereum')
+        self.assertAlmostEqual(
+            monitor.predict_next_transaction(recent)['predicted_value'],
+            first.predict_next_transaction(recent)['predicted_value'],
+            places=4
+        )
+        self.assertEqual(monitor.model_version, 'v1')
+
+    def test_analyzer_uses_chain_pins(self):
+        """测试交易分析器按交易所在链使用固定版本"""
+        analyzer = TransactionAnalyzer()
+        analyzer.train_model(self.transactions)
+        expected = analyzer.export_packed_model().decision_function(analyzer._extract_features(self.transactions))
+        self.registry.register_iforest(analyzer, metrics={'contamination': 0.05})
+        metadata = self.registry.metadata('iforest', 'v1')
+        self.assertEqual(metadata['feature_schema'], ['value', 'fee', 'hour_of_day', 'day_of_week'])
+
+        # 第二个版本只用比特币交易训练
+        bitcoin_only = TransactionAnalyzer()
+        bitcoin_only.train_model([tx for tx in self.transactions if tx['blockchain'] == 'bitcoin'])
+        self.registry.register_iforest(bitcoin_only)
+        self.registry.pin('iforest', 'v1', 'ethereum')
+
+        serving = TransactionAnalyzer()
+        serving.attach_registry(self.registry)
+        self.assertTrue(serving.is_trained)
+        features = serving._extract_features(self.transactions)
+        scores = serving._registry_scores(self.transactions, features)
+        ethereum = np.array([tx['blockchain'] == 'ethereum' for tx in self.transactions])
+        bitcoin_expected = bitcoin_only.export_packed_model().decision_function(features)
+        np.testing.assert_allclose(scores[ethereum], expected[ethereum])
+        np.testing.assert_allclose(scores[~ethereum], bitcoin_expected[~ethereum])
+
+        # 回滚比特币后两条链使用同一版本
+        self.registry.rollback('iforest', 'bitcoin')
+        np.testing.assert_allclose(serving._registry_scores(self.transactions, features), expected)
+        anomalies = serving.detect_anomalies(self.transactions)
+        self.assertTrue(all(tx['anomaly_score'] < 0 for tx in anomalies))
+
+if __name__ == "__main__":
+    unittest.main()
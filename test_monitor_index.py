@@ -0,0 +1,144 @@
+import unittest
+from unittest.mock import patch
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, WalletMonitor, AlertConfig
+from app.alerts.alert_system import AlertSystem
+from app.alerts.alert_coalescer import AlertCoalescer
+from app.alerts.monitor_index import WatchedAddressIndex, normalize_address, index_key
+
+
+class TestNormalizeAddress(unittest.TestCase):
+    """测试地址规范化"""
+
+    def test_case_insensitive_formats(self):
+        """测试以太坊和 bech32 地址统一为小写"""
+        self.assertEqual(normalize_address(" 0xAbCdEf "), "0xabcdef")
+        self.assertEqual(normalize_address("BC1QXY2KGDYGJRSQTZQ2N0YRF2493P83KKFJHX0WLH"),
+                         "bc1qxy2kgdygjrsqtzq2n0yrf2493p83kkfjhx0wlh")
+
+    def test_base58_keeps_case(self):
+        """测试 Base58 地址区分大小写，只去除空白"""
+        self.assertEqual(normalize_address(" 1BoatSLRHtKNngkdXEeobR76b53LETtpyT\n"), "1BoatSLRHtKNngkdXEeobR76b53LETtpyT")
+        self.assertEqual(normalize_address(None), "")
+
+    def test_index_key(self):
+        """测试索引键包含小写链名"""
+        self.assertEqual(index_key(" Ethereum", "0xAB"), ("ethereum", "0xab"))
+
+
+class TestWatchedAddressIndex(unittest.TestCase):
+    """测试被监控地址索引的加载与刷新"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        for i in range(3):
+            self.db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+        self.db.commit()
+        self.db.add_all([
+            WalletMonitor(user_id=1, wallet_address="0xABC", blockchain="Ethereum", threshold=100),
+            WalletMonitor(user_id=2, wallet_address="0xabc", blockchain="ethereum", threshold=100),
+            WalletMonitor(user_id=3, wallet_address="0xDEF", blockchain="ethereum", alert_enabled=False),
+            AlertConfig(user_id=3, alert_type="large_transaction", threshold=5000,
+                        notification_channels={"email": True, "sms": False})
+        ])
+        self.db.commit()
+        self.index = WatchedAddressIndex(refresh_seconds=0)
+        self.index.listen()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.index.unlisten()
+        self.db.close()
+
+    def test_load(self):
+        """测试加载启用的监控和警报配置"""
+        self.assertFalse(self.index.loaded)
+        self.assertEqual(self.index.ensure_fresh(self.db), 1)
+
+        entries = self.index.monitors_by_key(index_key("ethereum", "0xAbC"))
+        self.assertEqual([entry.user_id for entry in entries], [1, 2])
+        self.assertEqual(self.index.monitors_by_key(index_key("ethereum", "0xdef")), [])
+        self.assertEqual(self.index.global_users("large_transaction"), [3])
+        self.assertEqual(self.index.channels(3, "large_transaction"), ["email"])
+        self.assertEqual(self.index.channel_targets(3, "large_transaction"), {"email": True})
+
+    def test_ensure_fresh_reloads_only_when_needed(self):
+        """测试索引未过期时不访问数据库，过期或超过刷新间隔时重新加载"""
+        version = self.index.ensure_fresh(self.db)
+        with patch.object(self.index, "load", wraps=self.index.load) as load:
+            self.assertEqual(self.index.ensure_fresh(self.db), version)
+            load.assert_not_called()
+
+            self.index.invalidate()
+            self.assertEqual(self.index.ensure_fresh(self.db), version + 1)
+            self.assertEqual(load.call_count, 1)
+
+    def test_periodic_refresh_checks_data_version(self):
+        """测试超过刷新间隔时只在数据版本变化后重新加载，并只通知变化的地址"""
+        version = self.index.ensure_fresh(self.db)
+        notifications = []
+        self.index.subscribe(lambda keys, configs_changed: notifications.append((keys, configs_changed)))
+        self.index.refresh_seconds = 60
+
+        self.index._loaded_at -= 61
+        with patch.object(self.index, "load", wraps=self.index.load) as load:
+            self.assertEqual(self.index.ensure_fresh(self.db), version)
+            load.assert_not_called()
+
+        # 模拟其他进程的修改，不经过本进程的 SQLAlchemy 事件
+        with self.engine.begin() as connection:
+            connection.execute(
+                text("UPDATE wallet_monitors SET alert_enabled = 1, updated_at = :now WHERE user_id = 3"),
+                {"now": datetime.utcnow()}
+            )
+        self.assertEqual(self.index.ensure_fresh(self.db), version)
+        self.index._loaded_at -= 61
+        self.assertEqual(self.index.ensure_fresh(self.db), version + 1)
+        self.assertEqual(len(self.index.monitors_by_key(index_key("ethereum", "0xdef"))), 1)
+        self.assertEqual(notifications, [({index_key("ethereum", "0xdef")}, False)])
+
+    def test_bulk_update_invalidates_after_commit(self):
+        """测试批量修改在提交后才使索引过期，回滚时不过期"""
+        self.index.load(self.db)
+        self.db.query(WalletMonitor).filter(WalletMonitor.user_id == 3).update({"alert_enabled": True})
+        self.db.rollback()
+        self.assertEqual(self.index.ensure_fresh(self.db), 1)
+
+        self.db.query(WalletMonitor).filter(WalletMonitor.user_id == 3).update({"alert_enabled": True})
+        # 提交前重新加载会读到旧数据，因此提交前不标记过期
+        self.assertEqual(self.index.ensure_fresh(self.db), 1)
+        self.db.commit()
+        self.assertEqual(self.index.ensure_fresh(self.db), 2)
+        self.assertEqual(len(self.index.monitors_by_key(index_key("ethereum", "0xdef"))), 1)
+
+    def test_alert_system_matches_from_index(self):
+        """测试警报系统通过索引匹配监控，大小写不同的地址也能匹配"""
+        alert_system = AlertSystem(self.db, index=self.index, coalescer=AlertCoalescer(window_seconds=0))
+        transaction = {
+            "blockchain": "ETHEREUM",
+            "from_address": "0xaBc",
+            "to_address": "0x123",
+            "value": 200,
+            "tx_hash": "0xtx"
+        }
+        alerts = alert_system.process_transaction(transaction)
+        self.assertTrue(self.index.loaded)
+        self.assertEqual(sorted(alert.user_id for alert in alerts), [1, 2])
+        self.assertEqual({alert.related_data["direction"] for alert in alerts}, {"outgoing"})
+
+        # 已加载的索引匹配时不再查询监控表
+        with patch.object(self.index, "load") as load:
+            self.assertEqual(len(alert_system.process_transaction(dict(transaction, tx_hash="0xtx2"))), 2)
+            load.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from app.alerts.notification_dispatcher import NotificationDispatcher, FileSink, WebhookSink, EchoWebhookServer
+from app.alerts.notification_channels import enabled_channels
+
+class RecordingSink:
+    """记录每次投递批次的渠道，可模拟持续失败"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def send(self, batch):
+        if self.fail:
+            raise ConnectionError("渠道不可用")
+        self.batches.append(list(batch))
+
+class TestNotificationDispatcher(unittest.TestCase):
+    """测试异步通知分发器"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.spool_path = os.path.join(self.temp_dir, "spool.jsonl")
+
+    def tearDown(self):
+        """测试后清理"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_dispatcher(self, sinks, **kwargs):
+        options = dict(
+            batch_size=10, max_delay_ms=20, queue_size=100, workers_per_channel=1,
+            max_retries=2, backoff_base_ms=1, spool_path=self.spool_path, spool_replay_seconds=0
+        )
+        options.update(kwargs)
+        return NotificationDispatcher(sinks, **options)
+
+    def read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        with open(self.spool_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_enabled_channels(self):
+        """测试解析启用的通知渠道"""
+        self.assertEqual(enabled_channels({"webhook": "http://x", "email": False, "file": True}), ["webhook", "file"])
+        self.assertEqual(enabled_channels(None), [])
+
+    def test_batches_per_channel(self):
+        """测试按渠道批量投递并记录延迟"""
+        sink = RecordingSink()
+        path = os.path.join(self.temp_dir, "notifications.jsonl")
+        dispatcher = self.make_dispatcher({"memory": sink, "file": FileSink(path)})
+
+        async def run():
+            await dispatcher.start()
+            for i in range(25):
+                dispatcher.notify({"alert_id": i}, ["memory", "file", "sms"])
+            await dispatcher.stop()
+
+        asyncio.run(run())
+        self.assertEqual([p["alert_id"] for batch in sink.batches for p in batch], list(range(25)))
+        self.assertLessEqual(max(len(batch) for batch in sink.batches), 10)
+        self.assertLessEqual(len(sink.batches), 4)
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 25)
+
+        metrics = dispatcher.metrics
+        self.assertEqual(metrics["channels"]["memory"]["delivered"], 25)
+        self.assertEqual(metrics["channels"]["file"]["delivered"], 25)
+        self.assertGreater(metrics["channels"]["memory"]["avg_latency_ms"], 0)
+        self.assertEqual(metrics["unroutable"], 25)
+
+    def test_notify_from_other_thread_does_not_block(self):
+        """测试在其他线程提交通知"""
+        sink = RecordingSink()
+        dispatcher = self.make_dispatcher({"memory": sink})
+
+        async def run():
+            await dispatcher.start()
+            thread = threading.Thread(target=lambda: [dispatcher.notify({"alert_id": i}, ["memory"]) for i in range(5)])
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0.05)
+            await dispatcher.stop()
+
+        asyncio.run(run())
+        self.assertEqual(sorted(p["alert_id"] for batch in sink.batches for p in batch), list(range(5)))
+
+    def test_webhook_retry_with_backoff(self):
+        """测试Webhook失败后重试成功"""
+        server = EchoWebhookServer()
+
+        async def run():
+            url = await server.start()
+            dispatcher = self.make_dispatcher({"webhook": WebhookSink(url)})
+            await dispatcher.start()
+            server.fail_next(2)
+            for i in range(3):
+                dispatcher.notify({"alert_id": i}, ["webhook"])
+            await dispatcher.stop()
+            await server.stop()
+            return dispatcher.metrics
+
+        metrics = asyncio.run(run())
+        self.assertEqual([p["alert_id"] for p in server.received], [0, 1, 2])
+        self.assertEqual(server.requests, 3)
+        self.assertEqual(metrics["channels"]["webhook"]["retries"], 2)
+        self.assertEqual(self.read_spool(), [])
+
+    def test_webhook_routes_to_user_target(self):
+        """测试Webhook通知投递到用户配置的地址，缺少地址或没有投递实现的渠道计入 unroutable"""
+        server = EchoWebhookServer()
+
+        async def run():
+            url = await server.start()
+            dispatcher = self.make_dispatcher({"webhook": WebhookSink()})
+            await dispatcher.start()
+            with self.assertLogs("app.alerts.notification_dispatcher", level="WARNING") as logs:
+                dispatcher.notify({"alert_id": 1}, {"webhook": url, "email": True})
+                dispatcher.notify({"alert_id": 2}, {"webhook": {"url": url}})
+                dispatcher.notify({"alert_id": 3}, {"webhook": True, "email": True})
+            await dispatcher.stop()
+            await server.stop()
+            return dispatcher.metrics, logs.output
+
+        metrics, output = asyncio.run(run())
+        self.assertEqual(server.received, [{"alert_id": 1}, {"alert_id": 2}])
+        self.assertEqual(metrics["channels"]["webhook"]["delivered"], 2)
+        self.assertEqual(metrics["unroutable"], 3)
+        # 每个渠道名只警告一次
+        self.assertEqual(len(output), 2)
+
+    def test_spool_and_replay(self):
+        """测试重试耗尽后写入暂存文件，下次启动时重放"""
+        failing = RecordingSink(fail=True)
+        dispatcher = self.make_dispatcher({"memory": failing})
+
+        async def fail_run():
+            await dispatcher.start()
+            for i in range(3):
+                dispatcher.notify({"alert_id": i}, ["memory"])
+            await dispatcher.stop()
+
+        asyncio.run(fail_run())
+        spooled = self.read_spool()
+        self.assertEqual([entry["payload"]["alert_id"] for entry in spooled], [0, 1, 2])
+        self.assertEqual(dispatcher.metrics["channels"]["memory"]["failed_batches"], 1)
+
+        # 未启动时提交的通知也写入暂存文件，由后台线程写入
+        dispatcher.notify({"alert_id": 3}, ["memory"])
+        dispatcher.flush_spool()
+        self.assertEqual(len(self.read_spool()), 4)
+
+        sink = RecordingSink()
+        recovered = self.make_dispatcher({"memory": sink})
+
+        async def replay_run():
+            await recovered.start()
+            await recovered.stop()
+
+        asyncio.run(replay_run())
+        self.assertEqual(sorted(p["alert_id"] for batch in sink.batches for p in batch), [0, 1, 2, 3])
+        self.assertEqual(recovered.metrics["channels"]["memory"]["replayed"], 4)
+        self.assertEqual(self.read_spool(), [])
+
+    def test_spool_write_off_caller_thread(self):
+        """测试暂存文件由后台线程写入和 fsync，提交通知的线程不等待磁盘"""
+        dispatcher = self.make_dispatcher({"memory": RecordingSink()})
+        fsync_threads = []
+        real_fsync = os.fsync
+
+        def recording_fsync(fd):
+            fsync_threads.append(threading.get_ident())
+            real_fsync(fd)
+
+        with patch("os.fsync", side_effect=recording_fsync):
+            for i in range(5):
+                dispatcher.notify({"alert_id": i}, ["memory"])
+            dispatcher.flush_spool()
+
+        self.assertEqual(len(self.read_spool()), 5)
+        self.assertTrue(fsync_threads)
+        self.assertNotIn(threading.get_ident(), fsync_threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
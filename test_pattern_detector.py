@@ -0,0 +1,89 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+
+from app.analytics.pattern_detector import (
+    IncrementalPatternDetector, detect_patterns_batch,
+    FREQUENCY_SPIKE, AMOUNT_SPIKE, NIGHT_ACTIVITY
+)
+from app.analytics.ai_monitor import AIMonitor
+from app.analytics.feature_store import FeatureStore
+
+class TestPatternDetector(unittest.TestCase):
+    """测试增量与批量异常模式检测"""
+
+    def setUp(self):
+        """测试前准备"""
+        rng = random.Random(3)
+        start = datetime(2025, 3, 25, 0, 0, 0)
+        self.transactions = []
+        t = start
+        for i in range(600):
+            t += timedelta(minutes=rng.choice([1, 5, 30, 240]))
+            self.transactions.append({
+                "tx_hash": f"0x{i}",
+                "from_address": f"addr{rng.randrange(12)}",
+                "to_address": f"addr{rng.randrange(12)}",
+                "value": rng.choice([0.5, 1.0, 2.0, 50.0]),
+                "block_timestamp": t
+            })
+        self.monitor = AIMonitor()
+
+    def _reference(self, address, transactions):
+        """原有逐地址检测结果"""
+        address_txs = [tx for tx in transactions
+                       if tx["from_address"] == address or tx["to_address"] == address]
+        return self.monitor._detect_unusual_patterns(address_txs)
+
+    def test_spike_rules(self):
+        """测试频率、金额和深夜规则"""
+        start = datetime(2025, 3, 25, 1, 0, 0)
+        detector = IncrementalPatternDetector()
+        offsets = [i * 600 for i in range(10)] + [5410, 5420, 5430]
+        values = [1] * 10 + [20] * 3
+        for i, (offset, value) in enumerate(zip(offsets, values)):
+            result = detector.update({
+                "from_address": "a", "to_address": f"b{i}", "value": value,
+                "block_timestamp": start + timedelta(seconds=offset)
+            })
+        self.assertEqual(result["a"], [FREQUENCY_SPIKE, AMOUNT_SPIKE, NIGHT_ACTIVITY])
+        self.assertEqual(detector.patterns("b0"), [])
+        self.assertEqual(detector.patterns("unknown"), [])
+
+    def test_reads_feature_store(self):
+        """测试挂接特征存储时规则读取存储的窗口聚合，不再单独维护统计"""
+        start = datetime(2025, 3, 25, 1, 0, 0)
+        store = FeatureStore(windows=[300, 86400], buckets_per_window=12)
+        detector = IncrementalPatternDetector(feature_store=store)
+        offsets = [i * 600 for i in range(10)] + [5410 + i * 10 for i in range(6)]
+        for i, offset in enumerate(offsets):
+            result = detector.update({
+                "from_address": "a", "to_address": f"b{i}", "value": 1,
+                "block_timestamp": start + timedelta(seconds=offset)
+            })
+        self.assertEqual(result["a"], [FREQUENCY_SPIKE, NIGHT_ACTIVITY])
+        self.assertEqual(store.get_features("a")["24h"]["count"], 16)
+        self.assertEqual(len(detector), len(store))
+        self.assertEqual(len(detector._index), 0)
+        self.assertEqual(detector.patterns("unknown"), [])
+
+    def test_incremental_matches_reference(self):
+        """测试增量检测在每一步都与原有检测一致"""
+        detector = IncrementalPatternDetector(initial_capacity=2)
+        for i, tx in enumerate(self.transactions[:200]):
+            for address, patterns in detector.update(tx).items():
+                self.assertEqual(patterns, self._reference(address, self.transactions[:i + 1]))
+
+    def test_batch_matches_incremental(self):
+        """测试向量化批量检测与增量检测一致"""
+        detector = IncrementalPatternDetector()
+        detector.update_many(self.transactions)
+        batch = detect_patterns_batch(self.transactions)
+
+        self.assertEqual(set(batch), {f"addr{i}" for i in range(12)})
+        for address, patterns in batch.items():
+            self.assertEqual(patterns, detector.patterns(address))
+        self.assertEqual(detect_patterns_batch(self.transactions, ["addr1", "missing"])["missing"], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, User, WalletMonitor, AlertConfig
+from app.alerts.alert_system import AlertSystem
+from app.alerts.alert_coalescer import AlertCoalescer
+from app.alerts.monitor_index import WatchedAddressIndex
+from app.alerts.rule_engine import AlertRuleEngine
+
+
+class TestAlertRuleEngine(unittest.TestCase):
+    """测试编译后的大额交易规则与索引增量更新"""
+
+    def setUp(self):
+        """测试前准备"""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        for i in range(4):
+            self.db.add(User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x"))
+        self.db.commit()
+        self.db.add_all([
+            # 用户1: 监控自带阈值；用户2: 使用警报配置阈值；用户3: 只有全局配置，使用默认阈值
+            WalletMonitor(user_id=1, wallet_address="0xA", blockchain="ethereum", threshold=100),
+            WalletMonitor(user_id=2, wallet_address="0xA", blockchain="ethereum"),
+            WalletMonitor(user_id=4, wallet_address="0xB", blockchain="ethereum", threshold=50),
+            AlertConfig(user_id=2, alert_type="large_transaction", threshold=1000),
+            AlertConfig(user_id=3, alert_type="large_transaction")
+        ])
+        self.db.commit()
+
+        self.index = WatchedAddressIndex(refresh_seconds=0)
+        self.index.listen()
+        self.index.load(self.db)
+        self.rules = AlertRuleEngine(self.index, default_threshold=10000)
+        self.alert_system = AlertSystem(
+            self.db, index=self.index, coalescer=AlertCoalescer(window_seconds=0), rules=self.rules
+        )
+
+    def tearDown(self):
+        """测试后清理"""
+        self.index.unlisten()
+        self.db.close()
+
+    def _tx(self, value: float, from_address: str = "0xa", to_address: str = "0xc") -> dict:
+        return {
+            "blockchain": "ethereum",
+            "from_address": from_address,
+            "to_address": to_address,
+            "value": value,
+            "tx_hash": f"h{value}"
+        }
+
+    def _matched(self, value: float, **kwargs) -> list:
+        return sorted(self.rules.match_large_transaction(self._tx(value, **kwargs)))
+
+    def test_threshold_precedence(self):
+        """测试阈值优先级: 监控 > 警报配置 > 全局默认"""
+        self.assertEqual(self._matched(99), [])
+        self.assertEqual(self._matched(100), [(1, "outgoing", "0xA")])
+        self.assertEqual(self._matched(1000), [(1, "outgoing", "0xA"), (2, "outgoing", "0xA")])
+        # 用户2已有监控警报，全局配置不重复产生警报
+        self.assertEqual(
+            self._matched(10000),
+            [(1, "outgoing", "0xA"), (2, "outgoing", "0xA"), (3, "global", None)]
+        )
+        self.assertEqual(self.rules.min_threshold(), 50)
+
+    def test_prefix_match_is_sorted_by_threshold(self):
+        """测试按阈值升序编译，金额只匹配阈值不超过它的前缀"""
+        self.db.add(WalletMonitor(user_id=3, wallet_address="0xa", blockchain="ethereum", threshold=500))
+        self.db.commit()
+        thresholds = [self.rules.threshold(entry) for entry in self.rules.monitors("ethereum", "0xA", float("inf"))]
+        self.assertEqual(thresholds, [100, 500, 1000])
+        self.assertEqual([entry.user_id for entry in self.rules.monitors("ethereum", "0xa", 500)], [1, 3])
+        self.assertEqual(self.rules.monitors("ethereum", "0xunknown", 1e9), [])
+
+    def test_commit_updates_matches_incrementally(self):
+        """测试提交的阈值变更只重新编译受影响的地址"""
+        self._matched(200, to_address="0xb")
+        self.assertEqual(self.rules.metrics["cached_addresses"], 2)
+        version = self.index.version
+
+        monitor = self.db.query(WalletMonitor).filter_by(user_id=1).one()
+        monitor.threshold = 300
+        self.db.commit()
+
+        self.assertEqual(self.index.version, version + 1)
+        # 只有 0xa 的编译结果失效，0xb 的仍在缓存中
+        self.assertEqual(self.rules.metrics["cached_addresses"], 1)
+        self.assertEqual(self._matched(200), [])
+        self.assertEqual(self._matched(300), [(1, "outgoing", "0xA")])
+
+    def test_config_change_updates_default_threshold(self):
+        """测试警报配置阈值变更影响未设置阈值的监控"""
+        config = self.db.query(AlertConfig).filter_by(user_id=2).one()
+        config.threshold = 150
+        self.db.commit()
+        self.assertEqual(self._matched(150), [(1, "outgoing", "0xA"), (2, "outgoing", "0xA")])
+
+        self.db.delete(config)
+        self.db.commit()
+        self.assertEqual(self._matched(1000), [(1, "outgoing", "0xA")])
+
+    def test_rollback_discards_changes(self):
+        """测试回滚的变更不应用到索引"""
+        version = self.index.version
+        monitor = self.db.query(WalletMonitor).filter_by(user_id=1).one()
+        monitor.threshold = 5000
+        self.db.add(WalletMonitor(user_id=3, wallet_address="0xD", blockchain="ethereum", threshold=1))
+        self.db.flush()
+        self.db.rollback()
+
+        self.assertEqual(self.index.version, version)
+        self.assertEqual(self._matched(100), [(1, "outgoing", "0xA")])
+        self.assertEqual(self._matched(5, to_address="0xd"), [])
+
+    def test_disable_and_delete_monitor(self):
+        """测试停用和删除监控"""
+        monitor = self.db.query(WalletMonitor).filter_by(user_id=4).one()
+        monitor.alert_enabled = False
+        self.db.commit()
+        self.assertEqual(self._matched(1e9, from_address="0xb"), [(2, "global", None), (3, "global", None)])
+        self.assertEqual(self.rules.min_threshold(), 100)
+
+        self.db.delete(self.db.query(WalletMonitor).filter_by(user_id=1).one())
+        self.db.commit()
+        self.assertEqual(self.rules.min_threshold(), 1000)
+
+    def test_batch_prefilter(self):
+        """测试批量处理用最小阈值预筛选，结果与逐笔匹配一致"""
+        batch = [self._tx(10), self._tx(60, to_address="0xb"), self._tx(49, to_address="0xb"), self._tx(1000)]
+        alerts = self.alert_system.process_transactions(batch)
+        self.assertEqual({user_id: len(user_alerts) for user_id, user_alerts in alerts.items()}, {1: 1, 2: 1, 4: 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from datetime import datetime, timedelta
+
+from app.analytics.training_sampler import StratifiedReservoirSampler
+from app.analytics.transaction_analyzer import TransactionAnalyzer
+
+class TestStratifiedReservoirSampler(unittest.TestCase):
+    """测试分层蓄水池训练样本"""
+
+    def setUp(self):
+        """测试前准备"""
+        start = datetime(2025, 3, 25, 0, 0, 0)
+        # 以太坊 5000 笔小额交易、50 笔大额交易，比特币 200 笔小额交易
+        self.transactions = [
+            {
+                "tx_hash": f"0x{i}",
+                "blockchain": "ethereum" if i < 5050 else "bitcoin",
+                "from_address": f"addr{i % 30}",
+                "to_address": f"addr{(i + 7) % 30}",
+                "value": 5000.0 if i % 101 == 0 and i < 5050 else 0.5 + (i % 5) * 0.1,
+                "fee": 0.001,
+                "block_timestamp": start + timedelta(minutes=i)
+            }
+            for i in range(5250)
+        ]
+
+    def test_bounded_strata(self):
+        """测试每个分层的保留数不超过容量，并记录见过的交易数"""
+        sampler = StratifiedReservoirSampler(capacity_per_stratum=100, band_edges=[0, 3], seed=1)
+        sampler.add_many(self.transactions)
+
+        stats = {(s["blockchain"], s["band"]): s for s in sampler.stats()}
+        self.assertEqual(stats[("ethereum", 0)]["seen"], 5000)
+        self.assertEqual(stats[("ethereum", 0)]["kept"], 100)
+        self.assertEqual(stats[("ethereum", 2)]["kept"], 50)
+        self.assertEqual(stats[("bitcoin", 0)]["kept"], 100)
+        self.assertEqual(len(sampler), 250)
+
+    def test_reservoir_covers_history(self):
+        """测试蓄水池样本覆盖整段历史，而不是只保留最早或最新的交易"""
+        sampler = StratifiedReservoirSampler(capacity_per_stratum=100, band_edges=[0, 3], seed=1)
+        sampler.add_many(self.transactions)
+
+        indices = [int(tx["tx_hash"][2:]) for tx in sampler.sample("ethereum") if tx["value"] < 1]
+        self.assertLess(min(indices), 1000)
+        self.assertGreater(max(indices), 4000)
+
+        transactions, weights = sampler.sample_with_weights("ethereum")
+        self.assertAlmostEqual(float(weights.sum()), 5050.0)
+        self.assertEqual(len(transactions), len(weights))
+
+    def test_resample_restores_distribution(self):
+        """测试重抽样后各分层占比与摄取流一致"""
+        sampler = StratifiedReservoirSampler(capacity_per_stratum=100, band_edges=[0, 3], seed=1)
+        sampler.add_many(self.transactions[:5050])
+
+        resampled = sampler.resample(size=20000)
+        large_share = sum(tx["value"] > 1000 for tx in resampled) / len(resampled)
+        self.assertAlmostEqual(large_share, 50 / 5050, delta=0.003)
+        self.assertEqual(len(sampler.resample()), 150)
+
+    def test_train_model_from_sampler(self):
+        """测试用抽样器训练的模型与用完整摄取流训练的模型一致，大额交易仍被判为异常"""
+        ethereum = self.transactions[:5050]
+        large = [tx for tx in ethereum if tx["value"] > 1000][:5]
+
+        full = TransactionAnalyzer()
+        full.train_model(ethereum)
+
+        sampler = StratifiedReservoirSampler(capacity_per_stratum=100, band_edges=[0, 3], seed=1)
+        analyzer = TransactionAnalyzer(training_sampler=sampler)
+        analyzer.ingest_transactions(ethereum)
+        analyzer.train_model(sampler)
+
+        # 各层等容量的样本中大额交易占三分之一，直接训练会把大额交易学成正常
+        rebalanced = TransactionAnalyzer()
+        rebalanced.train_model(sampler.sample())
+
+        self.assertEqual(len(full.detect_anomalies(large)), 5)
+        self.assertEqual(len(analyzer.detect_anomalies(large)), 5)
+        self.assertLess(len(rebalanced.detect_anomalies(large)), 5)
+        self.assertAlmostEqual(analyzer.model.offset_, full.model.offset_, delta=0.05)
+
+if __name__ == "__main__":
+    unittest.main()
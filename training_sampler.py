@@ -0,0 +1,144 @@
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import logging
+import math
+import random
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.analytics.flow_graph import to_epoch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StratifiedReservoirSampler:
+    """按链和金额分档分层的蓄水池抽样器
+
+    从交易摄取流中逐笔更新，每个分层（区块链, 金额档）最多保留固定数量的交易，
+    使用蓄水池抽样（Algorithm R）保证每层的样本是该层全部历史的均匀抽样。
+    内存只与分层数和每层容量有关，与历史长度无关。
+
+    各层按相同容量保留，稀有的大额交易不会被大量小额交易淹没；同时记录每层
+    见过的交易总数。训练时用 resample 按 见过数 / 保留数 有放回地重抽样，
+    还原真实分布（IsolationForest 的 sample_weight 不影响树的构建和阈值）。
+    """
+
+    def __init__(
+        self,
+        capacity_per_stratum: Optional[int] = None,
+        band_edges: Optional[Sequence[float]] = None,
+        seed: Optional[int] = None
+    ):
+        """初始化抽样器
+
+        Args:
+            capacity_per_stratum: 每个分层保留的最大交易数
+            band_edges: 金额分档边界（log10），默认取配置 TRAINING_VALUE_BAND_EDGES
+            seed: 随机种子，便于复现
+        """
+        self.capacity = capacity_per_stratum or settings.TRAINING_SAMPLE_PER_STRATUM
+        self.band_edges = np.asarray(
+            band_edges if band_edges is not None else settings.TRAINING_VALUE_BAND_EDGES, dtype=np.float64
+        )
+        self._random = random.Random(seed)
+        self._reservoirs: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        self._seen: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(reservoir) for reservoir in self._reservoirs.values())
+
+    def _stratum(self, tx: Dict[str, Any]) -> Tuple[str, int]:
+        """交易所属的分层"""
+        value = float(tx.get('value', 0) or 0)
+        band = int(np.searchsorted(self.band_edges, math.log10(value), side='right')) if value > 0 else 0
+        return str(tx.get('blockchain', 'unknown')).lower(), band
+
+    def add(self, tx: Dict[str, Any]):
+        """从摄取流中加入一笔交易
+
+        Args:
+            tx: 交易数据
+        """
+        key = self._stratum(tx)
+        with self._lock:
+            reservoir = self._reservoirs.setdefault(key, [])
+            seen = self._seen.get(key, 0) + 1
+            self._seen[key] = seen
+            if len(reservoir) < self.capacity:
+                reservoir.append(tx)
+            else:
+                j = self._random.randrange(seen)
+                if j < self.capacity:
+                    reservoir[j] = tx
+
+    def add_many(self, transactions: List[Dict[str, Any]]):
+        """批量加入交易"""
+        for tx in transactions:
+            self.add(tx)
+
+    def sample(self, blockchain: Optional[str] = None) -> List[Dict[str, Any]]:
+        """取出当前样本，按时间排序
+
+        Args:
+            blockchain: 只取该链的样本，默认取全部
+
+        Returns:
+            交易列表
+        """
+        return self.sample_with_weights(blockchain)[0]
+
+    def sample_with_weights(self, blockchain: Optional[str] = None) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """取出当前样本及还原真实分布的样本权重
+
+        Args:
+            blockchain: 只取该链的样本，默认取全部
+
+        Returns:
+            (按时间排序的交易列表, 对应的权重 见过数 / 保留数)
+        """
+        chain = blockchain.lower() if blockchain else None
+        with self._lock:
+            items = [
+                (tx, self._seen[key] / len(reservoir))
+                for key, reservoir in self._reservoirs.items()
+                if chain is None or key[0] == chain
+                for tx in reservoir
+            ]
+        items.sort(key=lambda item: to_epoch(item[0].get('block_timestamp')))
+        return [tx for tx, _ in items], np.array([weight for _, weight in items], dtype=np.float64)
+
+    def resample(self, size: Optional[int] = None, blockchain: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按真实分布有放回地重抽样
+
+        每笔样本被抽中的概率与其分层的 见过数 / 保留数 成正比，
+        因此各分层在结果中的占比与摄取流中的占比一致。
+
+        Args:
+            size: 抽样数，默认等于当前样本数
+            blockchain: 只取该链的样本，默认取全部
+
+        Returns:
+            按时间排序的交易列表
+        """
+        transactions, weights = self.sample_with_weights(blockchain)
+        if not transactions:
+            return []
+        size = len(transactions) if size is None else size
+        with self._lock:
+            seed = self._random.randrange(2 ** 32)
+        rng = np.random.default_rng(seed)
+        # 样本已按时间排序，排序后的下标保持时间顺序
+        indices = np.sort(rng.choice(len(transactions), size=size, replace=True, p=weights / weights.sum()))
+        return [transactions[i] for i in indices]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各分层的见过数与保留数"""
+        with self._lock:
+            return [
+                {'blockchain': chain, 'band': band, 'seen': self._seen[(chain, band)], 'kept': len(reservoir)}
+                for (chain, band), reservoir in sorted(self._reservoirs.items())
+            ]
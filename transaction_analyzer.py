@@ -1,14 +1,19 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union, Iterator
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import logging
 import json
-import networkx as nx
 from datetime import datetime, timedelta
 
 from app.config import settings
+from app.analytics.flow_graph import FlowGraph, to_epoch
+from app.analytics.cycle_detection import TemporalCycleDetector
+from app.analytics.fund_tracer import FundTracer
+from app.analytics.feature_store import FeatureStore
+from app.analytics.iforest_scorer import PackedIsolationForest
+from app.analytics.training_sampler import StratifiedReservoirSampler
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -17,8 +22,22 @@ logger = logging.getLogger(__name__)
 class TransactionAnalyzer:
     """交易分析器"""
     
-    def __init__(self):
-        """初始化交易分析器"""
+    def __init__(
+        self,
+        flow_graph: Optional[FlowGraph] = None,
+        tracer: Optional[FundTracer] = None,
+        feature_store: Optional[FeatureStore] = None,
+        training_sampler: Optional[StratifiedReservoirSampler] = None
+    ):
+        """初始化交易分析器
+        
+        Args:
+            flow_graph: 共享的资金流向图，不提供则新建一个
+            tracer: 基于CSR图的多跳资金追踪引擎，用于填充相关实体。摄取的交易
+                同时追加到其CSR图，图未设置合并间隔时按 TRACE_MERGE_INTERVAL_SECONDS 合并
+            feature_store: 按地址滚动聚合的特征存储，提供时随摄取流一起更新
+            training_sampler: 训练样本蓄水池，提供时随摄取流一起更新
+        """
         # 初始化异常检测模型
         self.model = IsolationForest(
             n_estimators=100,
@@ -27,10 +46,53 @@ class TransactionAnalyzer:
         )
         self.scaler = StandardScaler()
         self.is_trained = False
+        # 导出后的打包评分器，存在时检测不再经过sklearn
+        self.packed_model: Optional[PackedIsolationForest] = None
+        # 挂接的模型仓库，存在时按交易所在链解析固定版本
+        self.registry = None
+        self.registry_name = 'iforest'
+        self.registry_chain: Optional[str] = None
+        # 由交易摄取流持续更新的资金流向图
+        self.flow_graph = flow_graph or FlowGraph()
+        self.cycle_detector = TemporalCycleDetector(self.flow_graph)
+        self.tracer = tracer
+        if tracer is not None and tracer.graph.merge_interval_seconds is None:
+            tracer.graph.merge_interval_seconds = settings.TRACE_MERGE_INTERVAL_SECONDS
+        self.feature_store = feature_store
+        self.training_sampler = training_sampler
         logger.info("交易分析器初始化完成")
     
-    def train_model(self, transactions: List[Dict[str, Any]]):
-        """训练异常检测模型"""
+    def ingest_transaction(self, tx: Dict[str, Any]) -> bool:
+        """将交易追加到资金流向图
+        
+        Args:
+            tx: 交易数据
+            
+        Returns:
+            是否新增了边
+        """
+        if self.feature_store is not None:
+            self.feature_store.update(tx)
+        if self.training_sampler is not None:
+            self.training_sampler.add(tx)
+        if self.tracer is not None and not self.tracer.graph.read_only:
+            self.tracer.graph.add_transaction(tx)
+        return self.flow_graph.add_transaction(tx)
+    
+    def ingest_transactions(self, transactions: List[Dict[str, Any]]) -> int:
+        """批量将交易追加到资金流向图"""
+        return sum(1 for tx in transactions if self.ingest_transaction(tx))
+    
+    def train_model(self, transactions: Union[List[Dict[str, Any]], StratifiedReservoirSampler]):
+        """训练异常检测模型
+        
+        Args:
+            transactions: 交易列表，或摄取流维护的分层蓄水池抽样器。
+                使用抽样器时按各分层的抽样比例重抽样，还原历史的真实分布
+        """
+        if isinstance(transactions, StratifiedReservoirSampler):
+            transactions = transactions.resample()
+        
         if not transactions:
             logger.warning("没有交易数据用于训练模型")
             return
@@ -47,8 +109,66 @@ class TransactionAnalyzer:
         # 训练模型
         self.model.fit(scaled_features)
         self.is_trained = True
+        self.packed_model = None
         logger.info(f"异常检测模型训练完成，使用 {len(transactions)} 条交易记录")
     
+    def export_packed_model(self, path: Optional[str] = None) -> PackedIsolationForest:
+        """将已训练的模型导出为打包评分器，并用于后续检测
+        
+        Args:
+            path: 保存目录，提供时写入磁盘供其他进程内存映射加载
+            
+        Returns:
+            打包评分器
+        """
+        if not self.is_trained:
+            raise ValueError("模型尚未训练，无法导出")
+        self.packed_model = PackedIsolationForest.from_sklearn(self.model, self.scaler)
+        if path:
+            self.packed_model.save(path)
+        return self.packed_model
+    
+    def load_packed_model(self, path: str) -> PackedIsolationForest:
+        """从目录内存映射加载打包评分器，无需重新训练
+        
+        Args:
+            path: export_packed_model 写入的目录
+            
+        Returns:
+            打包评分器
+        """
+        self.packed_model = PackedIsolationForest.load(path)
+        self.is_trained = True
+        return self.packed_model
+    
+    def attach_registry(self, registry: Any, name: str = 'iforest', chain: Optional[str] = None):
+        """从模型仓库按需加载打包评分器
+        
+        检测时按交易的 blockchain 字段（或指定的链）解析固定版本，
+        同一批交易可以由不同链的固定版本评分；修改固定版本即可回滚，无需重启进程。
+        
+        Args:
+            registry: ModelRegistry 实例
+            name: 仓库中的模型名
+            chain: 固定使用的区块链名称，默认取每笔交易的 blockchain 字段
+        """
+        self.registry = registry
+        self.registry_name = name
+        self.registry_chain = chain
+        self.is_trained = registry.resolve(name, chain) is not None
+    
+    def _registry_scores(self, transactions: List[Dict[str, Any]], features: pd.DataFrame) -> np.ndarray:
+        """按链分组，用仓库中各链固定的版本计算异常分数"""
+        chains = np.array([self.registry_chain or tx.get('blockchain') or '' for tx in transactions])
+        scores = np.empty(len(transactions))
+        for chain in np.unique(chains):
+            mask = chains == chain
+            loaded = self.registry.load(self.registry_name, chain or None)
+            if loaded is None:
+                raise ValueError(f"模型仓库中没有 {self.registry_name} 模型")
+            scores[mask] = loaded['model'].decision_function(features[mask])
+        return scores
+    
     def _extract_features(self, transactions: List[Dict[str, Any]]) -> pd.DataFrame:
         """从交易中提取特征"""
         features = []
@@ -86,12 +206,20 @@ class TransactionAnalyzer:
         if features.empty:
             return []
         
-        # 标准化特征
-        scaled_features = self.scaler.transform(features)
-        
-        # 预测异常分数（越小越异常）
-        anomaly_scores = self.model.decision_function(scaled_features)
-        predictions = self.model.predict(scaled_features)
+        if self.registry is not None:
+            anomaly_scores = self._registry_scores(transactions, features)
+            predictions = np.where(anomaly_scores < 0, -1, 1)
+        elif self.packed_model is not None:
+            # 打包评分器内部完成标准化
+            anomaly_scores = self.packed_model.decision_function(features)
+            predictions = np.where(anomaly_scores < 0, -1, 1)
+        else:
+            # 标准化特征
+            scaled_features = self.scaler.transform(features)
+            
+            # 预测异常分数（越小越异常）
+            anomaly_scores = self.model.decision_function(scaled_features)
+            predictions = self.model.predict(scaled_features)
         
         # 标记异常交易
         anomalies = []
@@ -122,8 +250,8 @@ class TransactionAnalyzer:
             analysis['is_suspicious'] = True
             analysis['flow_analysis']['large_transaction'] = True
         
-        # 如果有相关交易，分析资金流向
-        if related_txs:
+        # 如果有相关交易或流向图中已有该地址，分析资金流向
+        if related_txs or tx.get('from_address', '') in self.flow_graph:
             flow_analysis = self.analyze_fund_flow(tx, related_txs)
             analysis['flow_analysis'].update(flow_analysis)
             
@@ -132,62 +260,84 @@ class TransactionAnalyzer:
                 analysis['risk_score'] += 0.3
                 analysis['is_suspicious'] = True
         
+        # 多跳追踪相关实体
+        if self.tracer is not None:
+            analysis['related_entities'] = self.tracer.summarize(
+                self._trace_related(tx),
+                limit=settings.TRACE_MAX_RELATED_ENTITIES
+            )
+        
         # 根据风险分数确定最终可疑状态
         if analysis['risk_score'] >= 0.7:
             analysis['is_suspicious'] = True
         
         return analysis
     
-    def analyze_fund_flow(self, tx: Dict[str, Any], related_txs: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """分析资金流向"""
+    def _trace_related(self, tx: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """追踪交易的相关实体
+
+        交易已合并进CSR图时从该交易向前追踪资金去向；刚摄取、尚未合并的交易
+        从发送方向后追踪此前的资金来源。
+        """
+        tx_hash = tx.get('tx_hash')
+        if tx_hash and len(self.tracer.graph.edges_for_tx(tx_hash)):
+            return self.tracer.trace_transaction(tx_hash)
+        from_addr = tx.get('from_address', '')
+        if not from_addr:
+            return iter(())
+        value = float(tx.get('value', 0) or 0)
+        return self.tracer.trace_address(
+            from_addr, 'backward', start_time=to_epoch(tx.get('block_timestamp')), amount=value if value > 0 else None
+        )
+    
+    def analyze_fund_flow(self, tx: Dict[str, Any], related_txs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """分析资金流向
+        
+        交易先追加到持久化资金流向图，随后只在该交易发送方的局部邻域内
+        检测分散、环形和混币模式，不再每次重建整张图。
+        
+        Args:
+            tx: 待分析交易
+            related_txs: 可选的相关交易，会一并追加到流向图
+            
+        Returns:
+            资金流向分析结果
+        """
         flow_analysis = {
             'fund_dispersion': False,
             'dispersion_count': 0,
             'circular_transfer': False,
+            'cycles': [],
             'mixing_pattern': False
         }
         
-        # 构建交易图
-        G = nx.DiGraph()
+        # 追加当前交易和相关交易
+        self.flow_graph.add_transaction(tx)
+        if related_txs:
+            self.flow_graph.add_transactions(related_txs)
         
-        # 添加当前交易
         from_addr = tx.get('from_address', '')
-        to_addr = tx.get('to_address', '')
-        if from_addr and to_addr:
-            G.add_edge(from_addr, to_addr, **{
-                'tx_hash': tx.get('tx_hash', ''),
-                'value': float(tx.get('value', 0)),
-                'timestamp': tx.get('block_timestamp', datetime.now())
-            })
-        
-        # 添加相关交易
-        for rtx in related_txs:
-            from_addr = rtx.get('from_address', '')
-            to_addr = rtx.get('to_address', '')
-            if from_addr and to_addr:
-                G.add_edge(from_addr, to_addr, **{
-                    'tx_hash': rtx.get('tx_hash', ''),
-                    'value': float(rtx.get('value', 0)),
-                    'timestamp': rtx.get('block_timestamp', datetime.now())
-                })
+        if not from_addr or from_addr not in self.flow_graph:
+            return flow_analysis
         
         # 检测资金分散模式
-        if from_addr in G:
-            out_degree = G.out_degree(from_addr)
-            if out_degree > 3:  # 如果一个地址向多个地址转账
-                flow_analysis['fund_dispersion'] = True
-                flow_analysis['dispersion_count'] = out_degree
-        
-        # 检测环形转账
-        try:
-            cycles = list(nx.simple_cycles(G))
-            if cycles:
-                flow_analysis['circular_transfer'] = True
-        except:
-            pass
-        
-        # 检测混币模式（多个输入，多个输出）
-        mixing_nodes = [node for node, degree in G.degree() if G.in_degree(node) > 2 and G.out_degree(node) > 2]
+        out_degree = self.flow_graph.out_degree(from_addr)
+        if out_degree > 3:  # 如果一个地址向多个地址转账
+            flow_analysis['fund_dispersion'] = True
+            flow_analysis['dispersion_count'] = out_degree
+        
+        # 检测环形转账（当前交易可能是环的第一条边，也可能是最后一条边）
+        cycles = self.cycle_detector.find_cycles(from_addr)['cycles']
+        to_addr = tx.get('to_address', '')
+        if not cycles and to_addr and to_addr in self.flow_graph:
+            cycles = self.cycle_detector.find_cycles(to_addr)['cycles']
+        if cycles:
+            flow_analysis['circular_transfer'] = True
+            flow_analysis['cycles'] = cycles
+        
+        # 检测混币模式（多个输入，多个输出），只检查发送方的局部邻域
+        nodes = self.flow_graph.neighbourhood(from_addr)
+        mixing_nodes = [node for node in nodes if self.flow_graph.in_degree(node) > 2 and self.flow_graph.out_degree(node) > 2]
         if mixing_nodes:
             flow_analysis['mixing_pattern'] = True
         
@@ -249,3 +399,157 @@ class TransactionAnalyzer:
             'risk_factors': risk_factors,
             'transaction_count': len(transactions)
         }
+    
+    def calculate_windowed_address_risk(self, address: str, window: str = '7d', as_of: Optional[Any] = None) -> Dict[str, Any]:
+        """基于特征存储的窗口聚合计算地址风险评分
+        
+        与 calculate_address_risk 使用相同的阈值，但读取特征存储中的滚动聚合，
+        不需要传入原始交易历史。交易频率按窗口长度折算；资金分散需要不同
+        接收方数量，窗口聚合中不提供，因此不参与评分。
+        
+        Args:
+            address: 地址
+            window: 特征存储中的窗口名，如 1h、24h、7d
+            as_of: 历史时间点，用于无泄漏的训练样本
+            
+        Returns:
+            风险评分结果
+        """
+        if self.feature_store is None:
+            raise RuntimeError("未配置特征存储")
+        
+        features = self.feature_store.get_features(address, as_of, windows=[window])[window]
+        risk_score = 0.0
+        risk_factors = []
+        
+        if features['large_count'] > 0:
+            risk_score += 0.2
+            risk_factors.append(f"有{int(features['large_count'])}笔大额交易")
+        
+        if features['tx_per_day'] > 10:
+            risk_score += 0.2
+            risk_factors.append(f"交易频率高 ({features['tx_per_day']:.1f}笔/天)")
+        
+        if features['night_ratio'] > 0.3:
+            risk_score += 0.1
+            risk_factors.append("大量深夜交易")
+        
+        return {
+            'address': address,
+            'risk_score': min(risk_score, 1.0),
+            'risk_factors': risk_factors,
+            'transaction_count': int(features['count'])
+        }
+    
+    def calculate_address_risk_batch(
+        self,
+        transactions: Union[pd.DataFrame, List[Dict[str, Any]]],
+        addresses: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """批量计算地址风险评分
+        
+        一次分组聚合计算所有地址的风险因素。每个地址的结果与
+        calculate_address_risk(address, [发送方或接收方为该地址的交易]) 完全一致。
+        
+        Args:
+            transactions: 交易列表，或包含 from_address、to_address、value、
+                block_timestamp 列的DataFrame（block_timestamp 为空表示缺失）
+            addresses: 只返回这些地址的结果，默认返回所有出现过的地址
+            
+        Returns:
+            以地址为索引的DataFrame，包含 risk_score、risk_factors、transaction_count
+            以及各项风险因素的中间统计
+        """
+        df = self._to_risk_frame(transactions)
+        
+        # 展开为 (地址, 交易) 长表：每笔交易分别计入发送方和接收方，自转账只计一次
+        outgoing = df[df['from_address'] != ''].assign(address=lambda d: d['from_address'], is_outgoing=True)
+        incoming = df[(df['to_address'] != '') & (df['to_address'] != df['from_address'])]
+        incoming = incoming.assign(address=lambda d: d['to_address'], is_outgoing=False)
+        long = pd.concat([outgoing, incoming], ignore_index=True)
+        if addresses is not None:
+            long = long[long['address'].isin(addresses)]
+        
+        timestamps = long['block_timestamp']
+        long = long.assign(
+            is_large=long['value'] >= settings.LARGE_TRANSACTION_THRESHOLD,
+            has_timestamp=timestamps.notna(),
+            is_night=timestamps.dt.hour.lt(5) & timestamps.notna()
+        )
+        
+        grouped = long.groupby('address', sort=False)
+        stats = grouped.agg(
+            transaction_count=('is_outgoing', 'size'),
+            outgoing_count=('is_outgoing', 'sum'),
+            large_transaction_count=('is_large', 'sum'),
+            timestamp_count=('has_timestamp', 'sum'),
+            night_count=('is_night', 'sum'),
+            first_seen=('block_timestamp', 'min'),
+            last_seen=('block_timestamp', 'max')
+        )
+        stats['unique_recipients'] = (
+            long[long['is_outgoing']].groupby('address', sort=False)['to_address'].nunique()
+        ).reindex(stats.index, fill_value=0)
+        
+        # 与逐笔计算相同的浮点运算顺序，保证结果一致
+        span = (stats['last_seen'] - stats['first_seen']).fillna(pd.Timedelta(0))
+        span_seconds = span.astype('timedelta64[us]').astype('int64').astype(float) / 1e6
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx_per_day = np.where(span_seconds > 0, stats['timestamp_count'] / (span_seconds / 86400), 0.0)
+        recipients_ratio = stats['outgoing_count'] / stats['unique_recipients'].clip(lower=1)
+        night_ratio = stats['night_count'] / stats['transaction_count']
+        
+        stats['large_transaction'] = stats['large_transaction_count'] > 0
+        stats['fund_dispersion'] = (stats['unique_recipients'] > 5) & (recipients_ratio < 2)
+        stats['tx_per_day'] = tx_per_day
+        stats['high_frequency'] = (span_seconds > 0) & (tx_per_day > 10)
+        stats['night_ratio'] = night_ratio
+        stats['night_activity'] = (stats['night_count'] > 0) & (night_ratio > 0.3)
+        
+        risk_score = np.zeros(len(stats))
+        risk_score += np.where(stats['large_transaction'], 0.2, 0.0)
+        risk_score += np.where(stats['fund_dispersion'], 0.3, 0.0)
+        risk_score += np.where(stats['high_frequency'], 0.2, 0.0)
+        risk_score += np.where(stats['night_activity'], 0.1, 0.0)
+        stats['risk_score'] = np.minimum(risk_score, 1.0)
+        
+        stats['risk_factors'] = [
+            [factor for factor in (
+                f"有{large_count}笔大额交易" if large else None,
+                "资金分散转出模式" if dispersion else None,
+                f"交易频率高 ({per_day:.1f}笔/天)" if frequent else None,
+                "大量深夜交易" if night else None
+            ) if factor is not None]
+            for large_count, large, dispersion, per_day, frequent, night in zip(
+                stats['large_transaction_count'], stats['large_transaction'], stats['fund_dispersion'],
+                stats['tx_per_day'], stats['high_frequency'], stats['night_activity']
+            )
+        ]
+        
+        logger.info(f"批量计算 {len(stats)} 个地址的风险评分，共 {len(df)} 条交易")
+        return stats
+    
+    @staticmethod
+    def _to_risk_frame(transactions: Union[pd.DataFrame, List[Dict[str, Any]]]) -> pd.DataFrame:
+        """将交易转换为风险评分所需的列式结构"""
+        if isinstance(transactions, pd.DataFrame):
+            df = transactions.copy()
+        else:
+            df = pd.DataFrame({
+                'from_address': [tx.get('from_address', '') for tx in transactions],
+                'to_address': [tx.get('to_address', '') for tx in transactions],
+                'value': [float(tx.get('value', 0)) for tx in transactions],
+                # 与逐笔计算一致，只有 datetime 类型的时间戳参与频率和深夜统计
+                'block_timestamp': [
+                    tx['block_timestamp'] if isinstance(tx.get('block_timestamp'), datetime) else None
+                    for tx in transactions
+                ]
+            })
+        
+        for column in ('from_address', 'to_address'):
+            if column not in df:
+                df[column] = ''
+            df[column] = df[column].fillna('').astype(str)
+        df['value'] = df['value'].astype(float) if 'value' in df else 0.0
+        df['block_timestamp'] = pd.to_datetime(df['block_timestamp']) if 'block_timestamp' in df else pd.NaT
+        return df[['from_address', 'to_address', 'value', 'block_timestamp']]
@@ -0,0 +1,172 @@
+from typing import Dict, List, Any, Optional
+import logging
+import threading
+
+import numpy as np
+
+from app.analytics.flow_graph import to_epoch
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class WalletStreamPredictor:
+    """按钱包的增量LSTM预测器
+
+    为每个发送方地址保存最近 sequence_length 笔交易的缩放金额（环形缓冲区），
+    以及基于当前窗口预先算好的下一笔交易预测值。新交易到达时直接与缓存的
+    预测值比较得到偏差，再写入环形缓冲区并为下一笔交易刷新预测，
+    不需要重新排序或过滤历史交易。
+
+    与 AIMonitor.detect_anomalies 使用相同的窗口和偏差定义，
+    交易需按时间顺序到达。
+
+    窗口保存原始金额，预测时才用监控模块当前的模型和缩放器计算，
+    模型仓库切换版本后新的预测自动使用新版本（版本需保持相同的序列长度）。
+    锁只保护缓冲区的读写，模型计算在锁外进行，不同钱包的预测互不阻塞。
+    """
+
+    def __init__(self, monitor: Any, threshold: float = 0.5, initial_capacity: int = 1024):
+        """初始化增量预测器
+
+        Args:
+            monitor: 已训练的 AIMonitor（Keras模型或导出的NumPy权重均可）
+            threshold: 相对偏差超过该值视为异常
+            initial_capacity: 初始地址容量，不足时自动扩容
+        """
+        if not monitor.is_trained or monitor.model is None:
+            raise ValueError("AIMonitor模型尚未训练")
+        self.monitor = monitor
+        self.threshold = threshold
+        self.sequence_length = monitor.sequence_length
+
+        self._index: Dict[str, int] = {}
+        self._windows = np.zeros((initial_capacity, self.sequence_length))
+        self._heads = np.zeros(initial_capacity, dtype=np.int64)
+        self._counts = np.zeros(initial_capacity, dtype=np.int64)
+        self._predictions = np.full(initial_capacity, np.nan)
+        self._last_seen = np.full(initial_capacity, np.nan)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._index
+
+    def _row(self, address: str) -> int:
+        """获取地址所在行，不存在时分配（调用方需持有锁）"""
+        row = self._index.get(address)
+        if row is None:
+            row = len(self._index)
+            if row >= len(self._counts):
+                self._grow()
+            self._index[address] = row
+        return row
+
+    def _grow(self):
+        """地址容量翻倍"""
+        capacity = len(self._counts)
+        self._windows = np.concatenate([self._windows, np.zeros_like(self._windows)])
+        self._heads = np.concatenate([self._heads, np.zeros(capacity, dtype=np.int64)])
+        self._counts = np.concatenate([self._counts, np.zeros(capacity, dtype=np.int64)])
+        self._predictions = np.concatenate([self._predictions, np.full(capacity, np.nan)])
+        self._last_seen = np.concatenate([self._last_seen, np.full(capacity, np.nan)])
+
+    def update(self, tx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """摄取发送方的一笔新交易
+
+        Args:
+            tx: 交易数据
+
+        Returns:
+            预测信号；地址历史不足一个窗口时 predicted_value 为 None
+        """
+        address = tx.get('from_address', '')
+        if not address:
+            return None
+        value = float(tx.get('value', 0))
+        epoch = to_epoch(tx.get('block_timestamp'))
+
+        # 跟随模型仓库的版本切换
+        self.monitor._sync_registry()
+
+        with self._lock:
+            row = self._row(address)
+            if not np.isnan(self._last_seen[row]) and epoch < self._last_seen[row]:
+                logger.warning(f"地址 {address} 的交易乱序到达，按到达顺序处理")
+            self._last_seen[row] = epoch if np.isnan(self._last_seen[row]) else max(self._last_seen[row], epoch)
+
+            signal = self._signal(address, tx, value, self._predictions[row])
+
+            head = self._heads[row]
+            self._windows[row, head] = value
+            self._heads[row] = (head + 1) % self.sequence_length
+            self._counts[row] += 1
+            count = self._counts[row]
+            window = None
+            if count >= self.sequence_length:
+                order = (self._heads[row] + np.arange(self.sequence_length)) % self.sequence_length
+                window = self._windows[row, order]
+
+        if window is not None:
+            prediction = self._predict(window)
+            with self._lock:
+                # 计算期间该地址又有新交易时，以新交易的预测为准
+                if self._counts[row] == count:
+                    self._predictions[row] = prediction
+        return signal
+
+    def update_many(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按顺序摄取一批交易
+
+        Returns:
+            每笔交易的预测信号
+        """
+        signals = []
+        for tx in transactions:
+            signal = self.update(tx)
+            if signal is not None:
+                signals.append(signal)
+        return signals
+
+    def _signal(self, address: str, tx: Dict[str, Any], value: float, predicted: float) -> Dict[str, Any]:
+        """用缓存的预测值计算偏差"""
+        signal = {
+            'address': address,
+            'tx_hash': tx.get('tx_hash'),
+            'actual_value': value,
+            'predicted_value': None,
+            'deviation': None,
+            'is_anomaly': False
+        }
+        if np.isnan(predicted):
+            return signal
+        signal['predicted_value'] = float(predicted)
+        if predicted > 0:
+            deviation = abs(value - predicted) / predicted
+            signal['deviation'] = float(deviation)
+            signal['is_anomaly'] = bool(deviation > self.threshold)
+        return signal
+
+    def _predict(self, window: np.ndarray) -> float:
+        """用监控模块当前的模型和缩放器预测下一笔交易金额（不持有锁）
+
+        Args:
+            window: 按时间排序的原始金额窗口
+        """
+        model, scaler = self.monitor.model, self.monitor.scaler
+        scale = float(np.ravel(scaler.scale_)[0])
+        minimum = float(np.ravel(scaler.min_)[0])
+        scaled_window = (window * scale + minimum).astype(np.float32).reshape(1, self.sequence_length, 1)
+        scaled = float(np.ravel(model.predict(scaled_window, verbose=0))[0])
+        return (scaled - minimum) / scale
+
+    def pending_prediction(self, address: str) -> Optional[float]:
+        """地址下一笔交易的预测金额"""
+        with self._lock:
+            row = self._index.get(address)
+            if row is None or np.isnan(self._predictions[row]):
+                return None
+            return float(self._predictions[row])